@@ -0,0 +1,53 @@
+"""
+Benchmark: cold start of a short-lived process (serverless function, cron job). Every run is a fresh interpreter
+that imports the library, sends a first request (new connection and token) and a second request (warm connection),
+against a stand-in in this process.
+
+    $: python benchmarks/bench_cold_start.py --runs 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from zivverscim.stand_in import StandInServer
+
+_RUN = '''
+import sys, time
+start = time.perf_counter()
+from zivverscim import scim_connection_crud
+imported = time.perf_counter()
+zivver_scim_connection = scim_connection_crud.get_zivver_scim_connection(
+    external_oauth_token_value='benchmark', scim_api_create_url=sys.argv[1], scim_api_update_url=sys.argv[1],
+    scim_api_get_url=sys.argv[1], scim_api_delete_url=sys.argv[1], transport=sys.argv[2])
+zivver_scim_connection.get_all_users_from_zivver(page_size=1)
+first = time.perf_counter()
+scim_connection_crud.get_zivver_scim_connection(
+    external_oauth_token_value='benchmark', scim_api_create_url=sys.argv[1], scim_api_update_url=sys.argv[1],
+    scim_api_get_url=sys.argv[1], scim_api_delete_url=sys.argv[1], transport=sys.argv[2]
+).get_all_users_from_zivver(page_size=1)
+second = time.perf_counter()
+print('{{"import": {}, "first": {}, "second": {}}}'.format(imported - start, first - imported, second - first))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print('{:<10} {:>12} {:>16} {:>17}'.format('transport', 'import ms', 'first call ms', 'second call ms'))
+    with StandInServer() as server:
+        for transport in ('requests', 'urllib3'):
+            runs = [
+                json.loads(subprocess.check_output([sys.executable, '-c', _RUN, server.users_url, transport]))
+                for _ in range(args.runs)
+            ]
+            print('{:<10} {:>12.1f} {:>16.1f} {:>17.1f}'.format(
+                transport, *[statistics.median(run[step] for run in runs) * 1000
+                             for step in ('import', 'first', 'second')]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: building the SCIM payloads of a columnar extract row by row against the columnar builder, and a listing
+as ZivverUser objects against the columnar export. The in-process transport keeps the network out of it.
+
+    $: python benchmarks/bench_columnar.py --rows 100000 --users 10000
+"""
+import argparse
+import json
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.columnar import build_scim_users, iter_user_rows
+from zivverscim.stand_in import ScimStandIn
+from zivverscim.transport import InProcessTransport
+from zivverscim.wrapper import get_scim_user_object
+
+
+def _get_columns(rows):
+    return {
+        'first_name': ['John'] * rows,
+        'last_name': ['Doe {}'.format(index) for index in range(rows)],
+        'user_name': ['john{}@example.com'.format(index) for index in range(rows)],
+        'aliases': [['j.doe{}@example.com'.format(index)] for index in range(rows)],
+        'is_active': [True] * rows
+    }
+
+
+def _build_row_by_row(columns):
+    # What a caller does without the builder: a dict per row, then the payload from the keyword arguments
+    scim_users = []
+    for index in range(len(columns['user_name'])):
+        user_fields = {name: values[index] for name, values in columns.items()}
+        scim_users.append({
+            'schemas': [
+                'urn:ietf:params:scim:schemas:core:2.0:User',
+                'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User',
+                'urn:ietf:params:scim:schemas:zivver:0.1:User'
+            ],
+            'meta': {'resourceType': 'User'},
+            'active': user_fields['is_active'],
+            'name': {'formatted': '{} {}'.format(user_fields['first_name'], user_fields['last_name'])},
+            'nickName': user_fields.get('nick_name'),
+            'urn:ietf:params:scim:schemas:zivver:0.1:User': {
+                'SsoAccountKey': user_fields.get('zivver_account_key'),
+                'aliases': user_fields.get('aliases', []),
+                'delegates': user_fields.get('delegates', [])
+            },
+            'userName': user_fields['user_name']
+        })
+    return scim_users
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Rows of the payload build')
+    parser.add_argument('--users', type=int, default=10000, help='Users of the listing')
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args()
+
+    columns = _get_columns(args.rows)
+    print('{:<28} {:>10}'.format('payloads of {} rows'.format(args.rows), 'ms'))
+    print('{:<28} {:>10.1f}'.format('row by row', _timed(_build_row_by_row, columns) * 1000))
+    print('{:<28} {:>10.1f}'.format('columnar', _timed(build_scim_users, columns) * 1000))
+
+    stand_in = ScimStandIn()
+    for user_fields in iter_user_rows(_get_columns(args.users)):
+        stand_in.handle('POST', stand_in.base_path, {}, json.dumps(get_scim_user_object(
+            user_fields['first_name'], user_fields['last_name'], None, user_fields['user_name'], None, True,
+            user_fields['aliases'], [])).encode('utf-8'))
+    transport = InProcessTransport(stand_in)
+    zivver_scim_connection = scim_connection_crud.ZivverSCIMConnection(
+        external_oauth_token_value='benchmark', scim_api_create_url=transport.users_url,
+        scim_api_update_url=transport.users_url, scim_api_get_url=transport.users_url,
+        scim_api_delete_url=transport.users_url, http_client=transport
+    )
+
+    print('{:<28} {:>10}'.format('listing of {} users'.format(args.users), 'ms'))
+    print('{:<28} {:>10.1f}'.format('ZivverUser objects', _timed(
+        zivver_scim_connection.get_all_users_from_zivver, page_size=args.page_size) * 1000))
+    print('{:<28} {:>10.1f}'.format('columns', _timed(
+        zivver_scim_connection.get_all_users_as_columns, page_size=args.page_size) * 1000))
+
+
+if __name__ == '__main__':
+    main()
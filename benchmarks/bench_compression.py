@@ -0,0 +1,98 @@
+"""
+Benchmark: bandwidth vs CPU of the content encodings on SCIM payloads, and end-to-end against the local stand-in.
+
+    $: python benchmarks/bench_compression.py --users 5000
+"""
+import argparse
+import json
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.compression import available_encodings, compress, decompress
+from zivverscim.stand_in import SCIM_LIST_RESPONSE_SCHEMA, ScimStandIn, StandInServer
+
+
+def _scim_user(index):
+    user_name = '{}-john.doe@example.com'.format(index)
+    return {
+        'schemas': [
+            'urn:ietf:params:scim:schemas:core:2.0:User',
+            'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User',
+            'urn:ietf:params:scim:schemas:zivver:0.1:User'
+        ],
+        'meta': {'resourceType': 'User'},
+        'active': True,
+        'name': {'formatted': '{}-John Doe'.format(index)},
+        'nickName': '',
+        'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User': {'department': 'Sales'},
+        'urn:ietf:params:scim:schemas:zivver:0.1:User': {
+            'SsoAccountKey': user_name,
+            'aliases': ['{}-j.doe@example.com'.format(index)],
+            'delegates': ['manager@example.com']
+        },
+        'userName': user_name
+    }
+
+
+def _timed(function, *args, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_codecs(users):
+    payload = json.dumps({
+        'schemas': [SCIM_LIST_RESPONSE_SCHEMA],
+        'totalResults': users,
+        'Resources': [_scim_user(index) for index in range(users)]
+    }).encode('utf-8')
+
+    print('Listing payload of {} users: {} bytes'.format(users, len(payload)))
+    print('{:<10} {:>12} {:>8} {:>14} {:>16}'.format('encoding', 'bytes', 'ratio', 'compress ms', 'decompress ms'))
+    for encoding in available_encodings():
+        for level in (1, 6, 9):
+            compressed, compress_ms = _timed(compress, payload, encoding, level)
+            _, decompress_ms = _timed(decompress, compressed, encoding)
+            print('{:<10} {:>12} {:>8.1f} {:>14.2f} {:>16.2f}'.format(
+                '{}:{}'.format(encoding, level), len(compressed), len(payload) / len(compressed), compress_ms,
+                decompress_ms
+            ))
+
+
+def bench_end_to_end(users):
+    stand_in = ScimStandIn()
+    for index in range(users):
+        stand_in.users[str(index)] = dict(_scim_user(index), id=str(index))
+
+    print('\nEnd-to-end listing of {} users'.format(users))
+    print('{:<24} {:>14} {:>10}'.format('responses', 'bytes on wire', 'seconds'))
+    for accept_compressed_responses in (False, True):
+        with StandInServer(stand_in) as server:
+            stand_in.bytes_sent = 0
+            with scim_connection_crud.ZivverSCIMConnection(
+                    external_oauth_token_value='benchmark',
+                    scim_api_create_url=server.users_url,
+                    scim_api_update_url=server.users_url,
+                    scim_api_get_url=server.users_url,
+                    scim_api_delete_url=server.users_url,
+                    accept_compressed_responses=accept_compressed_responses
+            ) as zivver_scim_connection:
+                _, listing_ms = _timed(zivver_scim_connection.get_all_users_from_zivver, repeat=3)
+            print('{:<24} {:>14} {:>10.3f}'.format(
+                'compressed' if accept_compressed_responses else 'identity', stand_in.bytes_sent // 3,
+                listing_ms / 1000
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    args = parser.parse_args()
+
+    bench_codecs(args.users)
+    bench_end_to_end(args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: fixed thread counts vs the adaptive (AIMD) concurrency limiter for bulk upserts against a stand-in
+that answers 429 above its capacity.
+
+    $: python benchmarks/bench_concurrency.py --users 1000 --capacity 8 --delay 0.02
+"""
+import argparse
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.concurrency import AdaptiveConcurrencyLimiter
+from zivverscim.stand_in import StandInServer
+from zivverscim.wrapper import UpsertResult
+
+
+def run(users, capacity, delay, max_workers, concurrency_limiter=None):
+    with StandInServer(response_delay=delay, max_in_flight=capacity) as server:
+        with scim_connection_crud.ZivverSCIMConnection(
+                external_oauth_token_value='benchmark',
+                scim_api_create_url=server.users_url,
+                scim_api_update_url=server.users_url,
+                scim_api_get_url=server.users_url,
+                scim_api_delete_url=server.users_url,
+                max_connections=max_workers,
+                concurrency_limiter=concurrency_limiter
+        ) as zivver_scim_connection:
+            start = time.perf_counter()
+            upsert_results = zivver_scim_connection.upsert_users(
+                [{'last_name': 'Doe', 'user_name': '{}-john.doe@example.com'.format(index)} for index in range(users)],
+                existing_users=[], max_workers=max_workers
+            )
+            seconds = time.perf_counter() - start
+
+    failed = len([upsert_result for upsert_result in upsert_results if upsert_result.action == UpsertResult.FAILED])
+    return users - failed, failed, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--capacity', type=int, default=8, help='Requests the stand-in handles at the same time')
+    parser.add_argument('--delay', type=float, default=0.02, help='Server side delay per response in seconds')
+    args = parser.parse_args()
+
+    print('{:<24} {:>10} {:>10} {:>10} {:>12} {:>8}'.format('mode', 'upserted', 'throttled', 'seconds', 'upserts/s',
+                                                            'limit'))
+    for max_workers in (2, 4, 8, 16, 32):
+        upserted, failed, seconds = run(args.users, args.capacity, args.delay, max_workers)
+        print('{:<24} {:>10} {:>10} {:>10.2f} {:>12.1f} {:>8}'.format(
+            'fixed x{}'.format(max_workers), upserted, failed, seconds, upserted / seconds, max_workers
+        ))
+
+    concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=32)
+    upserted, failed, seconds = run(args.users, args.capacity, args.delay, 32, concurrency_limiter)
+    print('{:<24} {:>10} {:>10} {:>10.2f} {:>12.1f} {:>8}'.format(
+        'adaptive (max x32)', upserted, failed, seconds, upserted / seconds, concurrency_limiter.limit
+    ))
+
+
+if __name__ == '__main__':
+    main()
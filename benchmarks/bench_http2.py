@@ -0,0 +1,78 @@
+"""
+Benchmark: HTTP/1.1 pooled connections vs HTTP/2 multiplexing against the local stand-in.
+
+    $: pip install zivverscim[http2]
+    $: python benchmarks/bench_http2.py --requests 2000 --concurrency 200 --delay 0.02
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zivverscim import scim_connection_crud
+from zivverscim.http2_connection import Http2Client
+from zivverscim.stand_in import Http2StandInServer, ScimStandIn, StandInServer
+
+
+def _create_connection(server, **kwargs):
+    return scim_connection_crud.ZivverSCIMConnection(
+        external_oauth_token_value='benchmark',
+        scim_api_create_url=server.users_url,
+        scim_api_update_url=server.users_url,
+        scim_api_get_url=server.users_url,
+        scim_api_delete_url=server.users_url,
+        **kwargs
+    )
+
+
+def _run(zivver_scim_connection, account_ids, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(zivver_scim_connection.get_user_from_zivver, account_ids))
+    return time.perf_counter() - start
+
+
+def _seed(stand_in, users):
+    account_ids = []
+    for index in range(users):
+        scim_user = {'userName': '{}-john.doe@example.com'.format(index), 'name': {'formatted': 'John Doe'}}
+        status_code, headers, body = stand_in.handle('POST', stand_in.base_path, {},
+                                                     json.dumps(scim_user).encode('utf-8'))
+        account_ids.append(json.loads(body)['id'])
+    return account_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.02, help='Server side delay per response in seconds')
+    parser.add_argument('--connections', type=int, default=4, help='Max connections per client')
+    args = parser.parse_args()
+
+    stand_in = ScimStandIn()
+    account_ids = _seed(stand_in, 100)
+    account_ids = [account_ids[index % len(account_ids)] for index in range(args.requests)]
+
+    print('{:<32} {:>10} {:>10} {:>12}'.format('transport', 'seconds', 'req/s', 'connections'))
+
+    for connections in (args.connections, args.concurrency):
+        with StandInServer(stand_in, response_delay=args.delay) as server:
+            with _create_connection(server, max_connections=connections) as zivver_scim_connection:
+                seconds = _run(zivver_scim_connection, account_ids, args.concurrency)
+            print('{:<32} {:>10.2f} {:>10.0f} {:>12}'.format(
+                'HTTP/1.1 pool={}'.format(connections), seconds, args.requests / seconds, server.connection_count
+            ))
+
+    with Http2StandInServer(stand_in, response_delay=args.delay) as server:
+        http_client = Http2Client(max_connections=args.connections, http2_prior_knowledge=True)
+        with _create_connection(server, http_client=http_client) as zivver_scim_connection:
+            seconds = _run(zivver_scim_connection, account_ids, args.concurrency)
+        print('{:<32} {:>10.2f} {:>10.0f} {:>12}'.format(
+            'HTTP/2 max_connections={}'.format(args.connections), seconds, args.requests / seconds,
+            server.connection_count
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark: sequential vs parallel fan-out listing of all users against the local stand-in.
+
+    $: python benchmarks/bench_listing.py --users 10000 --page-size 100 --delay 0.05
+"""
+import argparse
+import json
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.stand_in import ScimStandIn, StandInServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.05, help='Server side delay per response in seconds')
+    args = parser.parse_args()
+
+    stand_in = ScimStandIn()
+    for index in range(args.users):
+        scim_user = {'userName': '{}-john.doe@example.com'.format(index), 'name': {'formatted': 'John Doe'}}
+        stand_in.handle('POST', stand_in.base_path, {}, json.dumps(scim_user).encode('utf-8'))
+
+    print('{:<24} {:>10} {:>10} {:>10}'.format('mode', 'users', 'seconds', 'speedup'))
+    with StandInServer(stand_in, response_delay=args.delay) as server:
+        with scim_connection_crud.ZivverSCIMConnection(
+                external_oauth_token_value='benchmark',
+                scim_api_create_url=server.users_url,
+                scim_api_update_url=server.users_url,
+                scim_api_get_url=server.users_url,
+                scim_api_delete_url=server.users_url,
+                max_connections=16
+        ) as zivver_scim_connection:
+            sequential_seconds = None
+            for max_workers in (None, 2, 4, 8, 16):
+                start = time.perf_counter()
+                zivver_users = zivver_scim_connection.get_all_users_from_zivver(
+                    page_size=args.page_size, parallel=max_workers is not None, max_workers=max_workers or 1
+                )
+                seconds = time.perf_counter() - start
+                sequential_seconds = sequential_seconds or seconds
+                print('{:<24} {:>10} {:>10.2f} {:>10.1f}'.format(
+                    'parallel x{}'.format(max_workers) if max_workers else 'sequential', len(zivver_users), seconds,
+                    sequential_seconds / seconds
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: upsert throughput of one process against ShardedSync with 1, 2 and 4 processes. The stand-in runs in its
+own process; with a response delay the client is not limited by the stand-in.
+
+    $: python benchmarks/bench_sharding.py --users 2000 --workers 8 --delay 0.01
+"""
+import argparse
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.sharding import ShardedSync
+from zivverscim.stand_in import StandInProcess
+
+
+def _get_users(count, run):
+    return [{'first_name': 'John', 'last_name': 'Doe {}'.format(index),
+             'user_name': 'run{}-john{}@example.com'.format(run, index)} for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8, help='Users upserted at the same time per process')
+    parser.add_argument('--delay', type=float, default=0.01, help='Seconds the stand-in waits per response')
+    args = parser.parse_args()
+
+    stand_in_process = StandInProcess(response_delay=args.delay).start()
+    users_url = stand_in_process.users_url
+    connection_options = {
+        'external_oauth_token_value': 'benchmark',
+        'scim_api_create_url': users_url,
+        'scim_api_update_url': users_url,
+        'scim_api_get_url': users_url,
+        'scim_api_delete_url': users_url,
+        'transport': 'urllib3'
+    }
+
+    try:
+        print('{:<16} {:>10} {:>12}'.format('mode', 'seconds', 'users/s'))
+        with scim_connection_crud.ZivverSCIMConnection(**connection_options) as zivver_scim_connection:
+            start = time.perf_counter()
+            zivver_scim_connection.upsert_users(_get_users(args.users, 0), existing_users=[],
+                                                max_workers=args.workers)
+            duration = time.perf_counter() - start
+        print('{:<16} {:>10.2f} {:>12.1f}'.format('one process', duration, args.users / duration))
+
+        for run, shards in enumerate((1, 2, 4), start=1):
+            sharded_sync_report = ShardedSync(connection_options, shards=shards, max_workers=args.workers).upsert_users(
+                _get_users(args.users, run), existing_users=[])
+            print('{:<16} {:>10.2f} {:>12.1f}'.format('{} shards'.format(shards), sharded_sync_report.duration,
+                                                     sharded_sync_report.throughput))
+    finally:
+        stand_in_process.stop()
+
+
+if __name__ == '__main__':
+    main()
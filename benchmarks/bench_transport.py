@@ -0,0 +1,51 @@
+"""
+Benchmark: per-request overhead of the transports. The in-process transport has no sockets, so its time is the
+overhead of the client itself (payload, JSON, wrapping); the difference to the others is the transport and network.
+
+    $: python benchmarks/bench_transport.py --requests 2000
+"""
+import argparse
+import time
+
+from zivverscim import scim_connection_crud
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.transport import InProcessTransport
+
+
+def _create_connection(users_url, **kwargs):
+    return scim_connection_crud.ZivverSCIMConnection(
+        external_oauth_token_value='benchmark',
+        scim_api_create_url=users_url,
+        scim_api_update_url=users_url,
+        scim_api_get_url=users_url,
+        scim_api_delete_url=users_url,
+        **kwargs
+    )
+
+
+def _timed_gets(zivver_scim_connection, requests):
+    account_id = zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@example.com').account_id
+    start = time.perf_counter()
+    for _ in range(requests):
+        zivver_scim_connection.get_user_from_zivver(account_id)
+    return (time.perf_counter() - start) / requests * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('{:<16} {:>14}'.format('transport', 'us/request'))
+    for transport in ('requests', 'urllib3'):
+        with StandInServer(ScimStandIn()) as server:
+            with _create_connection(server.users_url, transport=transport) as zivver_scim_connection:
+                print('{:<16} {:>14.1f}'.format(transport, _timed_gets(zivver_scim_connection, args.requests)))
+
+    in_process_transport = InProcessTransport()
+    with _create_connection(in_process_transport.users_url, http_client=in_process_transport) as zivver_scim_connection:
+        print('{:<16} {:>14.1f}'.format('in-process', _timed_gets(zivver_scim_connection, args.requests)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+
+from .exceptions import ZivverCRUDError
+from .wrapper import UserChange
+
+
+class ZivverChangePoller:
+    """
+    Incremental pull of the users that changed since the last poll.
+
+    The high-water mark is the highest meta.lastModified that was seen, the next poll only asks for the users with
+    the filter meta.lastModified ge "<watermark>", so a change with the same timestamp as the watermark is not missed;
+    the users that are returned again are dropped by their hash. Deleted users are found by listing only the ids.
+    When Zivver rejects the filter, every poll does a full scan and compares the users by hash.
+    The state (watermark, user hashes) can be saved between runs with save() and load().
+    """
+
+    MODE_FILTER = 'filter'
+    MODE_FULL_SCAN = 'full_scan'
+
+    def __init__(self, zivver_scim_connection, state=None, page_size=100, parallel=False, max_workers=4,
+                 detect_deletions=True):
+        self.zivver_scim_connection = zivver_scim_connection
+        self.page_size = page_size
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.detect_deletions = detect_deletions
+
+        state = state or {}
+        self.watermark = state.get('watermark')
+        self.mode = state.get('mode', self.MODE_FILTER)
+        # account_id -> hash of the user, to skip users that did not really change
+        self.user_hashes = dict(state.get('users', {}))
+
+    def get_state(self):
+        """
+        :return: dict with the state that is needed for the next poll, json serializable
+        """
+        return {
+            'watermark': self.watermark,
+            'mode': self.mode,
+            'users': self.user_hashes
+        }
+
+    def save(self, path):
+        """
+        Save the state to a json file, the file is replaced atomically
+        """
+        temporary_path = '{}.tmp'.format(path)
+        with open(temporary_path, 'w') as state_file:
+            json.dump(self.get_state(), state_file)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, zivver_scim_connection, path, **kwargs):
+        """
+        Create the poller from a state file saved with save(), a missing file starts with an empty state
+        :return: ZivverChangePoller() object
+        """
+        state = None
+        if os.path.exists(path):
+            with open(path) as state_file:
+                state = json.load(state_file)
+        return cls(zivver_scim_connection, state=state, **kwargs)
+
+    def _hash_user(self, zivver_user):
+        return hashlib.sha1(str(zivver_user).encode('utf-8')).hexdigest()
+
+    def _iter_users(self, scim_filter=None, attributes=None):
+        return self.zivver_scim_connection.iter_all_users_from_zivver(
+            scim_filter=scim_filter, attributes=attributes, page_size=self.page_size, parallel=self.parallel,
+            max_workers=self.max_workers
+        )
+
+    def poll(self):
+        """
+        Yields the users that changed and were deleted since the last poll.
+        The watermark only moves when all changes were yielded, so an interrupted poll is done again next time.
+        :return: Generator of UserChange() objects
+        """
+        if self.mode == self.MODE_FILTER and self.watermark:
+            try:
+                yield from self._poll_with_filter()
+                return
+            except ZivverCRUDError as z_e:
+                if z_e.status_code not in (400, 403, 501):
+                    raise
+                # Zivver rejected the lastModified filter, compare the users by hash from now on
+                self.mode = self.MODE_FULL_SCAN
+
+        yield from self._poll_full_scan()
+
+    def _changed(self, zivver_user):
+        """
+        :return: True when the user is new or differs from the last poll, the new hash is saved
+        """
+        user_hash = self._hash_user(zivver_user)
+        if self.user_hashes.get(zivver_user.account_id) == user_hash:
+            return False
+        self.user_hashes[zivver_user.account_id] = user_hash
+        return True
+
+    def _poll_with_filter(self):
+        watermark = self.watermark
+        # ge and not gt: users that changed in the same timestamp after the last poll; repeats are dropped by _changed()
+        scim_filter = 'meta.lastModified ge {}'.format(json.dumps(self.watermark))
+
+        for zivver_user in self._iter_users(scim_filter=scim_filter):
+            if zivver_user.meta_last_modified and zivver_user.meta_last_modified > watermark:
+                watermark = zivver_user.meta_last_modified
+            if self._changed(zivver_user):
+                yield UserChange(UserChange.CHANGED, zivver_user.account_id, zivver_user)
+
+        if self.detect_deletions:
+            account_ids = {zivver_user.account_id for zivver_user in self._iter_users(attributes=['id'])}
+            yield from self._deleted(account_ids)
+
+        self.watermark = watermark
+
+    def _poll_full_scan(self):
+        watermark = self.watermark
+        account_ids = set()
+
+        for zivver_user in self._iter_users():
+            account_ids.add(zivver_user.account_id)
+            if zivver_user.meta_last_modified and (not watermark or zivver_user.meta_last_modified > watermark):
+                watermark = zivver_user.meta_last_modified
+            if self._changed(zivver_user):
+                yield UserChange(UserChange.CHANGED, zivver_user.account_id, zivver_user)
+
+        yield from self._deleted(account_ids)
+
+        self.watermark = watermark
+
+    def _deleted(self, account_ids):
+        """
+        Yields the users that are known from the last poll, but are no longer in Zivver
+        """
+        for account_id in [account_id for account_id in self.user_hashes if account_id not in account_ids]:
+            del self.user_hashes[account_id]
+            yield UserChange(UserChange.DELETED, account_id)
@@ -0,0 +1,200 @@
+import itertools
+
+from .wrapper import (SCIM_ENTERPRISE_USER_SCHEMA, SCIM_ZIVVER_USER_SCHEMA, ZIVVER_USER_SCIM_ATTRIBUTES,
+                      get_scim_user_object)
+
+# Input columns, the arguments of ZivverSCIMConnection.create_user_in_zivver(), with the value of a missing column
+USER_COLUMN_DEFAULTS = {
+    'first_name': None,
+    'last_name': None,
+    'nick_name': None,
+    'user_name': None,
+    'zivver_account_key': None,
+    'sso_connection': False,
+    'is_active': False,
+    'aliases': None,
+    'delegates': None
+}
+
+# Output columns of users_to_columns(), the ZivverUser fields
+USER_FIELD_COLUMNS = list(ZIVVER_USER_SCIM_ATTRIBUTES)
+
+
+def to_columns(data):
+    """
+    Accepts a dict of lists, a pyarrow Table or a pandas DataFrame. pyarrow and pandas are not imported,
+    the objects are converted with their own methods.
+    :return: dict column name -> list of values
+    """
+    if isinstance(data, dict):
+        return {name: list(values) for name, values in data.items()}
+    if hasattr(data, 'to_pydict'):
+        # pyarrow Table or RecordBatch
+        return data.to_pydict()
+    if type(data).__module__.startswith('pandas'):
+        return data.to_dict('list')
+    raise TypeError('Expected a dict of lists, a pyarrow Table or a pandas DataFrame, got {}'.format(
+        type(data).__name__))
+
+
+def _clean_column(name, values):
+    """
+    Replaces the empty cells (None or the NaN that pandas uses, NaN != NaN) by the default of the column
+    :return: List of the values
+    """
+    if name in ('aliases', 'delegates'):
+        return [[] if value is None or isinstance(value, float) else list(value) for value in values]
+    if name in ('sso_connection', 'is_active'):
+        return [False if value is None or value != value else bool(value) for value in values]
+    return [None if value is None or value != value else value for value in values]
+
+
+def get_user_columns(data):
+    """
+    :param data: Columnar users, see to_columns(), the columns are the create_user_in_zivver() arguments
+    :return: dict with a list for every column of USER_COLUMN_DEFAULTS, empty cells set to the default
+    """
+    columns = to_columns(data)
+    unknown_columns = [name for name in columns if name not in USER_COLUMN_DEFAULTS]
+    if unknown_columns:
+        raise ValueError('Unknown column: {}'.format(', '.join(sorted(unknown_columns))))
+    row_count = len(next(iter(columns.values()))) if columns else 0
+
+    user_columns = {}
+    for name, default in USER_COLUMN_DEFAULTS.items():
+        values = columns.get(name)
+        if values is None:
+            values = [None] * row_count
+        elif len(values) != row_count:
+            raise ValueError('Column {} has {} values, expected {}'.format(name, len(values), row_count))
+        user_columns[name] = _clean_column(name, values)
+    return user_columns
+
+
+def iter_user_rows(data):
+    """
+    :param data: Columnar users, see get_user_columns()
+    :return: Generator of dicts with the create_user_in_zivver() arguments, e.g. for upsert_users()
+    """
+    return iter_rows_of_user_columns(get_user_columns(data))
+
+
+def iter_rows_of_user_columns(user_columns):
+    """
+    Like iter_user_rows(), for columns that are already normalized, so they are not normalized again
+    :param user_columns: The normalized columns of get_user_columns()
+    :return: Generator of dicts with the create_user_in_zivver() arguments
+    """
+    names = list(user_columns)
+    for values in zip(*user_columns.values()):
+        yield dict(zip(names, values))
+
+
+def build_scim_users(data, account_ids=None):
+    """
+    Builds the SCIM create payloads (or with account_ids, the update payloads) of all rows at once, straight from
+    the columns. The rows are not checked, see validation.validate_users()
+    :param data: Columnar users, see get_user_columns()
+    :param account_ids: Optional list with the Zivver account id of every row
+    :return: List of SCIM dicts, in the order of the rows
+    """
+    return build_scim_users_from_user_columns(get_user_columns(data), account_ids)
+
+
+def build_scim_users_from_user_columns(user_columns, account_ids=None):
+    """
+    Like build_scim_users(), for columns that are already normalized, so they are not normalized again
+    :param user_columns: The normalized columns of get_user_columns()
+    :return: List of SCIM dicts, in the order of the rows
+    """
+    row_count = len(user_columns['user_name'])
+    if account_ids is None:
+        account_ids = itertools.repeat(None, row_count)
+    elif len(account_ids) != row_count:
+        raise ValueError('Got {} account ids for {} rows'.format(len(account_ids), row_count))
+
+    return [
+        get_scim_user_object(first_name, last_name, nick_name, user_name, zivver_account_key, is_active, aliases,
+                             delegates, account_id)
+        for first_name, last_name, nick_name, user_name, zivver_account_key, is_active, aliases, delegates, account_id
+        in zip(user_columns['first_name'], user_columns['last_name'], user_columns['nick_name'],
+               user_columns['user_name'], user_columns['zivver_account_key'], user_columns['is_active'],
+               user_columns['aliases'], user_columns['delegates'], account_ids)
+    ]
+
+
+_EMPTY = {}
+
+# ZivverUser field -> function that reads the column from a page of SCIM users, with the same defaults as
+# get_zivver_user_object(). A list comprehension per column instead of a function call per user and field.
+_COLUMN_READERS = {
+    'account_id': lambda scim_users: [scim_user.get('id', '') for scim_user in scim_users],
+    'name_formatted': lambda scim_users: [(scim_user.get('name') or _EMPTY).get('formatted', '')
+                                          for scim_user in scim_users],
+    'meta_created_at': lambda scim_users: [(scim_user.get('meta') or _EMPTY).get('created', '')
+                                           for scim_user in scim_users],
+    'meta_last_modified': lambda scim_users: [(scim_user.get('meta') or _EMPTY).get('lastModified', '')
+                                              for scim_user in scim_users],
+    'meta_location': lambda scim_users: [(scim_user.get('meta') or _EMPTY).get('location', '')
+                                         for scim_user in scim_users],
+    'meta_resource_type': lambda scim_users: [(scim_user.get('meta') or _EMPTY).get('resourceType', '')
+                                              for scim_user in scim_users],
+    'phone_numbers': lambda scim_users: [scim_user.get('phoneNumbers', []) for scim_user in scim_users],
+    'user_name': lambda scim_users: [scim_user.get('userName', '') for scim_user in scim_users],
+    'nick_name': lambda scim_users: [scim_user.get('nickName', '') for scim_user in scim_users],
+    'is_active': lambda scim_users: [scim_user.get('active', False) for scim_user in scim_users],
+    'schemas': lambda scim_users: [scim_user.get('schemas', []) for scim_user in scim_users],
+    'enterprise_user': lambda scim_users: [scim_user.get(SCIM_ENTERPRISE_USER_SCHEMA, '')
+                                           for scim_user in scim_users],
+    'zivver_scim_user_aliases': lambda scim_users: [
+        scim_user[SCIM_ZIVVER_USER_SCHEMA].get('aliases', []) if scim_user.get(SCIM_ZIVVER_USER_SCHEMA) else ''
+        for scim_user in scim_users
+    ],
+    'zivver_scim_user_delegates': lambda scim_users: [
+        scim_user[SCIM_ZIVVER_USER_SCHEMA].get('delegates', []) if scim_user.get(SCIM_ZIVVER_USER_SCHEMA) else ''
+        for scim_user in scim_users
+    ],
+}
+
+
+def get_column_names(unloaded_fields=None):
+    """
+    :return: The ZivverUser fields that are loaded with the projection, see wrapper.get_unloaded_fields()
+    """
+    return [field_name for field_name in USER_FIELD_COLUMNS if field_name not in (unloaded_fields or ())]
+
+
+def users_to_columns(scim_users, columns=None, unloaded_fields=None):
+    """
+    Reads the SCIM users of a listing straight into columns named after the ZivverUser fields,
+    without a ZivverUser object per user. The fields that were not loaded are left out.
+    :param columns: dict of lists to extend, e.g. with the next page
+    :return: dict column name -> list of values
+    """
+    if columns is None:
+        columns = {field_name: [] for field_name in get_column_names(unloaded_fields)}
+    for field_name, values in columns.items():
+        values.extend(_COLUMN_READERS[field_name](scim_users))
+    return columns
+
+
+def columns_to_output(columns, output='columns'):
+    """
+    :param output: columns (dict of lists), arrow (pyarrow Table) or pandas (DataFrame)
+    :return: The columns in the output format
+    """
+    if output == 'columns':
+        return columns
+    if output == 'arrow':
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('output=\'arrow\' needs pyarrow, install it with pip install zivverscim[columnar]')
+        return pyarrow.Table.from_pydict(columns)
+    if output == 'pandas':
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('output=\'pandas\' needs pandas, install it with pip install zivverscim[columnar]')
+        return pandas.DataFrame(columns)
+    raise ValueError('Unsupported output: {}'.format(output))
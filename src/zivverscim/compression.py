@@ -0,0 +1,92 @@
+import gzip
+import zlib
+
+# brotli and zstandard are optional and imported on first use, module name -> module (None when not installed)
+_optional_modules = {}
+# decodable encodings -> Accept-Encoding header
+_accept_encoding_headers = {}
+
+
+def _import_optional(module_name):
+    """
+    :return: The module, None when it is not installed
+    """
+    if module_name not in _optional_modules:
+        try:
+            _optional_modules[module_name] = __import__(module_name)
+        except ImportError:
+            _optional_modules[module_name] = None
+    return _optional_modules[module_name]
+
+
+def available_encodings():
+    """
+    :return: List of content encodings that can be used, brotli and zstd only when the packages are installed
+    """
+    encodings = ['gzip', 'deflate']
+    if _import_optional('brotli') is not None:
+        encodings.append('br')
+    if _import_optional('zstandard') is not None:
+        encodings.append('zstd')
+    return encodings
+
+
+def get_urllib3_encodings():
+    """
+    :return: The content encodings that urllib3 (and requests, that uses it) decodes, urllib3 1.x does not decode zstd
+    """
+    import urllib3.util
+    accept_encoding = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+    return [encoding.strip() for encoding in accept_encoding.split(',')]
+
+
+def accept_encoding_header(decodable_encodings=None):
+    """
+    Only the encodings that are installed and that the HTTP library of the transport can decode are advertised,
+    a response in an other encoding could not be read
+    :param decodable_encodings: The content encodings the transport decodes, None for those of urllib3 (requests)
+    :return: Value for the Accept-Encoding header
+    """
+    key = tuple(decodable_encodings) if decodable_encodings is not None else None
+    if key not in _accept_encoding_headers:
+        if decodable_encodings is None:
+            decodable_encodings = get_urllib3_encodings()
+        _accept_encoding_headers[key] = ', '.join(encoding for encoding in available_encodings()
+                                                  if encoding in decodable_encodings)
+    return _accept_encoding_headers[key]
+
+
+def compress(data, encoding, level=6):
+    """
+    Compress the request body
+    :param data: bytes
+    :param encoding: gzip, deflate, br or zstd
+    :return: compressed bytes
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    if encoding == 'br' and encoding in available_encodings():
+        return _import_optional('brotli').compress(data, quality=min(level, 11))
+    if encoding == 'zstd' and encoding in available_encodings():
+        return _import_optional('zstandard').ZstdCompressor(level=level).compress(data)
+    raise ValueError('Unsupported content encoding: {}'.format(encoding))
+
+
+def decompress(data, encoding):
+    """
+    Decompress a body that was compressed with compress()
+    :return: bytes
+    """
+    if encoding in ('', 'identity'):
+        return data
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'deflate':
+        return zlib.decompress(data)
+    if encoding == 'br' and encoding in available_encodings():
+        return _import_optional('brotli').decompress(data)
+    if encoding == 'zstd' and encoding in available_encodings():
+        return _import_optional('zstandard').ZstdDecompressor().decompress(data)
+    raise ValueError('Unsupported content encoding: {}'.format(encoding))
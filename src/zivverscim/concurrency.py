@@ -0,0 +1,198 @@
+import collections
+import contextlib
+import socket
+import sys
+import threading
+import time
+
+
+def is_timeout(exception):
+    """
+    :return: True when the exception is a (connect or read) timeout of requests, urllib3, httpx or the socket
+    """
+    timeout_classes = (socket.timeout, TimeoutError)
+    # Only the HTTP libraries that were imported can have raised the exception, do not import the others
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        timeout_classes += (requests.exceptions.Timeout,)
+    urllib3 = sys.modules.get('urllib3')
+    if urllib3 is not None:
+        timeout_classes += (urllib3.exceptions.TimeoutError,)
+    httpx = sys.modules.get('httpx')
+    if httpx is not None:
+        timeout_classes += (httpx.TimeoutException,)
+    return isinstance(exception, timeout_classes)
+
+
+class _LimitedRequest:
+    """
+    One request that holds a slot of the AdaptiveConcurrencyLimiter, set the status_code when the response is there
+    """
+
+    def __init__(self, started_at, in_flight):
+        self.started_at = started_at
+        self.in_flight = in_flight
+        self.status_code = None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests that are in flight to Zivver at the same time, with AIMD
+    (additive increase, multiplicative decrease) like TCP congestion control:
+
+    - The limit grows by `increase` per round of healthy responses (limit responses that were fast and not throttled)
+      while at least half of the slots are in use.
+    - The limit is multiplied by decrease_factor on a 429, a 5xx, a timeout, or when the smoothed latency is more
+      than latency_tolerance times the lowest latency of the last `window` responses.
+      Set latency_tolerance to None when the requests differ a lot in size (e.g. pages and single GETs mixed).
+      Responses to requests that were sent before the last decrease do not decrease it again.
+
+    Share one limiter between all threads of a job, the threads block in acquire() until there is a free slot.
+    The current limit is in `limit`, the counters in get_stats().
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, increase=1, decrease_factor=0.5,
+                 latency_tolerance=2.0, window=100, smoothing=0.2):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._smoothed_latency = None
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+        self.increases = 0
+        self.decreases = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.timeouts = 0
+        self.latency_inflations = 0
+        # (monotonic time, new limit) of the last changes of the whole number limit
+        self.history = collections.deque(maxlen=1000)
+
+    @property
+    def limit(self):
+        """
+        :return: Number of requests that may be in flight now
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a free slot
+        :return: _LimitedRequest() object, pass it to release()
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout=timeout):
+                raise TimeoutError('No free request slot within {} seconds'.format(timeout))
+            self._in_flight += 1
+            return _LimitedRequest(time.monotonic(), self._in_flight)
+
+    def release(self, limited_request, exception=None):
+        """
+        Free the slot and adjust the limit on the outcome of the request
+        :param exception: The exception the request raised, if any
+        """
+        latency = time.monotonic() - limited_request.started_at
+        status_code = limited_request.status_code
+
+        with self._condition:
+            self._in_flight -= 1
+
+            congestion = True
+            if exception is not None:
+                if is_timeout(exception):
+                    self.timeouts += 1
+                else:
+                    # Not a signal of the load on Zivver (e.g. connection refused), leave the limit as it is
+                    self._condition.notify()
+                    return
+            elif status_code == 429:
+                self.throttled += 1
+            elif status_code is not None and status_code >= 500:
+                self.server_errors += 1
+            else:
+                congestion = self._record_latency(latency)
+
+            # Requests sent before the last decrease saw the old limit, do not decrease twice for one overload
+            if congestion and limited_request.started_at >= self._decreased_at:
+                self._decrease()
+            elif not congestion and limited_request.in_flight * 2 >= int(self._limit):
+                self._set_limit(self._limit + self.increase / self._limit)
+                self.increases += 1
+            self._condition.notify_all()
+
+    def _record_latency(self, latency):
+        """
+        :return: True when the latency is inflated
+        """
+        if self.latency_tolerance is None:
+            return False
+        self._latencies.append(latency)
+        if self._smoothed_latency is None:
+            self._smoothed_latency = latency
+        else:
+            self._smoothed_latency += self.smoothing * (latency - self._smoothed_latency)
+
+        inflated = self._smoothed_latency > min(self._latencies) * self.latency_tolerance
+        if inflated:
+            self.latency_inflations += 1
+        return inflated
+
+    def _decrease(self):
+        self._set_limit(self._limit * self.decrease_factor)
+        self.decreases += 1
+        self._decreased_at = time.monotonic()
+        # Start over from the latency of the new limit
+        self._smoothed_latency = None
+
+    def _set_limit(self, limit):
+        old_limit = int(self._limit)
+        self._limit = min(max(limit, float(self.min_limit)), float(self.max_limit))
+        if int(self._limit) != old_limit:
+            self.history.append((time.monotonic(), int(self._limit)))
+
+    @contextlib.contextmanager
+    def request(self):
+        """
+        Hold a slot for one request:
+
+            with limiter.request() as limited_request:
+                response = http_client.request(...)
+                limited_request.status_code = response.status_code
+        """
+        limited_request = self.acquire()
+        try:
+            yield limited_request
+        except BaseException as exception:
+            self.release(limited_request, exception=exception)
+            raise
+        self.release(limited_request)
+
+    def get_stats(self):
+        """
+        :return: dict with the current limit and the counters
+        """
+        with self._condition:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'min_latency': min(self._latencies) if self._latencies else None,
+                'smoothed_latency': self._smoothed_latency,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'throttled': self.throttled,
+                'server_errors': self.server_errors,
+                'timeouts': self.timeouts,
+                'latency_inflations': self.latency_inflations
+            }
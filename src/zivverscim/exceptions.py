@@ -1,8 +1,25 @@
+import json
+
+# Only this much of the response text is kept on the error, so failed bulk runs do not keep large bodies alive
+MAX_ERROR_TEXT_LENGTH = 2000
+
+# Schema of the SCIM error bodies, RFC 7644 section 3.12
+SCIM_ERROR_SCHEMA = 'urn:ietf:params:scim:api:messages:2.0:Error'
+
+
 class ZivverMissingRequiredFields(Exception):
     """When there are missing required fields missing"""
     pass
 
 
+class ZivverValidationError(ZivverMissingRequiredFields):
+    """When a user of a batch is invalid, see validation.validate_users()"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
 class ZivverTooManyRequests(Exception):
     """When there are too many requests to the Zivver servers"""
     pass
@@ -11,29 +28,24 @@ class ZivverTooManyRequests(Exception):
 class ZivverCRUDError(Exception):
     """When there are erros in the response"""
 
-    def __init__(self, message, response, code=None, params=None):
+    # True when the same request can succeed when it is retried later
+    retryable = False
+    sollution = None
+
+    def __init__(self, message, response=None, code=None, params=None, status_code=None, reason=None, text=None):
         """
         Exception raised only when there are CRUD errors from Zivver.
-        Saves the response object inside the response variable
+        Only keeps the status code, reason and (shortened) text of the response, not the response object itself.
+        Use classify_error() to get the typed subclass for a response.
         """
         super().__init__(message, code, params)
 
-        self.response = response
-
-        try:
-            self.status_code = response.status_code
-        except AttributeError as ae:
-            self.status_code = 'NO STATUS_CODE'
-
-        try:
-            self.reason = response.reason
-        except AttributeError as ae:
-            self.reason = 'NO REASON'
+        if response is not None:
+            status_code, reason, text = get_response_fields(response)
 
-        try:
-            self.text = response.text
-        except AttributeError as ae:
-            self.text = 'NO TEXT'
+        self.status_code = status_code if status_code is not None else 'NO STATUS_CODE'
+        self.reason = reason if reason is not None else 'NO REASON'
+        self.text = text if text is not None else 'NO TEXT'
 
     def get_error_message(self):
         """
@@ -47,8 +59,17 @@ class ZivverCRUDError(Exception):
         https://docs.zivver.com/en/admin/synctool/troubleshooting/synchronization-log-errors.html
         :return: Sollutions based on Zivver cause
         """
-        if 'Error creating alias: Alias is already taken for' in self.text:
-            return """
+        return self.sollution
+
+
+class ZivverTokenError(Exception):
+    """When no OAuth token could be fetched from the token endpoint"""
+    pass
+
+
+class ZivverAliasConflictError(ZivverCRUDError):
+    """When the alias is already taken by another Zivver account"""
+    sollution = """
                 Cause
                 The message Alias is already taken means that the email alias is a separate 
                 account on the Zivver platform, instead of being an email alias like in Exchange.
@@ -61,11 +82,17 @@ class ZivverCRUDError(Exception):
                 error and merge the account mentioned after "error creating alias: 
                 Alias is already taken for "ZivverUID" in the error.
                 How to merge two accounts\r\n"""
-        if 'Unknown account with uuid:' in self.text:
-            return """
+
+
+class ZivverUnknownAccountError(ZivverCRUDError):
+    """When the account does not exist in Zivver"""
+    sollution = """
                 Account probably does not exist, did you create the account?\r\n"""
-        if 'Account is outside the organization' == self.text:
-            return """
+
+
+class ZivverOutsideOrganizationError(ZivverCRUDError):
+    """When the account is outside the organization, or the account type can not be changed"""
+    sollution = """
                 There are multiple possible causes for this error:
                 
                 Cause 1
@@ -87,4 +114,91 @@ class ZivverCRUDError(Exception):
                 
                 Mailbox type	    Recommended Zivver account type
                 User mailbox        Normal account
-                Shared mailbox      Functional account\r\n"""
\ No newline at end of file
+                Shared mailbox      Functional account\r\n"""
+
+
+class ZivverAuthError(ZivverCRUDError):
+    """When Zivver rejects the API key or token (401/403)"""
+    pass
+
+
+class ZivverConflictError(ZivverCRUDError):
+    """When the account already exists"""
+    pass
+
+
+class ZivverThrottledError(ZivverTooManyRequests, ZivverCRUDError):
+    """When Zivver throttles the requests (429), retry the request later"""
+    retryable = True
+
+
+class ZivverServerError(ZivverCRUDError):
+    """When Zivver has an error or is unavailable (5xx), retry the request later"""
+    retryable = True
+
+
+def get_response_fields(response):
+    """
+    Get the compact fields of the response once
+    :param response: The requests response object, or the json dict that Zivver returned
+    :return: (status_code, reason, text), the text is shortened to MAX_ERROR_TEXT_LENGTH
+    """
+    if type(response) is dict:
+        status_code = response.get('code', response.get('status'))
+        # SCIM error bodies (RFC 7644) send the status as a string, e.g. "400"
+        if isinstance(status_code, str) and status_code.strip().isdigit():
+            status_code = int(status_code)
+        return status_code, None, json.dumps(response)[:MAX_ERROR_TEXT_LENGTH]
+
+    status_code = getattr(response, 'status_code', None)
+    reason = getattr(response, 'reason', None)
+    try:
+        text = response.text[:MAX_ERROR_TEXT_LENGTH]
+    except (AttributeError, TypeError):
+        text = None
+    return status_code, reason, text
+
+
+def is_error_body(response):
+    """
+    :param response: The json dict that Zivver returned
+    :return: True for a SCIM error body (RFC 7644) or a body with an error status or code
+    """
+    if SCIM_ERROR_SCHEMA in (response.get('schemas') or ()):
+        return True
+    status_code, _, _ = get_response_fields(response)
+    return isinstance(status_code, int) and status_code >= 400
+
+
+def get_error_class(status_code, text):
+    """
+    Maps the status code and text of a Zivver response to the typed ZivverCRUDError subclass
+    :return: ZivverCRUDError class
+    """
+    text = text or ''
+    if 'Error creating alias: Alias is already taken for' in text:
+        return ZivverAliasConflictError
+    if text == 'Account is outside the organization':
+        return ZivverOutsideOrganizationError
+    if 'Unknown account with uuid:' in text or status_code == 404:
+        return ZivverUnknownAccountError
+    if status_code in (401, 403):
+        return ZivverAuthError
+    if status_code == 429:
+        return ZivverThrottledError
+    if status_code == 409 or 'already exists' in text:
+        return ZivverConflictError
+    if isinstance(status_code, int) and 500 <= status_code < 600:
+        return ZivverServerError
+    return ZivverCRUDError
+
+
+def classify_error(response, message='Response from Zivver with Errors'):
+    """
+    Classify the failed response once and create the typed error, which only keeps the compact fields
+    :param response: The requests response object, or the json dict that Zivver returned
+    :return: ZivverCRUDError (subclass) object
+    """
+    status_code, reason, text = get_response_fields(response)
+    error_class = get_error_class(status_code, text)
+    return error_class(message, status_code=status_code, reason=reason, text=text)
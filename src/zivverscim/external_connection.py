@@ -1,5 +1,8 @@
 import json
-import requests
+
+from . import profiling
+from .compression import accept_encoding_header, compress
+from .token_provider import StaticTokenProvider
 
 
 class OauthConnection:
@@ -7,7 +10,9 @@ class OauthConnection:
     Object will be post/update/delete via this class in the external application
     """
 
-    def __init__(self, external_oauth_token_value=None, extra_headers=None):
+    def __init__(self, external_oauth_token_value=None, extra_headers=None, token_provider=None, http_client=None,
+                 compress_requests=None, compression_threshold=1024, accept_compressed_responses=True, timeout=None,
+                 concurrency_limiter=None, traffic_recorder=None):
         self.external_oauth_token_value = external_oauth_token_value
         self.custom_oauth_header = {
             'header_key': 'Authorization',
@@ -15,6 +20,31 @@ class OauthConnection:
         }
         self.extra_headers = extra_headers
 
+        # The token provider hands out the Bearer token, defaults to the static API key
+        if token_provider is None:
+            token_provider = StaticTokenProvider(external_oauth_token_value)
+        self.token_provider = token_provider
+        self._has_custom_oauth_header = False
+
+        # Pooled client shared between requests, any zivverscim.transport.Transport (requests.Session(),
+        # Urllib3Transport(), Http2Client(), InProcessTransport()), None opens a new connection with requests
+        self.http_client = http_client
+
+        # Request bodies of at least compression_threshold bytes are compressed with compress_requests
+        # (gzip, deflate, br or zstd), None sends them uncompressed
+        self.compress_requests = compress_requests
+        self.compression_threshold = compression_threshold
+        self.accept_compressed_responses = accept_compressed_responses
+
+        # Seconds to wait for Zivver (connect and read), None waits forever
+        self.timeout = timeout
+
+        # Optional AdaptiveConcurrencyLimiter, shared by the threads of a bulk job
+        self.concurrency_limiter = concurrency_limiter
+
+        # Optional TrafficRecorder, records the (redacted) shape and timing of every request
+        self.traffic_recorder = traffic_recorder
+
     def add_extra_headers(self, extra_headers):
         """
         Add extra headers to the OAuth object
@@ -33,6 +63,7 @@ class OauthConnection:
             'header_key': header_key,
             'header_value': header_value
         }
+        self._has_custom_oauth_header = True
 
     def _get_content_length_of_object_serialized(self, object_serialized):
         """
@@ -41,17 +72,29 @@ class OauthConnection:
         content_length = len(json.dumps(object_serialized))
         return content_length
 
-    def _create_authorization_header(self, object_serialized=None):
+    def _get_decodable_encodings(self):
+        """
+        :return: The content encodings the http client decodes, None for those of urllib3 (requests)
+        """
+        decodable_encodings = getattr(self.http_client, 'decodable_encodings', None)
+        return decodable_encodings() if decodable_encodings is not None else None
+
+    def _create_authorization_header(self, object_serialized=None, token=None, data=None, content_encoding=None):
         """
         Creates the headers that are send with the requests
+        When the body bytes (data) are given, the Content-Length is the length of those (compressed) bytes
         """
         header_key = self.custom_oauth_header['header_key']
         header_value = self.custom_oauth_header['header_value']
+        if token is not None and not self._has_custom_oauth_header:
+            header_value = 'Bearer {}'.format(token)
 
         headers = {
             header_key: header_value,
             'Content-type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': (accept_encoding_header(self._get_decodable_encodings())
+                                if self.accept_compressed_responses else 'identity')
         }
 
         # add extra headers if any:
@@ -59,68 +102,120 @@ class OauthConnection:
             for key, val in self.extra_headers.items():
                 headers[key] = val
 
-        if object_serialized is not None:
+        if data is not None:
+            headers['Content-Length'] = '{}'.format(len(data))
+        elif object_serialized is not None:
             content_length = self._get_content_length_of_object_serialized(object_serialized)
             headers['Content-Length'] = '{}'.format(content_length)
 
+        if content_encoding is not None:
+            headers['Content-Encoding'] = content_encoding
+
         return headers
 
+    def _request(self, http_client, method, url, headers, data, object_serialized=None):
+        """
+        Send one request, within a slot of the concurrency limiter when there is one
+        :return: The response object
+        """
+        if self.traffic_recorder is None:
+            return self._limited_request(http_client, method, url, headers, data)
+
+        begun = self.traffic_recorder.begin()
+        try:
+            result = self._limited_request(http_client, method, url, headers, data)
+        except Exception as exception:
+            self.traffic_recorder.end(begun, method, url, object_serialized, data, exception=exception)
+            raise
+        self.traffic_recorder.end(begun, method, url, object_serialized, data, response=result)
+        return result
+
+    def _limited_request(self, http_client, method, url, headers, data):
+        if self.concurrency_limiter is None:
+            with profiling.phase(profiling.PHASE_NETWORK):
+                return http_client.request(method, url, headers=headers, data=data, timeout=self.timeout)
+
+        with self.concurrency_limiter.request() as limited_request:
+            with profiling.phase(profiling.PHASE_NETWORK):
+                result = http_client.request(method, url, headers=headers, data=data, timeout=self.timeout)
+            limited_request.status_code = result.status_code
+        return result
+
+    def _send_request(self, method, url, object_serialized=None):
+        """
+        Send the request with the token from the token provider.
+        When Zivver rejects the token with a 401 and the provider can fetch a new one, retry once.
+        :return: The defualt json() object, if none, then returns the response object.
+                 Error responses (status code 400 and up) are not decoded, so the status code is kept
+        """
+        data = None
+        content_encoding = None
+        if object_serialized is not None:
+            with profiling.phase(profiling.PHASE_ENCODE):
+                data = json.dumps(object_serialized).encode('utf-8')
+                if self.compress_requests and len(data) >= self.compression_threshold:
+                    data = compress(data, self.compress_requests)
+                    content_encoding = self.compress_requests
+
+        http_client = self.http_client
+        if http_client is None:
+            import requests
+            http_client = requests
+
+        token = self.token_provider.get_token()
+        headers = self._create_authorization_header(object_serialized, token=token, data=data,
+                                                    content_encoding=content_encoding)
+        result = self._request(http_client, method, url, headers, data, object_serialized)
+
+        if result.status_code == 401 and self.token_provider.can_refresh and not self._has_custom_oauth_header:
+            self.token_provider.invalidate(token)
+            token = self.token_provider.get_token()
+            headers = self._create_authorization_header(object_serialized, token=token, data=data,
+                                                        content_encoding=content_encoding)
+            result = self._request(http_client, method, url, headers, data, object_serialized)
+
+        if result.status_code < 400:
+            with profiling.phase(profiling.PHASE_DECODE):
+                try:
+                    result = result.json()
+                except Exception:
+                    pass
+
+        if self.traffic_recorder is not None:
+            self.traffic_recorder.finish(result)
+        return result
+
     def return_request_post_data(self, post_url, object_serialized):
         """
         Do a POST request to the URL
         :return: The defualt json() object, if none, then returns the response object
         """
-        headers = self._create_authorization_header(object_serialized)
-        result = requests.post(post_url, headers=headers, json=object_serialized)
-        try:
-            return result.json()
-        except Exception:
-            return result
+        return self._send_request('POST', post_url, object_serialized)
 
     def return_request_get_data(self, get_url):
         """
         Do a GET request to the url and return the data
         :return: The defualt json() object, if none, then returns the response object
         """
-        headers = self._create_authorization_header()
-        result = requests.get(get_url, headers=headers)
-        try:
-            return result.json()
-        except Exception:
-            return result
+        return self._send_request('GET', get_url)
 
     def return_request_delete_data(self, delete_url):
         """
         Requests a DELETE method
         :return: The defualt json() object, if none, then returns the response object
         """
-        headers = self._create_authorization_header()
-        result = requests.delete(delete_url, headers=headers)
-        try:
-            return result.json()
-        except Exception:
-            return result
+        return self._send_request('DELETE', delete_url)
 
     def return_request_patch_data(self, patch_url, object_serialized):
         """
         Do a PATCH request to the URL
         :return: The defualt json() object, if none, then returns the response object
         """
-        headers = self._create_authorization_header(object_serialized)
-        result = requests.patch(patch_url, headers=headers, json=object_serialized)
-        try:
-            return result.json()
-        except Exception:
-            return result
+        return self._send_request('PATCH', patch_url, object_serialized)
 
     def return_request_put_data(self, put_url, object_serialized):
         """
         Do a PUT request to the URL
         :return: The defualt json() object, if none, then returns the response object
         """
-        headers = self._create_authorization_header(object_serialized)
-        result = requests.put(put_url, headers=headers, json=object_serialized)
-        try:
-            return result.json()
-        except Exception:
-            return result
+        return self._send_request('PUT', put_url, object_serialized)
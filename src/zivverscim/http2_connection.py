@@ -0,0 +1,113 @@
+import json
+import warnings
+
+# httpx is imported on first use, importing it takes longer than the rest of the library.
+# None when not imported yet, False when it is not installed
+_httpx = None
+
+
+def _import_httpx():
+    """
+    :return: The httpx module, None when httpx[http2] is not installed
+    """
+    global _httpx
+    if _httpx is None:
+        try:
+            import httpx
+            import h2  # noqa: F401, httpx needs h2 for HTTP/2
+            _httpx = httpx
+        except ImportError:
+            _httpx = False
+    return _httpx or None
+
+
+def is_http2_available():
+    """
+    :return: True when the optional httpx[http2] dependency is installed
+    """
+    return _import_httpx() is not None
+
+
+class Http2Response:
+    """
+    Gives the httpx response the same attributes as the requests response that the library uses
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.headers = response.headers
+        self.content = response.content
+        self.http_version = response.http_version
+
+    @property
+    def text(self):
+        return self._response.text
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Http2Client:
+    """
+    Sends the requests over HTTP/2 with httpx, so hundreds of concurrent requests share a few connections.
+    When the server does not support HTTP/2 the connection falls back to HTTP/1.1 (ALPN).
+    Set http2_prior_knowledge to talk HTTP/2 to a server without TLS, there is no fallback in that case.
+    """
+
+    def __init__(self, max_connections=2, timeout=30, verify=True, http2_prior_knowledge=False):
+        httpx = _import_httpx()
+        if httpx is None:
+            raise ImportError('HTTP/2 needs the httpx[http2] package: pip install zivverscim[http2]')
+
+        self._use_client_default = httpx.USE_CLIENT_DEFAULT
+        self.client = httpx.Client(
+            http1=not http2_prior_knowledge,
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            verify=verify
+        )
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        """
+        Same signature as requests.request() for the arguments that OauthConnection uses
+        :return: Http2Response() object
+        """
+        if timeout is None:
+            timeout = self._use_client_default
+        response = self.client.request(method, url, headers=headers, content=data, timeout=timeout)
+        return Http2Response(response)
+
+    def close(self):
+        self.client.close()
+
+    def decodable_encodings(self):
+        """
+        :return: The content encodings httpx decodes, from its default Accept-Encoding header
+        """
+        accept_encoding = self.client.headers.get('accept-encoding', 'gzip, deflate')
+        return [encoding.strip() for encoding in accept_encoding.split(',')]
+
+
+def create_http_client(http2=False, max_connections=10, timeout=None, transport='requests'):
+    """
+    Create the pooled client that is shared by all requests of a ZivverSCIMConnection.
+    Falls back to a HTTP/1.1 requests.Session() when HTTP/2 is asked for but httpx is not installed.
+    :param timeout: Seconds to wait for Zivver (connect and read), None waits forever, the same for every transport
+    :param transport: requests, urllib3 or http2, see zivverscim.transport
+    :return: Http2Client(), Urllib3Transport() or RequestsTransport() object
+    """
+    from .transport import RequestsTransport, Urllib3Transport
+
+    if http2 or transport == 'http2':
+        if is_http2_available():
+            return Http2Client(max_connections=max_connections, timeout=timeout)
+        warnings.warn('httpx[http2] is not installed, falling back to HTTP/1.1')
+
+    if transport == 'urllib3':
+        return Urllib3Transport(max_connections=max_connections, timeout=timeout)
+    if transport not in ('requests', 'http2'):
+        raise ValueError('Unknown transport: {}'.format(transport))
+    return RequestsTransport(max_connections=max_connections)
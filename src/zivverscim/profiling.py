@@ -0,0 +1,358 @@
+import atexit
+import contextlib
+import functools
+import io
+import os
+import sys
+import threading
+import time
+
+# CPU time of the calling thread, so concurrent requests do not count each others CPU time
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+# The phases of one operation, in the order they happen
+PHASE_BUILD = 'build'        # building the SCIM payload in scim_connection_crud
+PHASE_ENCODE = 'encode'      # json.dumps() (and compression) of the request body in OauthConnection
+PHASE_NETWORK = 'network'    # sending the request and receiving the response
+PHASE_DECODE = 'decode'      # result.json()
+PHASE_WRAP = 'wrap'          # get_zivver_user_object()
+PHASES = [PHASE_BUILD, PHASE_ENCODE, PHASE_NETWORK, PHASE_DECODE, PHASE_WRAP]
+
+# Time of the operation that is not in one of the phases (checks, token provider, ...)
+PHASE_OTHER = 'other'
+# Operation name for phases that run outside of an operation, e.g. OauthConnection used directly
+OPERATION_UNKNOWN = 'unknown'
+
+_active_profiler = None
+
+
+class _NullContext:
+    """
+    Context manager that does nothing, when no profiler is active (contextlib.nullcontext() needs Python 3.7)
+    """
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_context = _NullContext()
+
+
+class _Timing:
+    """
+    Sum of the wall and CPU time of one phase or operation
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_wall = 0.0
+
+    def add(self, wall, cpu):
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.max_wall = max(self.max_wall, wall)
+
+    def to_dict(self):
+        return {'count': self.count, 'wall': self.wall, 'cpu': self.cpu, 'max_wall': self.max_wall}
+
+
+class Profiler:
+    """
+    Records the wall and CPU time per phase (see PHASES) of every operation (create, get, list_page, ...).
+    The first cprofile_samples operations are run under cProfile, the first tracemalloc_samples operations
+    record the top allocations, so the profiling costs stay bounded on long runs.
+    Use profile() or the ZIVVERSCIM_PROFILE environment variable to enable it.
+    """
+
+    def __init__(self, cprofile_samples=0, tracemalloc_samples=0, tracemalloc_top=10, report_path=None):
+        self.cprofile_samples = cprofile_samples
+        self.tracemalloc_samples = tracemalloc_samples
+        self.tracemalloc_top = tracemalloc_top
+        # File the report is written to by stop(), None writes it to stderr, False does not write it
+        self.report_path = report_path
+
+        # operation -> _Timing()
+        self.operations = {}
+        # (operation, phase) -> _Timing()
+        self.phases = {}
+        self.started_at = None
+        self.wall = 0.0
+
+        self._cprofile_stats = None
+        self._cprofile_taken = 0
+        # cProfile can only profile one operation at a time
+        self._cprofile_lock = threading.Lock()
+        self._tracemalloc_taken = 0
+        self._tracemalloc_started = False
+        # List of (operation, [top allocation lines])
+        self.tracemalloc_stats = []
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Make this the active profiler
+        """
+        global _active_profiler
+        # cProfile, pstats and tracemalloc are imported when they are used, they slow down the import of the library
+        if self.tracemalloc_samples:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc_started = True
+        self.started_at = time.perf_counter()
+        _active_profiler = self
+        return self
+
+    def stop(self):
+        """
+        Stop profiling and write the report to report_path
+        """
+        global _active_profiler
+        if _active_profiler is self:
+            _active_profiler = None
+        if self.started_at is not None:
+            self.wall = time.perf_counter() - self.started_at
+        if self._tracemalloc_started:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracemalloc_started = False
+
+        if self.report_path is False:
+            return
+        if self.report_path is None:
+            sys.stderr.write(self.format_report())
+        else:
+            with open(self.report_path, 'w') as report_file:
+                report_file.write(self.format_report())
+
+    def _take_sample(self, taken_attribute, samples):
+        with self._lock:
+            if getattr(self, taken_attribute) >= samples:
+                return False
+            setattr(self, taken_attribute, getattr(self, taken_attribute) + 1)
+            return True
+
+    @contextlib.contextmanager
+    def operation(self, name):
+        """
+        Time one operation, nested operations are counted as part of the outer operation
+        """
+        if getattr(self._local, 'operation', None) is not None:
+            yield
+            return
+
+        self._local.operation = name
+        profile = None
+        if self.cprofile_samples and self._cprofile_lock.acquire(blocking=False):
+            if self._take_sample('_cprofile_taken', self.cprofile_samples):
+                import cProfile
+                profile = cProfile.Profile()
+            else:
+                self._cprofile_lock.release()
+        snapshot = None
+        if self.tracemalloc_samples:
+            import tracemalloc
+            if tracemalloc.is_tracing() and self._take_sample('_tracemalloc_taken', self.tracemalloc_samples):
+                snapshot = tracemalloc.take_snapshot()
+
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = _cpu_time() - cpu_start
+            self._local.operation = None
+
+            with self._lock:
+                self.operations.setdefault(name, _Timing()).add(wall, cpu)
+            if profile is not None:
+                self._add_cprofile(profile)
+                self._cprofile_lock.release()
+            if snapshot is not None:
+                self._add_tracemalloc(name, snapshot)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time one phase of the current operation
+        """
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = _cpu_time() - cpu_start
+            operation = getattr(self._local, 'operation', None) or OPERATION_UNKNOWN
+            with self._lock:
+                self.phases.setdefault((operation, name), _Timing()).add(wall, cpu)
+
+    def _add_cprofile(self, profile):
+        import pstats
+        with self._lock:
+            if self._cprofile_stats is None:
+                self._cprofile_stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                self._cprofile_stats.add(profile)
+
+    def _add_tracemalloc(self, name, snapshot):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return
+        top_stats = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:self.tracemalloc_top]
+        with self._lock:
+            self.tracemalloc_stats.append((name, [str(top_stat) for top_stat in top_stats]))
+
+    def get_summary(self):
+        """
+        :return: dict operation -> {'total': timing, 'phases': {phase: timing}}, a timing is a dict with
+                 count, wall, cpu and max_wall (seconds). The 'other' phase is the time outside the phases.
+        """
+        with self._lock:
+            summary = {}
+            operation_names = set(self.operations) | {operation for operation, _ in self.phases}
+            for operation in sorted(operation_names):
+                total = self.operations.get(operation, _Timing())
+                phases = {
+                    phase: timing.to_dict() for (phase_operation, phase), timing in self.phases.items()
+                    if phase_operation == operation
+                }
+                if total.count:
+                    phases[PHASE_OTHER] = {
+                        'count': total.count,
+                        'wall': max(total.wall - sum(phase['wall'] for phase in phases.values()), 0.0),
+                        'cpu': max(total.cpu - sum(phase['cpu'] for phase in phases.values()), 0.0),
+                        'max_wall': None
+                    }
+                summary[operation] = {'total': total.to_dict(), 'phases': phases}
+            return summary
+
+    def get_cprofile_stats(self):
+        """
+        :return: pstats.Stats() of the sampled operations, None when nothing was sampled
+        """
+        return self._cprofile_stats
+
+    def format_report(self, cprofile_lines=25):
+        """
+        :return: The summary report as text
+        """
+        lines = ['zivverscim profile, {:.3f}s wall'.format(self.wall), '']
+        lines.append('{:<14} {:<9} {:>8} {:>11} {:>11} {:>8} {:>11}'.format(
+            'operation', 'phase', 'count', 'wall ms', 'cpu ms', 'wall %', 'avg ms'))
+        for operation, operation_summary in self.get_summary().items():
+            total = operation_summary['total']
+            lines.append('{:<14} {:<9} {:>8} {:>11.2f} {:>11.2f} {:>8} {:>11.3f}'.format(
+                operation, 'total', total['count'], total['wall'] * 1000, total['cpu'] * 1000, '',
+                total['wall'] * 1000 / total['count'] if total['count'] else 0))
+            for phase in PHASES + [PHASE_OTHER]:
+                timing = operation_summary['phases'].get(phase)
+                if timing is None:
+                    continue
+                lines.append('{:<14} {:<9} {:>8} {:>11.2f} {:>11.2f} {:>8.1f} {:>11.3f}'.format(
+                    '', phase, timing['count'], timing['wall'] * 1000, timing['cpu'] * 1000,
+                    timing['wall'] / total['wall'] * 100 if total['wall'] else 0,
+                    timing['wall'] * 1000 / timing['count'] if timing['count'] else 0))
+
+        if self._cprofile_stats is not None:
+            stream = io.StringIO()
+            self._cprofile_stats.stream = stream
+            self._cprofile_stats.sort_stats('cumulative').print_stats(cprofile_lines)
+            lines += ['', 'cProfile of {} sampled operations'.format(self._cprofile_taken), stream.getvalue()]
+
+        if self.tracemalloc_stats:
+            lines += ['', 'tracemalloc of {} sampled operations'.format(len(self.tracemalloc_stats))]
+            for operation, top_stats in self.tracemalloc_stats:
+                lines.append('{}:'.format(operation))
+                lines += ['    {}'.format(top_stat) for top_stat in top_stats]
+
+        return '\n'.join(lines) + '\n'
+
+
+def get_active_profiler():
+    """
+    :return: The active Profiler() object, None when profiling is off
+    """
+    return _active_profiler
+
+
+def operation(name):
+    """
+    Time an operation on the active profiler, does nothing when profiling is off
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return _null_context
+    return profiler.operation(name)
+
+
+def profiled(name):
+    """
+    Decorator that times every call of the function as an operation, see operation()
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with operation(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def phase(name):
+    """
+    Time a phase of the current operation on the active profiler, does nothing when profiling is off
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return _null_context
+    return profiler.phase(name)
+
+
+@contextlib.contextmanager
+def profile(cprofile_samples=0, tracemalloc_samples=0, tracemalloc_top=10, report_path=False):
+    """
+    Profile the zivverscim operations within the with block:
+
+        with profile(cprofile_samples=10, report_path='zivver-profile.txt') as profiler:
+            zivver_scim_connection.get_all_users_from_zivver(page_size=100)
+        print(profiler.format_report())
+
+    :param report_path: File the report is written to at the end, None writes to stderr, False does not write
+    :return: Profiler() object
+    """
+    profiler = Profiler(cprofile_samples=cprofile_samples, tracemalloc_samples=tracemalloc_samples,
+                        tracemalloc_top=tracemalloc_top, report_path=report_path).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def _profile_from_environment():
+    """
+    ZIVVERSCIM_PROFILE=1 profiles the whole run and writes the report at exit, to stderr or to
+    ZIVVERSCIM_PROFILE_REPORT. ZIVVERSCIM_PROFILE_SAMPLES is the number of cProfile and tracemalloc samples.
+    """
+    if os.environ.get('ZIVVERSCIM_PROFILE', '').lower() not in ('1', 'true', 'yes'):
+        return
+    samples = int(os.environ.get('ZIVVERSCIM_PROFILE_SAMPLES', '0'))
+    profiler = Profiler(cprofile_samples=samples, tracemalloc_samples=samples,
+                        report_path=os.environ.get('ZIVVERSCIM_PROFILE_REPORT') or None).start()
+    atexit.register(profiler.stop)
+
+
+_profile_from_environment()
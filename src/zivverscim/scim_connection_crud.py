@@ -1,8 +1,78 @@
+import json
+import threading
 import urllib.parse
-
-from .exceptions import ZivverMissingRequiredFields, ZivverCRUDError, ZivverTooManyRequests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import profiling
+from .columnar import (build_scim_users_from_user_columns, columns_to_output, get_user_columns,
+                       iter_rows_of_user_columns, users_to_columns)
+from .exceptions import (ZivverMissingRequiredFields, ZivverCRUDError, ZivverTooManyRequests, ZivverConflictError,
+                         ZivverAliasConflictError, ZivverUnknownAccountError, ZivverValidationError, classify_error,
+                         is_error_body)
 from .external_connection import OauthConnection
-from .wrapper import get_zivver_user_object
+from .http2_connection import create_http_client
+from .validation import validate_users
+from .wrapper import NOT_LOADED, UpsertResult, get_scim_user_object, get_unloaded_fields, get_zivver_user_object
+
+
+# tenant -> (configuration key, ZivverSCIMConnection()), see get_zivver_scim_connection()
+_connection_registry = {}
+_connection_registry_lock = threading.Lock()
+
+
+def _get_configuration_key(kwargs):
+    """
+    :return: Hashable key of the ZivverSCIMConnection arguments, objects (token provider, limiter) by identity
+    """
+    configuration_key = []
+    for key, value in sorted(kwargs.items()):
+        try:
+            hash(value)
+        except TypeError:
+            value = id(value)
+        configuration_key.append((key, value))
+    return tuple(configuration_key)
+
+
+def get_zivver_scim_connection(tenant=None, warm_up=0, **kwargs):
+    """
+    Get the ZivverSCIMConnection of the tenant from a module-level registry, so the warm invocations of a
+    short-lived function (serverless) reuse the pooled connections and the cached token of the previous one.
+    A new connection is created (and the old one closed) when the arguments of the tenant changed.
+    Create the token_provider once per process too, otherwise every call creates a new connection.
+    :param tenant: Key of the connection, defaults to the API key and get url
+    :param warm_up: Number of connections to open right away when the connection is created, see warm_up()
+    :param kwargs: The ZivverSCIMConnection() arguments
+    :return: ZivverSCIMConnection() object
+    """
+    if tenant is None:
+        tenant = (kwargs.get('external_oauth_token_value'), kwargs.get('scim_api_get_url'))
+    configuration_key = _get_configuration_key(kwargs)
+
+    with _connection_registry_lock:
+        registered = _connection_registry.get(tenant)
+        if registered is not None and registered[0] == configuration_key:
+            return registered[1]
+
+        zivver_scim_connection = ZivverSCIMConnection(**kwargs)
+        _connection_registry[tenant] = (configuration_key, zivver_scim_connection)
+    if registered is not None:
+        registered[1].close()
+
+    if warm_up:
+        zivver_scim_connection.warm_up(connections=warm_up)
+    return zivver_scim_connection
+
+
+def close_zivver_scim_connections():
+    """
+    Close and forget all connections of the registry
+    """
+    with _connection_registry_lock:
+        registered_connections = list(_connection_registry.values())
+        _connection_registry.clear()
+    for _, zivver_scim_connection in registered_connections:
+        zivver_scim_connection.close()
 
 
 class ZivverSCIMConnection:
@@ -11,17 +81,107 @@ class ZivverSCIMConnection:
     """
 
     def __init__(self, external_oauth_token_value, scim_api_create_url, scim_api_update_url,
-                 scim_api_get_url, scim_api_delete_url):
+                 scim_api_get_url, scim_api_delete_url, token_provider=None, http2=False, max_connections=10,
+                 http_client=None, compress_requests=None, compression_threshold=1024,
+                 accept_compressed_responses=True, timeout=None, concurrency_limiter=None, transport='requests',
+                 traffic_recorder=None):
         self.external_oauth_token_value = external_oauth_token_value
         self.scim_api_create_url = scim_api_create_url
         self.scim_api_update_url = scim_api_update_url
         self.scim_api_get_url = scim_api_get_url
         self.scim_api_delete_url = scim_api_delete_url
 
+        # Optional TokenProvider, shared by all requests so the token is cached between operations
+        self.token_provider = token_provider
+
+        # Connections to Zivver are pooled and reused by all requests of this object.
+        # With http2=True the requests are multiplexed over max_connections HTTP/2 connections.
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.http_client = http_client
+        self._http_client_lock = threading.Lock()
+
+        # Transport of the pooled client: requests, urllib3 (less overhead per request) or http2.
+        # Pass an InProcessTransport() (or any zivverscim.transport.Transport) as http_client to use your own.
+        self.transport = transport
+
+        # Compress request bodies above the threshold (gzip, deflate, br or zstd) and ask for compressed responses
+        self.compress_requests = compress_requests
+        self.compression_threshold = compression_threshold
+        self.accept_compressed_responses = accept_compressed_responses
+
+        # Seconds to wait for a response from Zivver, None waits forever
+        self.timeout = timeout
+
+        # Optional AdaptiveConcurrencyLimiter, adapts the number of requests in flight to what Zivver can handle.
+        # The max_workers of the bulk methods is then the upper bound.
+        self.concurrency_limiter = concurrency_limiter
+
+        # Optional zivverscim.traffic.TrafficRecorder, to replay the traffic offline
+        self.traffic_recorder = traffic_recorder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections to Zivver
+        """
+        with self._http_client_lock:
+            if self.http_client is not None:
+                self.http_client.close()
+                self.http_client = None
+
+    def _get_http_client(self):
+        """
+        :return: The pooled client, created on first use
+        """
+        if self.http_client is None:
+            with self._http_client_lock:
+                if self.http_client is None:
+                    self.http_client = create_http_client(http2=self.http2, max_connections=self.max_connections,
+                                                          timeout=self.timeout, transport=self.transport)
+        return self.http_client
+
+    def warm_up(self, connections=1):
+        """
+        Fetch the token and open the pooled connections (DNS, TCP, TLS) before the first real request,
+        with small listing requests (count=1, only the id). Useful right after a cold start.
+        :param connections: Number of connections to open, the requests are sent at the same time
+        """
+        if self.token_provider is not None:
+            self.token_provider.get_token()
+
+        query_parameters, unloaded_fields = self._get_projection(attributes=['id'])
+        if connections <= 1:
+            self._get_users_page(1, 1, query_parameters, unloaded_fields)
+            return
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [executor.submit(self._get_users_page, 1, 1, query_parameters, unloaded_fields)
+                       for _ in range(connections)]
+            for future in futures:
+                future.result()
+
+    def _get_oauth_connection(self):
+        """
+        :return: OauthConnection() object used to send the requests to Zivver
+        """
+        return OauthConnection(external_oauth_token_value=self.external_oauth_token_value,
+                               token_provider=self.token_provider, http_client=self._get_http_client(),
+                               compress_requests=self.compress_requests,
+                               compression_threshold=self.compression_threshold,
+                               accept_compressed_responses=self.accept_compressed_responses,
+                               timeout=self.timeout, concurrency_limiter=self.concurrency_limiter,
+                               traffic_recorder=self.traffic_recorder)
+
     def _check_required_create_fields(self, last_name=None, user_name=None, sso_connection=None,
                                       zivver_account_key=None):
         # Check for required fields
-        if not self.external_oauth_token_value:
+        if not self.external_oauth_token_value and self.token_provider is None:
             raise ZivverMissingRequiredFields('Missing field: external_oauth_token_value')
         if not self.scim_api_create_url:
             raise ZivverMissingRequiredFields('Missing field: scim_api_create_url')
@@ -49,17 +209,55 @@ class ZivverSCIMConnection:
         if not account_id:
             raise ZivverMissingRequiredFields('Missing field: account_id')
 
+    def _get_projection(self, attributes=None, excluded_attributes=None):
+        """
+        Builds the SCIM attributes/excludedAttributes query parameters
+        :param attributes: List (or comma separated string) of SCIM attributes to return, e.g. ['userName']
+        :param excluded_attributes: List (or comma separated string) of SCIM attributes to leave out
+        :return: (query parameters dict, unloaded ZivverUser fields)
+        """
+        if isinstance(attributes, str):
+            attributes = attributes.split(',')
+        if isinstance(excluded_attributes, str):
+            excluded_attributes = excluded_attributes.split(',')
+
+        attributes = [attribute.strip() for attribute in attributes or [] if attribute.strip()]
+        excluded_attributes = [attribute.strip() for attribute in excluded_attributes or [] if attribute.strip()]
+
+        query_parameters = {}
+        if attributes:
+            query_parameters['attributes'] = ','.join(attributes)
+        if excluded_attributes:
+            query_parameters['excludedAttributes'] = ','.join(excluded_attributes)
+
+        return query_parameters, get_unloaded_fields(attributes, excluded_attributes)
+
+    def _add_query_parameters(self, url, query_parameters):
+        """
+        :return: The url with the query parameters added
+        """
+        if not query_parameters:
+            return url
+        separator = '&' if '?' in url else '?'
+        return '{}{}{}'.format(url, separator, urllib.parse.urlencode(query_parameters, safe=',:'))
+
     def _check_response(self, response, check_for_resources=False):
         """
         Check the repsone for errors, raise if there are any errors.
+        The errors are classified once into the typed ZivverCRUDError subclasses, see exceptions.classify_error()
         """
-        if type(response) is not dict and response.status_code in [400, 401, 403, 404]:
-            raise ZivverCRUDError(message='Response from Zivver with Errors', response=response)
+        if type(response) is not dict and response.status_code == 429:
+            raise classify_error(response, message='Zivver can only process soo much, retry the request!')
+        if type(response) is not dict and response.status_code >= 400:
+            raise classify_error(response)
         if type(response) is dict and response.get('code', 0) in [429]:
-            raise ZivverTooManyRequests('Zivver can only process soo much, retry the request!')
+            raise classify_error(response, message='Zivver can only process soo much, retry the request!')
+        if type(response) is dict and is_error_body(response):
+            raise classify_error(response)
         if check_for_resources is True and type(response) is dict and response.get('Resources', None) is None:
-            raise ZivverCRUDError(message='Response from Zivver with Errors', response=response)
+            raise classify_error(response)
 
+    @profiling.profiled('create')
     def create_user_in_zivver(self, first_name=None, last_name=None, nick_name=None, user_name=None,
                               zivver_account_key=None, sso_connection=False, is_active=False, aliases=[],
                               delegates=[]):
@@ -70,41 +268,63 @@ class ZivverSCIMConnection:
         self._check_required_create_fields(last_name=last_name, user_name=user_name, sso_connection=sso_connection,
                                            zivver_account_key=zivver_account_key)
 
-        # Set defaults
-        if not first_name:
-            first_name = ''
-
-        scim_object_user = {
-            'schemas': [
-                'urn:ietf:params:scim:schemas:core:2.0:User',
-                'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User',
-                'urn:ietf:params:scim:schemas:zivver:0.1:User'
-            ],
-            'meta': {
-                'resourceType': 'User'
-            },
-            'active': is_active,
-            'name': {
-                'formatted': '{} {}'.format(first_name, last_name)
-            },
-            'nickName': nick_name,
-            'urn:ietf:params:scim:schemas:zivver:0.1:User': {
-                'SsoAccountKey': zivver_account_key,
-                'aliases': aliases,
-                'delegates': delegates
-            },
-            'userName': user_name
-        }
+        with profiling.phase(profiling.PHASE_BUILD):
+            scim_object_user = get_scim_user_object(first_name, last_name, nick_name, user_name, zivver_account_key,
+                                                    is_active, aliases, delegates)
+
+        return self._post_scim_user(scim_object_user)
 
-        oauth_connection = OauthConnection(external_oauth_token_value=self.external_oauth_token_value)
+    def _post_scim_user(self, scim_object_user):
+        """
+        POST the SCIM payload of a new user
+        :return: ZivverUser() object
+        """
+        oauth_connection = self._get_oauth_connection()
         response = oauth_connection.return_request_post_data(post_url=self.scim_api_create_url,
                                                              object_serialized=scim_object_user)
 
         self._check_response(response)
 
-        zivver_user = get_zivver_user_object(response)
+        with profiling.phase(profiling.PHASE_WRAP):
+            zivver_user = get_zivver_user_object(response)
         return zivver_user
 
+    def create_users_from_columns(self, data, max_workers=1):
+        """
+        Create the users of a columnar HR extract. The payloads of all rows are built at once, straight from the
+        columns (columnar.build_scim_users()), rows with missing required fields are FAILED.
+        Use upsert_users(list(columnar.iter_user_rows(data))) when some users may already exist.
+        :param data: dict of lists, pyarrow Table or pandas DataFrame, the columns are the create_user_in_zivver()
+                     arguments
+        :param max_workers: Number of users created at the same time
+        :return: List(UpsertResult()), CREATED or FAILED, in the order of the rows
+        """
+        # Normalized once, the rows and the payloads are built from the same columns
+        user_columns = get_user_columns(data)
+        rows = list(iter_rows_of_user_columns(user_columns))
+        with profiling.phase(profiling.PHASE_BUILD):
+            scim_users = build_scim_users_from_user_columns(user_columns)
+
+        def create(row_and_scim_user):
+            user_fields, scim_user = row_and_scim_user
+            user_name = user_fields['user_name']
+            try:
+                with profiling.operation('create'):
+                    self._check_required_create_fields(last_name=user_fields['last_name'], user_name=user_name,
+                                                       sso_connection=user_fields['sso_connection'],
+                                                       zivver_account_key=user_fields['zivver_account_key'])
+                    zivver_user = self._post_scim_user(scim_user)
+            except (ZivverCRUDError, ZivverMissingRequiredFields, ZivverTooManyRequests) as z_e:
+                return UpsertResult(UpsertResult.FAILED, user_name=user_name, error=z_e)
+            return UpsertResult(UpsertResult.CREATED, user_name=user_name, zivver_user=zivver_user)
+
+        if max_workers <= 1:
+            return [create(row_and_scim_user) for row_and_scim_user in zip(rows, scim_users)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(create, zip(rows, scim_users)))
+
+    @profiling.profiled('delete')
     def delete_user_from_zivver(self, account_id):
         """
         Delete the user from Zivver.
@@ -113,7 +333,7 @@ class ZivverSCIMConnection:
         """
         self._check_required_delete_get_fields(account_id)
 
-        oauth_connection = OauthConnection(external_oauth_token_value=self.external_oauth_token_value)
+        oauth_connection = self._get_oauth_connection()
         delete_url = urllib.parse.urljoin(self.scim_api_delete_url, account_id)
         response = oauth_connection.return_request_delete_data(delete_url=delete_url)
 
@@ -121,40 +341,216 @@ class ZivverSCIMConnection:
 
         return response
 
-    def get_user_from_zivver(self, account_id):
+    @profiling.profiled('get')
+    def get_user_from_zivver(self, account_id, attributes=None, excluded_attributes=None):
         """
         Returns the user from Zivver if the user exists
         :param account_id:
+        :param attributes: Only return these SCIM attributes, e.g. ['userName'], other fields are NOT_LOADED
+        :param excluded_attributes: Leave these SCIM attributes out, e.g. ['phoneNumbers']
         :return: ZivverUser() object
         """
         self._check_required_delete_get_fields(account_id)
+        query_parameters, unloaded_fields = self._get_projection(attributes, excluded_attributes)
 
-        oauth_connection = OauthConnection(external_oauth_token_value=self.external_oauth_token_value)
+        oauth_connection = self._get_oauth_connection()
         get_url = urllib.parse.urljoin(self.scim_api_get_url, account_id)
+        get_url = self._add_query_parameters(get_url, query_parameters)
         response = oauth_connection.return_request_get_data(get_url=get_url)
 
         self._check_response(response)
 
-        zivver_user = get_zivver_user_object(response)
+        with profiling.phase(profiling.PHASE_WRAP):
+            zivver_user = get_zivver_user_object(response, unloaded_fields=unloaded_fields)
         return zivver_user
 
-    def get_all_users_from_zivver(self):
+    def get_all_users_from_zivver(self, attributes=None, excluded_attributes=None, scim_filter=None, page_size=None,
+                                  parallel=False, max_workers=4):
         """
         Returns a list of users from Zivver
-        :param account_id:
+        :param attributes: Only return these SCIM attributes, e.g. ['userName'], other fields are NOT_LOADED
+        :param excluded_attributes: Leave these SCIM attributes out
+        :param scim_filter: Only return the users that match the SCIM filter, e.g. 'userName eq "john@doe.com"'
+        :param page_size: Fetch the users in pages of this size, see iter_all_users_from_zivver()
+        :param parallel: Fetch the pages concurrently, see iter_all_users_from_zivver()
+        :param max_workers: Number of pages fetched at the same time when parallel is True
         :return: List(ZivverUser()) object
         """
-        oauth_connection = OauthConnection(external_oauth_token_value=self.external_oauth_token_value)
-        response = oauth_connection.return_request_get_data(get_url=self.scim_api_get_url)
+        if page_size or parallel:
+            return list(self.iter_all_users_from_zivver(attributes=attributes,
+                                                        excluded_attributes=excluded_attributes,
+                                                        scim_filter=scim_filter, page_size=page_size or 100,
+                                                        parallel=parallel, max_workers=max_workers))
+
+        query_parameters, unloaded_fields = self._get_projection(attributes, excluded_attributes)
+        if scim_filter:
+            query_parameters['filter'] = scim_filter
 
-        self._check_response(response=response, check_for_resources=True)
+        with profiling.operation('list'):
+            oauth_connection = self._get_oauth_connection()
+            get_url = self._add_query_parameters(self.scim_api_get_url, query_parameters)
+            response = oauth_connection.return_request_get_data(get_url=get_url)
 
-        zivver_users = []
-        for zivver_scim_user in response['Resources']:
-            zivver_users.append(get_zivver_user_object(zivver_scim_user))
+            self._check_response(response=response, check_for_resources=True)
+
+            with profiling.phase(profiling.PHASE_WRAP):
+                zivver_users = []
+                for zivver_scim_user in response['Resources']:
+                    zivver_users.append(get_zivver_user_object(zivver_scim_user, unloaded_fields=unloaded_fields))
 
         return zivver_users
 
+    @profiling.profiled('list_page')
+    def _get_users_page(self, start_index, count, query_parameters, unloaded_fields):
+        """
+        Fetch one page of users with the SCIM startIndex/count parameters
+        :return: (totalResults, List(ZivverUser()))
+        """
+        total_results, scim_users = self._get_scim_users_page(start_index, count, query_parameters)
+
+        with profiling.phase(profiling.PHASE_WRAP):
+            zivver_users = []
+            for zivver_scim_user in scim_users:
+                zivver_users.append(get_zivver_user_object(zivver_scim_user, unloaded_fields=unloaded_fields))
+
+        return total_results, zivver_users
+
+    def _get_scim_users_page(self, start_index, count, query_parameters):
+        """
+        Fetch one page of users as the SCIM dicts of the response
+        :return: (totalResults, List(dict))
+        """
+        oauth_connection = self._get_oauth_connection()
+        page_query_parameters = dict(query_parameters, startIndex=start_index, count=count)
+        get_url = self._add_query_parameters(self.scim_api_get_url, page_query_parameters)
+        response = oauth_connection.return_request_get_data(get_url=get_url)
+
+        # Zivver may leave out the Resources when there are no results
+        empty_result = type(response) is dict and response.get('totalResults') == 0
+        self._check_response(response=response, check_for_resources=not empty_result)
+
+        scim_users = response.get('Resources', [])
+        return response.get('totalResults', len(scim_users)), scim_users
+
+    def get_all_users_as_columns(self, attributes=None, excluded_attributes=None, scim_filter=None, page_size=100,
+                                 output='columns'):
+        """
+        Returns all users in columnar form for analytics, without a ZivverUser object per user.
+        The pages are read straight into the columns, named after the ZivverUser fields (account_id, user_name, ...).
+        Fields that are not loaded with the projection are left out.
+        :param output: columns (dict of lists), arrow (pyarrow Table) or pandas (DataFrame), see
+                       columnar.columns_to_output()
+        :return: The users in the output format
+        """
+        query_parameters, unloaded_fields = self._get_projection(attributes, excluded_attributes)
+        if scim_filter:
+            query_parameters['filter'] = scim_filter
+
+        columns = None
+        start_index = 1
+        while True:
+            with profiling.operation('list_page'):
+                total_results, scim_users = self._get_scim_users_page(start_index, page_size, query_parameters)
+                with profiling.phase(profiling.PHASE_WRAP):
+                    columns = users_to_columns(scim_users, columns=columns, unloaded_fields=unloaded_fields)
+
+            start_index += len(scim_users)
+            if not scim_users or start_index > total_results:
+                break
+
+        return columns_to_output(columns, output=output)
+
+    def iter_all_users_from_zivver(self, attributes=None, excluded_attributes=None, scim_filter=None, page_size=100,
+                                   parallel=False, max_workers=4, ordered=True):
+        """
+        Yields the users from Zivver, fetched in pages of page_size users.
+
+        With parallel=True the first page is fetched to learn the totalResults, then the other pages are fetched
+        concurrently by max_workers threads. The users are yielded in order, or as the pages complete with
+        ordered=False. When the totalResults changed during the fetch (users were created or deleted),
+        all pages are fetched once more and the users that were missed are yielded. Users are yielded only once.
+        :return: Generator of ZivverUser() objects
+        """
+        query_parameters, unloaded_fields = self._get_projection(attributes, excluded_attributes)
+        if scim_filter:
+            query_parameters['filter'] = scim_filter
+
+        if not parallel:
+            start_index = 1
+            while True:
+                total_results, zivver_users = self._get_users_page(start_index, page_size, query_parameters,
+                                                                   unloaded_fields)
+                for zivver_user in zivver_users:
+                    yield zivver_user
+                # Zivver may return fewer users than the count that was asked for, continue after the last one
+                start_index += len(zivver_users)
+                if not zivver_users or start_index > total_results:
+                    return
+
+        yield from self._iter_all_users_parallel(query_parameters, unloaded_fields, page_size, max_workers, ordered)
+
+    def _iter_all_users_parallel(self, query_parameters, unloaded_fields, page_size, max_workers, ordered):
+        """
+        Fan-out fetch of all pages, see iter_all_users_from_zivver()
+        """
+        seen_account_ids = set()
+
+        def unseen(zivver_users):
+            for zivver_user in zivver_users:
+                if zivver_user.account_id not in seen_account_ids:
+                    seen_account_ids.add(zivver_user.account_id)
+                    yield zivver_user
+
+        total_results, zivver_users = self._get_users_page(1, page_size, query_parameters, unloaded_fields)
+        yield from unseen(zivver_users)
+
+        # Zivver may cap the page size, the windows are as large as the first page it returned (itemsPerPage)
+        window_size = len(zivver_users) or page_size
+        first_start_index = 1 + window_size
+        futures = []
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            # One extra pass when the directory changed during the fetch
+            for _ in range(2):
+                futures = [
+                    executor.submit(self._get_users_window, start_index, window_size, query_parameters,
+                                    unloaded_fields)
+                    for start_index in range(first_start_index, total_results + 1, window_size)
+                ]
+                page_totals = {total_results}
+                for future in (futures if ordered else as_completed(futures)):
+                    page_total_results, zivver_users = future.result()
+                    page_totals.add(page_total_results)
+                    yield from unseen(zivver_users)
+
+                # Re-check, users may have been created or deleted while the pages were fetched
+                recheck_total_results, zivver_users = self._get_users_page(1, page_size, query_parameters,
+                                                                           unloaded_fields)
+                yield from unseen(zivver_users)
+                if page_totals == {recheck_total_results} and len(seen_account_ids) == recheck_total_results:
+                    return
+                total_results = max(page_totals | {recheck_total_results})
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _get_users_window(self, start_index, window_size, query_parameters, unloaded_fields):
+        """
+        Fetch the window_size users from start_index, with more than one page when Zivver returns fewer users
+        :return: (totalResults, List(ZivverUser()))
+        """
+        window_users = []
+        while True:
+            total_results, zivver_users = self._get_users_page(start_index + len(window_users),
+                                                               window_size - len(window_users), query_parameters,
+                                                               unloaded_fields)
+            window_users.extend(zivver_users)
+            if (not zivver_users or len(window_users) >= window_size or
+                    start_index + len(window_users) > total_results):
+                return total_results, window_users
+
+    @profiling.profiled('update')
     def update_user_in_zivver(self, account_id, first_name=None, last_name=None, nick_name=None, user_name=None,
                               zivver_account_key=None, sso_connection=False, is_active=False, aliases=[],
                               delegates=[]):
@@ -167,39 +563,267 @@ class ZivverSCIMConnection:
 
         self._check_required_delete_get_fields(account_id)
 
-        # Set defaults
-        if not first_name:
-            first_name = ''
-
-        scim_object_user = {
-            'schemas': [
-                'urn:ietf:params:scim:schemas:core:2.0:User',
-                'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User',
-                'urn:ietf:params:scim:schemas:zivver:0.1:User'
-            ],
-            'meta': {
-                'resourceType': 'User',
-                'location': '/scim/v2/Users/{}'.format(account_id)
-            },
-            'active': is_active,
-            'id': account_id,
-            'name': {
-                'formatted': '{} {}'.format(first_name, last_name)
-            },
-            'nickName': nick_name,
-            'urn:ietf:params:scim:schemas:zivver:0.1:User': {
-                'SsoAccountKey': zivver_account_key,
-                'aliases': aliases,
-                'delegates': delegates
-            },
-            'userName': user_name
-        }
+        with profiling.phase(profiling.PHASE_BUILD):
+            scim_object_user = get_scim_user_object(first_name, last_name, nick_name, user_name, zivver_account_key,
+                                                    is_active, aliases, delegates, account_id=account_id)
 
-        oauth_connection = OauthConnection(external_oauth_token_value=self.external_oauth_token_value)
+        oauth_connection = self._get_oauth_connection()
         put_url = urllib.parse.urljoin(self.scim_api_update_url, account_id)
         response = oauth_connection.return_request_put_data(put_url=put_url, object_serialized=scim_object_user)
 
         self._check_response(response)
 
-        zivver_user = get_zivver_user_object(response)
+        with profiling.phase(profiling.PHASE_WRAP):
+            zivver_user = get_zivver_user_object(response)
         return zivver_user
+
+    def get_user_by_user_name(self, user_name, attributes=None, excluded_attributes=None):
+        """
+        Find the user with a filtered lookup on the userName
+        :return: ZivverUser() object, None when the user does not exist
+        """
+        if not user_name:
+            raise ZivverMissingRequiredFields('Missing field: user_name')
+
+        zivver_users = self.get_all_users_from_zivver(attributes=attributes, excluded_attributes=excluded_attributes,
+                                                      scim_filter='userName eq {}'.format(json.dumps(user_name)))
+        return zivver_users[0] if zivver_users else None
+
+    def _chunk_id_filters(self, account_ids, query_parameters, max_url_length):
+        """
+        Splits the ids into OR-combined id filters, each list url stays within max_url_length
+        :return: List of (scim_filter, [account_id])
+        """
+        # The paging parameters are added by iter_all_users_from_zivver(), reserve room for the largest chunk
+        reserved_parameters = dict(query_parameters, startIndex=1, count=len(account_ids), filter='')
+        base_length = len(self._add_query_parameters(self.scim_api_get_url, reserved_parameters))
+
+        chunks = []
+        terms = []
+        chunk_ids = []
+        url_length = base_length
+        for account_id in account_ids:
+            term = 'id eq {}'.format(json.dumps(account_id))
+            term_length = len(urllib.parse.quote_plus(' or ' + term if terms else term, safe=',:'))
+            if terms and url_length + term_length > max_url_length:
+                chunks.append((' or '.join(terms), chunk_ids))
+                terms = []
+                chunk_ids = []
+                url_length = base_length
+                term_length = len(urllib.parse.quote_plus(term, safe=',:'))
+            terms.append(term)
+            chunk_ids.append(account_id)
+            url_length += term_length
+        if terms:
+            chunks.append((' or '.join(terms), chunk_ids))
+        return chunks
+
+    def _get_users_by_id_filter(self, scim_filter, chunk_ids, attributes, excluded_attributes):
+        """
+        :return: dict account_id -> ZivverUser() of the users in the chunk that exist
+        """
+        zivver_users = {}
+        for zivver_user in self.iter_all_users_from_zivver(attributes=attributes,
+                                                           excluded_attributes=excluded_attributes,
+                                                           scim_filter=scim_filter, page_size=len(chunk_ids)):
+            zivver_users[zivver_user.account_id] = zivver_user
+        return zivver_users
+
+    def _get_user_or_none(self, account_id, attributes, excluded_attributes):
+        """
+        :return: ZivverUser() object, None when the account does not exist
+        """
+        try:
+            return self.get_user_from_zivver(account_id, attributes=attributes,
+                                             excluded_attributes=excluded_attributes)
+        except ZivverUnknownAccountError:
+            return None
+
+    def get_users_by_ids(self, account_ids, attributes=None, excluded_attributes=None, max_url_length=2000,
+                         max_workers=4):
+        """
+        Fetch many users by their account id with a few filtered listings instead of one GET per user.
+        The ids are chunked into OR-combined filters (id eq "a" or id eq "b" ...) that keep the url within
+        max_url_length, the chunks are fetched by max_workers threads. When Zivver rejects the filter,
+        the users of that chunk are fetched with single GETs in parallel.
+        :param account_ids: List of account ids
+        :return: dict account_id -> ZivverUser() object, None for the accounts that do not exist
+        """
+        account_ids = list(dict.fromkeys(account_id for account_id in account_ids if account_id))
+        query_parameters, _ = self._get_projection(attributes, excluded_attributes)
+        zivver_users = dict.fromkeys(account_ids)
+        if not account_ids:
+            return zivver_users
+
+        chunks = self._chunk_id_filters(account_ids, query_parameters, max_url_length)
+        rejected_ids = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._get_users_by_id_filter, scim_filter, chunk_ids, attributes,
+                                excluded_attributes): chunk_ids
+                for scim_filter, chunk_ids in chunks
+            }
+            for future in as_completed(futures):
+                try:
+                    chunk_users = future.result()
+                except ZivverCRUDError as z_e:
+                    if z_e.status_code not in (400, 403, 501):
+                        raise
+                    # Zivver rejected the id filter
+                    rejected_ids.extend(futures[future])
+                    continue
+                for account_id in futures[future]:
+                    zivver_users[account_id] = chunk_users.get(account_id)
+
+            futures = {
+                executor.submit(self._get_user_or_none, account_id, attributes, excluded_attributes): account_id
+                for account_id in rejected_ids
+            }
+            for future in as_completed(futures):
+                zivver_users[futures[future]] = future.result()
+
+        return zivver_users
+
+    def _user_differs(self, zivver_user, first_name=None, last_name=None, nick_name=None, user_name=None,
+                      is_active=False, aliases=None, delegates=None, **kwargs):
+        """
+        Compares the Zivver user with the wanted values, fields that are not loaded count as different.
+        The SsoAccountKey is not returned by Zivver, so it is not compared.
+        :return: True when the user needs to be updated
+        """
+        wanted_fields = {
+            'name_formatted': '{} {}'.format(first_name or '', last_name),
+            'nick_name': nick_name or '',
+            'user_name': user_name,
+            'is_active': bool(is_active),
+            'zivver_scim_user_aliases': sorted(aliases or []),
+            'zivver_scim_user_delegates': sorted(delegates or []),
+        }
+        for field_name, wanted_value in wanted_fields.items():
+            value = getattr(zivver_user, field_name)
+            if value is NOT_LOADED:
+                return True
+            if field_name in ('zivver_scim_user_aliases', 'zivver_scim_user_delegates'):
+                value = sorted(value or [])
+            elif field_name == 'nick_name':
+                value = value or ''
+            elif field_name == 'is_active':
+                value = bool(value)
+            if value != wanted_value:
+                return True
+        return False
+
+    def _upsert_user(self, user_fields, existing_user=None, look_up=True):
+        """
+        Create or update the user, see upsert_user()
+        """
+        self._check_required_create_fields(last_name=user_fields.get('last_name'),
+                                           user_name=user_fields.get('user_name'),
+                                           sso_connection=user_fields.get('sso_connection'),
+                                           zivver_account_key=user_fields.get('zivver_account_key'))
+        user_name = user_fields['user_name']
+
+        if existing_user is None and look_up:
+            existing_user = self.get_user_by_user_name(user_name)
+
+        conflict = False
+        if existing_user is None:
+            try:
+                zivver_user = self.create_user_in_zivver(**user_fields)
+                return UpsertResult(UpsertResult.CREATED, user_name=user_name, zivver_user=zivver_user)
+            except ZivverCRUDError as z_e:
+                # The duplicate userName response of Zivver is not documented: a 409 (or 'already exists') and the
+                # 'Alias is already taken' text are both looked up, only an existing userName switches to an update
+                if not isinstance(z_e, (ZivverConflictError, ZivverAliasConflictError)):
+                    raise
+                # Created in the meantime (or missing from the cache), update the existing user instead
+                existing_user = self.get_user_by_user_name(user_name)
+                if existing_user is None:
+                    raise
+                conflict = True
+
+        if not self._user_differs(existing_user, **user_fields):
+            return UpsertResult(UpsertResult.UNCHANGED, user_name=user_name, zivver_user=existing_user,
+                                conflict=conflict)
+
+        zivver_user = self.update_user_in_zivver(existing_user.account_id, **user_fields)
+        return UpsertResult(UpsertResult.UPDATED, user_name=user_name, zivver_user=zivver_user, conflict=conflict)
+
+    def upsert_user(self, first_name=None, last_name=None, nick_name=None, user_name=None, zivver_account_key=None,
+                    sso_connection=False, is_active=False, aliases=[], delegates=[], existing_user=None):
+        """
+        Create the user when it does not exist, update it only when the content differs.
+        The user is looked up by userName with a filter, unless the existing_user is given.
+        When the create fails because the user already exists (a conflict or an alias that is already taken, and
+        the userName is found), the user is updated instead.
+        :return: UpsertResult() object, the action tells if the user was created, updated or unchanged
+        """
+        user_fields = {
+            'first_name': first_name,
+            'last_name': last_name,
+            'nick_name': nick_name,
+            'user_name': user_name,
+            'zivver_account_key': zivver_account_key,
+            'sso_connection': sso_connection,
+            'is_active': is_active,
+            'aliases': aliases,
+            'delegates': delegates
+        }
+        return self._upsert_user(user_fields, existing_user=existing_user)
+
+    def upsert_users(self, users, existing_users=None, max_workers=1, validate=False):
+        """
+        Upsert a list of users. Failures do not stop the other users, they are returned with the FAILED action.
+        :param users: List of dicts with the create_user_in_zivver() arguments
+        :param existing_users: Optional cache, list of ZivverUser() objects e.g. from get_all_users_from_zivver().
+                               Users that are not in the cache are created without a lookup.
+                               When None, every user is looked up with a filter.
+        :param max_workers: Number of users upserted at the same time, use with a concurrency_limiter to let the
+                            number of requests in flight adapt to Zivver
+        :param validate: Validate the whole batch with validation.validate_users() before anything is sent,
+                         the invalid users are FAILED with a ZivverValidationError
+        :return: List(UpsertResult()), in the order of the users
+        """
+        if validate:
+            users = list(users)
+            validation_result = validate_users(users)
+            upsert_results = [None] * len(users)
+            for invalid_user in validation_result.invalid:
+                user_name = invalid_user.user_fields.get('user_name') if isinstance(invalid_user.user_fields,
+                                                                                    dict) else None
+                upsert_results[invalid_user.index] = UpsertResult(UpsertResult.FAILED, user_name=user_name,
+                                                                  error=ZivverValidationError(invalid_user.errors))
+            valid_results = self.upsert_users(validation_result.valid, existing_users=existing_users,
+                                              max_workers=max_workers)
+            for index, upsert_result in zip(validation_result.valid_indexes, valid_results):
+                upsert_results[index] = upsert_result
+            return upsert_results
+
+        existing_users_by_user_name = None
+        if existing_users is not None:
+            existing_users_by_user_name = {
+                zivver_user.user_name.lower(): zivver_user for zivver_user in existing_users if zivver_user.user_name
+            }
+
+        def upsert(user_fields):
+            user_name = user_fields.get('user_name')
+            existing_user = None
+            if existing_users_by_user_name is not None and user_name:
+                existing_user = existing_users_by_user_name.get(user_name.lower())
+
+            try:
+                upsert_result = self._upsert_user(user_fields, existing_user=existing_user,
+                                                  look_up=existing_users_by_user_name is None)
+            except (ZivverCRUDError, ZivverMissingRequiredFields, ZivverTooManyRequests) as z_e:
+                upsert_result = UpsertResult(UpsertResult.FAILED, user_name=user_name, error=z_e)
+
+            if existing_users_by_user_name is not None and upsert_result.zivver_user is not None:
+                existing_users_by_user_name[user_name.lower()] = upsert_result.zivver_user
+            return upsert_result
+
+        if max_workers <= 1:
+            return [upsert(user_fields) for user_fields in users]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            upsert_results = list(executor.map(upsert, users))
+        return upsert_results
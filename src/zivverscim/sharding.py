@@ -0,0 +1,296 @@
+import collections
+import contextlib
+import multiprocessing
+import os
+import time
+import zlib
+
+from .concurrency import _LimitedRequest
+from .exceptions import ZivverValidationError
+from .validation import validate_users
+from .wrapper import UpsertResult
+
+
+def get_shard(user_name, shards):
+    """
+    Stable shard of a userName: the same in every process and every run (unlike hash()), case insensitive
+    :return: Shard index from 0 to shards - 1
+    """
+    if not user_name or not isinstance(user_name, str):
+        return 0
+    return zlib.crc32(user_name.lower().encode('utf-8')) % shards
+
+
+def partition_users(users, shards):
+    """
+    :param users: List of dicts with the create_user_in_zivver() arguments
+    :return: List with per shard a list of (index in users, user dict)
+    """
+    partitions = [[] for _ in range(shards)]
+    for index, user_fields in enumerate(users):
+        user_name = user_fields.get('user_name') if isinstance(user_fields, dict) else None
+        partitions[get_shard(user_name, shards)].append((index, user_fields))
+    return partitions
+
+
+class SharedRateBudget:
+    """
+    Token bucket of `rate` requests per second, shared by the processes of a ShardedSync through shared memory.
+    Pass it as concurrency_limiter, every request takes a token first.
+    A 429 from Zivver pauses all processes for throttle_pause seconds, so the shards do not keep hammering.
+    """
+
+    def __init__(self, rate, burst=None, throttle_pause=1.0, context=None):
+        if context is None:
+            context = multiprocessing.get_context('spawn')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.throttle_pause = throttle_pause
+
+        self._tokens = context.Value('d', self.burst, lock=False)
+        self._updated_at = context.Value('d', time.monotonic(), lock=False)
+        self._paused_until = context.Value('d', 0.0, lock=False)
+        self._throttled = context.Value('i', 0, lock=False)
+        self._lock = context.Lock()
+
+    @property
+    def throttled(self):
+        """
+        :return: Number of 429 responses of all processes
+        """
+        return self._throttled.value
+
+    def acquire(self):
+        """
+        Wait for a token
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens.value = min(self._tokens.value + (now - self._updated_at.value) * self.rate, self.burst)
+                self._updated_at.value = now
+                if now < self._paused_until.value:
+                    wait = self._paused_until.value - now
+                elif self._tokens.value >= 1:
+                    self._tokens.value -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens.value) / self.rate
+            time.sleep(wait)
+
+    def throttle(self):
+        """
+        Zivver answered with a 429, pause all processes
+        """
+        with self._lock:
+            self._throttled.value += 1
+            self._paused_until.value = max(self._paused_until.value, time.monotonic() + self.throttle_pause)
+            self._tokens.value = 0.0
+
+    @contextlib.contextmanager
+    def request(self):
+        """
+        Take a token for one request, the same interface as AdaptiveConcurrencyLimiter.request()
+        """
+        self.acquire()
+        limited_request = _LimitedRequest(time.monotonic(), None)
+        yield limited_request
+        if limited_request.status_code == 429:
+            self.throttle()
+
+
+# The ZivverSCIMConnection of the worker process, with its own connection pool
+_shard_connection = None
+
+
+def _init_shard_worker(connection_options, rate_budget):
+    global _shard_connection
+    from .scim_connection_crud import ZivverSCIMConnection
+
+    if rate_budget is not None:
+        connection_options = dict(connection_options, concurrency_limiter=rate_budget)
+    _shard_connection = ZivverSCIMConnection(**connection_options)
+
+
+def _sync_shard(shard, indexed_users, existing_users, max_workers):
+    """
+    Upsert the users of one shard in the worker process
+    :return: (shard, ShardStats(), list of (index, UpsertResult()))
+    """
+    start = time.perf_counter()
+    upsert_results = _shard_connection.upsert_users([user_fields for _, user_fields in indexed_users],
+                                                    existing_users=existing_users, max_workers=max_workers)
+
+    shard_stats = ShardStats(shard=shard, pid=os.getpid(), users=len(indexed_users),
+                             duration=time.perf_counter() - start)
+    return shard, shard_stats, [(index, upsert_result) for (index, _), upsert_result in zip(indexed_users,
+                                                                                            upsert_results)]
+
+
+class ShardStats:
+    """
+    What one shard did
+    """
+
+    def __init__(self, shard, pid, users, duration):
+        self.shard = shard
+        self.pid = pid
+        self.users = users
+        self.duration = duration
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class ShardedSyncReport:
+    """
+    Merged result of all shards of a ShardedSync run
+    """
+
+    def __init__(self, results, shard_stats, duration, throttled=0):
+        # List(UpsertResult()), in the order of the users
+        self.results = results
+        self.shard_stats = shard_stats
+        self.duration = duration
+        # Number of 429 responses, when there was a rate budget
+        self.throttled = throttled
+
+        self.actions = collections.Counter(upsert_result.action for upsert_result in results)
+        # Exception class name -> count
+        self.errors = collections.Counter(upsert_result.error.__class__.__name__ for upsert_result in results
+                                          if upsert_result.error is not None)
+
+    @property
+    def throughput(self):
+        """
+        :return: Users per second
+        """
+        return len(self.results) / self.duration if self.duration else 0.0
+
+    @property
+    def failed(self):
+        """
+        :return: List(UpsertResult()) of the users that failed
+        """
+        return [upsert_result for upsert_result in self.results if upsert_result.action == UpsertResult.FAILED]
+
+    def to_dict(self):
+        return {
+            'users': len(self.results),
+            'duration': self.duration,
+            'throughput': self.throughput,
+            'throttled': self.throttled,
+            'actions': dict(self.actions),
+            'errors': dict(self.errors),
+            'shards': [shard_stats.to_dict() for shard_stats in self.shard_stats],
+            'failed': [{'user_name': upsert_result.user_name, 'error': str(upsert_result.error)}
+                       for upsert_result in self.failed]
+        }
+
+    def summary(self):
+        """
+        :return: Text summary of the run
+        """
+        lines = ['Synced {} users with {} shards in {:.2f}s: {:.1f} users/s'.format(
+            len(self.results), len(self.shard_stats), self.duration, self.throughput)]
+        lines.append('Actions: {}'.format(', '.join('{}: {}'.format(action, count)
+                                                     for action, count in sorted(self.actions.items()))))
+        lines.append('Errors: {}'.format(dict(self.errors) or 'none'))
+        if self.throttled:
+            lines.append('Throttled: {}'.format(self.throttled))
+        for shard_stats in sorted(self.shard_stats, key=lambda shard_stats: shard_stats.shard):
+            lines.append('Shard {}: {} users in {:.2f}s (pid {})'.format(
+                shard_stats.shard, shard_stats.users, shard_stats.duration, shard_stats.pid))
+        return '\n'.join(lines)
+
+
+class ShardedSync:
+    """
+    Upserts a large batch of users with a pool of processes, for directories where one process is CPU bound on
+    the JSON encoding/decoding and the ZivverUser objects long before the network is the limit.
+
+    The users are partitioned by a stable hash of the userName (get_shard()), so every user is always handled by
+    the same shard. Every process has its own ZivverSCIMConnection (and connection pool), created from
+    connection_options, the ZivverSCIMConnection() arguments. Objects in the options (a token provider, ...)
+    must pickle; a concurrency_limiter is replaced by the shared rate budget.
+    With rate, all processes share a budget of `rate` requests per second (SharedRateBudget).
+    """
+
+    def __init__(self, connection_options, shards=None, max_workers=4, rate=None, burst=None, throttle_pause=1.0):
+        self.connection_options = dict(connection_options)
+        self.shards = shards or os.cpu_count() or 1
+        # Users upserted at the same time within each shard
+        self.max_workers = max_workers
+        self.rate = rate
+        self.burst = burst
+        self.throttle_pause = throttle_pause
+
+    def upsert_users(self, users, existing_users=None, validate=False):
+        """
+        Upsert the users over the shards and merge the results, see ZivverSCIMConnection.upsert_users()
+        :param existing_users: Optional cache, list of ZivverUser() objects, partitioned like the users
+        :param validate: Validate the whole batch before it is partitioned, so duplicates over shards are found
+        :return: ShardedSyncReport() object
+        """
+        start = time.perf_counter()
+        users = list(users)
+        results = [None] * len(users)
+
+        indexes = list(range(len(users)))
+        if validate:
+            validation_result = validate_users(users)
+            for invalid_user in validation_result.invalid:
+                user_name = invalid_user.user_fields.get('user_name') if isinstance(invalid_user.user_fields,
+                                                                                    dict) else None
+                results[invalid_user.index] = UpsertResult(UpsertResult.FAILED, user_name=user_name,
+                                                           error=ZivverValidationError(invalid_user.errors))
+            indexes = validation_result.valid_indexes
+
+        partitions = [[] for _ in range(self.shards)]
+        for shard, indexed_users in enumerate(partition_users([users[index] for index in indexes], self.shards)):
+            partitions[shard] = [(indexes[index], user_fields) for index, user_fields in indexed_users]
+
+        existing_users_per_shard = None
+        if existing_users is not None:
+            existing_users_per_shard = [[] for _ in range(self.shards)]
+            for zivver_user in existing_users:
+                existing_users_per_shard[get_shard(zivver_user.user_name, self.shards)].append(zivver_user)
+
+        context = multiprocessing.get_context('spawn')
+        rate_budget = None
+        if self.rate:
+            rate_budget = SharedRateBudget(self.rate, burst=self.burst, throttle_pause=self.throttle_pause,
+                                           context=context)
+        connection_options = {key: value for key, value in self.connection_options.items()
+                              if key != 'concurrency_limiter'}
+
+        shard_stats = []
+        busy_shards = [shard for shard in range(self.shards) if partitions[shard]]
+        if busy_shards:
+            # multiprocessing.Pool and not ProcessPoolExecutor, whose initializer needs Python 3.7. The rate budget
+            # is shared memory, which can only be passed to the processes when they start (initargs)
+            pool = context.Pool(processes=len(busy_shards), initializer=_init_shard_worker,
+                                initargs=(connection_options, rate_budget))
+            try:
+                async_results = [
+                    pool.apply_async(_sync_shard, (
+                        shard, partitions[shard],
+                        existing_users_per_shard[shard] if existing_users_per_shard is not None else None,
+                        self.max_workers
+                    ))
+                    for shard in busy_shards
+                ]
+                for async_result in async_results:
+                    _, stats, indexed_results = async_result.get()
+                    shard_stats.append(stats)
+                    for index, upsert_result in indexed_results:
+                        results[index] = upsert_result
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+        return ShardedSyncReport(results, shard_stats, time.perf_counter() - start,
+                                 throttled=rate_budget.throttled if rate_budget is not None else 0)
@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from .scim_connection_crud import ZivverSCIMConnection
+from .stand_in import StandInProcess
+
+
+def get_rss_bytes():
+    """
+    :return: Resident memory of this process in bytes, the peak when /proc is not available
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # resource is not available on Windows, import it only when /proc is missing
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def get_open_file_descriptors():
+    """
+    :return: Number of open file descriptors (sockets included), None when it can not be counted
+    """
+    for fd_directory in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(fd_directory))
+        except OSError:
+            continue
+    return None
+
+
+class SoakThresholds:
+    """
+    Maximum drift between the baseline (after the warm-up) and the end of the soak run
+    """
+
+    def __init__(self, rss_growth_mb=50, tracemalloc_growth_mb=20, open_fds_growth=20, threads_growth=2,
+                 throughput_drop=0.5):
+        self.rss_growth_mb = rss_growth_mb
+        self.tracemalloc_growth_mb = tracemalloc_growth_mb
+        self.open_fds_growth = open_fds_growth
+        self.threads_growth = threads_growth
+        # Fraction of the baseline throughput that may be lost, 0.5 fails when less than half is left
+        self.throughput_drop = throughput_drop
+
+
+class SoakSample:
+    """
+    Resource usage of the client at one moment of the soak run
+    """
+
+    def __init__(self, elapsed, rss_bytes, tracemalloc_bytes, open_fds, threads, operations, errors, throughput):
+        self.elapsed = elapsed
+        self.rss_bytes = rss_bytes
+        self.tracemalloc_bytes = tracemalloc_bytes
+        self.open_fds = open_fds
+        self.threads = threads
+        self.operations = operations
+        self.errors = errors
+        self.throughput = throughput
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class SoakReport:
+    """
+    Result of a SoakHarness run
+    """
+
+    def __init__(self, samples, errors, failures, fault_options):
+        self.samples = samples
+        # Exception class name -> count
+        self.errors = errors
+        self.failures = failures
+        self.fault_options = fault_options
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def to_dict(self):
+        return {
+            'passed': self.passed,
+            'failures': self.failures,
+            'errors': self.errors,
+            'fault_options': self.fault_options,
+            'samples': [sample.to_dict() for sample in self.samples]
+        }
+
+    def summary(self):
+        """
+        :return: Text summary of the run
+        """
+        lines = ['{:>8} {:>10} {:>12} {:>6} {:>8} {:>10} {:>8}'.format(
+            'elapsed', 'rss MB', 'traced MB', 'fds', 'threads', 'ops/s', 'errors'
+        )]
+        for sample in self.samples:
+            lines.append('{:>8.0f} {:>10.1f} {:>12.1f} {:>6} {:>8} {:>10.1f} {:>8}'.format(
+                sample.elapsed, sample.rss_bytes / 2 ** 20, sample.tracemalloc_bytes / 2 ** 20, sample.open_fds,
+                sample.threads, sample.throughput, sample.errors
+            ))
+        lines.append('Errors: {}'.format(self.errors or 'none'))
+        lines.append('Fault options: {}'.format(self.fault_options or 'none'))
+        lines.append('PASSED' if self.passed else 'FAILED: {}'.format('; '.join(self.failures)))
+        return '\n'.join(lines)
+
+
+class SoakHarness:
+    """
+    Drives a ZivverSCIMConnection for a long time against a local stand-in server that injects faults,
+    samples the memory, open file descriptors, threads and throughput of the client
+    and fails when any of them drifts past the thresholds.
+
+    The stand-in runs in a child process. Pass server_url to soak against a server that is already running.
+    """
+
+    def __init__(self, duration=60, concurrency=4, sample_interval=5, warmup=None, fault_options=None,
+                 response_delay=0.0, timeout=5, thresholds=None, server_url=None, connection_options=None,
+                 on_sample=None):
+        self.duration = duration
+        self.concurrency = concurrency
+        self.sample_interval = sample_interval
+        # Seconds before the baseline is taken, to let the pools and caches fill up
+        self.warmup = warmup if warmup is not None else min(duration * 0.2, 60)
+        # Arguments for the FaultInjector() in the stand-in
+        self.fault_options = fault_options
+        self.response_delay = response_delay
+        self.timeout = timeout
+        self.thresholds = thresholds or SoakThresholds()
+        self.server_url = server_url
+        self.connection_options = connection_options or {}
+        self.on_sample = on_sample
+
+        self._operations = 0
+        self._errors = {}
+        self._counter_lock = threading.Lock()
+
+    def _count(self, operations=0, error=None):
+        with self._counter_lock:
+            self._operations += operations
+            if error is not None:
+                error_name = type(error).__name__
+                self._errors[error_name] = self._errors.get(error_name, 0) + 1
+
+    def _worker(self, zivver_scim_connection, worker_index, stop_event):
+        """
+        Create, get, update, (list) and delete users until the stop event is set
+        """
+        iteration = 0
+        while not stop_event.is_set():
+            iteration += 1
+            user_name = 'soak-{}-{}@example.com'.format(worker_index, iteration)
+            zivver_user = None
+            try:
+                zivver_user = zivver_scim_connection.create_user_in_zivver(last_name='Soak', user_name=user_name)
+                zivver_scim_connection.get_user_from_zivver(account_id=zivver_user.account_id)
+                zivver_scim_connection.update_user_in_zivver(account_id=zivver_user.account_id, last_name='Soak',
+                                                             user_name=user_name, is_active=True)
+                operations = 3
+                if iteration % 10 == 0:
+                    zivver_scim_connection.get_all_users_from_zivver(page_size=100, attributes=['userName'])
+                    operations += 1
+                self._count(operations=operations)
+            except Exception as e:
+                self._count(error=e)
+            finally:
+                if zivver_user is not None and getattr(zivver_user, 'account_id', None):
+                    try:
+                        zivver_scim_connection.delete_user_from_zivver(account_id=zivver_user.account_id)
+                        self._count(operations=1)
+                    except Exception as e:
+                        self._count(error=e)
+
+    def _take_sample(self, start, previous_sample):
+        with self._counter_lock:
+            operations = self._operations
+            errors = sum(self._errors.values())
+
+        elapsed = time.monotonic() - start
+        throughput = 0.0
+        if previous_sample is not None and elapsed > previous_sample.elapsed:
+            throughput = (operations - previous_sample.operations) / (elapsed - previous_sample.elapsed)
+
+        return SoakSample(elapsed=elapsed, rss_bytes=get_rss_bytes(),
+                          tracemalloc_bytes=tracemalloc.get_traced_memory()[0],
+                          open_fds=get_open_file_descriptors(), threads=threading.active_count(),
+                          operations=operations, errors=errors, throughput=throughput)
+
+    def _check_drift(self, samples, baseline_threads):
+        """
+        Compares the baseline sample (after the warm-up) with the end of the run
+        :return: List of failure messages
+        """
+        failures = []
+        measured_samples = [sample for sample in samples if sample.elapsed >= self.warmup]
+        if len(measured_samples) < 2:
+            return ['Not enough samples after the warm-up, increase the duration']
+
+        baseline, last = measured_samples[0], measured_samples[-1]
+        thresholds = self.thresholds
+
+        rss_growth_mb = (last.rss_bytes - baseline.rss_bytes) / 2 ** 20
+        if rss_growth_mb > thresholds.rss_growth_mb:
+            failures.append('RSS grew {:.1f} MB'.format(rss_growth_mb))
+
+        tracemalloc_growth_mb = (last.tracemalloc_bytes - baseline.tracemalloc_bytes) / 2 ** 20
+        if tracemalloc_growth_mb > thresholds.tracemalloc_growth_mb:
+            failures.append('Traced memory grew {:.1f} MB'.format(tracemalloc_growth_mb))
+
+        if baseline.open_fds is not None and last.open_fds - baseline.open_fds > thresholds.open_fds_growth:
+            failures.append('Open file descriptors grew from {} to {}'.format(baseline.open_fds, last.open_fds))
+
+        if last.threads - baseline.threads > thresholds.threads_growth:
+            failures.append('Threads grew from {} to {}'.format(baseline.threads, last.threads))
+
+        # Compare the first and the last third of the measured samples, to even out fault bursts
+        third = max(len(measured_samples) // 3, 1)
+        baseline_throughput = sum(sample.throughput for sample in measured_samples[:third]) / third
+        last_throughput = sum(sample.throughput for sample in measured_samples[-third:]) / third
+        if baseline_throughput and last_throughput < baseline_throughput * (1 - thresholds.throughput_drop):
+            failures.append('Throughput dropped from {:.1f} to {:.1f} ops/s'.format(baseline_throughput,
+                                                                                   last_throughput))
+
+        stuck_threads = threading.active_count() - baseline_threads
+        if stuck_threads > thresholds.threads_growth:
+            failures.append('{} threads still running after the run'.format(stuck_threads))
+
+        return failures
+
+    def run(self):
+        """
+        Run the soak test for the duration
+        :return: SoakReport() object
+        """
+        stand_in_process = None
+        server_url = self.server_url
+        if server_url is None:
+            stand_in_process = StandInProcess(response_delay=self.response_delay,
+                                              fault_options=self.fault_options).start()
+            server_url = stand_in_process.users_url
+
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+
+        baseline_threads = threading.active_count()
+        samples = []
+        stop_event = threading.Event()
+        zivver_scim_connection = ZivverSCIMConnection(
+            external_oauth_token_value='soak', scim_api_create_url=server_url, scim_api_update_url=server_url,
+            scim_api_get_url=server_url, scim_api_delete_url=server_url, timeout=self.timeout,
+            max_connections=self.concurrency, **self.connection_options
+        )
+
+        workers = [threading.Thread(target=self._worker, args=(zivver_scim_connection, index, stop_event),
+                                    name='soak-worker-{}'.format(index), daemon=True)
+                   for index in range(self.concurrency)]
+        try:
+            start = time.monotonic()
+            for worker in workers:
+                worker.start()
+
+            samples.append(self._take_sample(start, None))
+            while time.monotonic() - start < self.duration:
+                time.sleep(min(self.sample_interval, max(self.duration - (time.monotonic() - start), 0)))
+                samples.append(self._take_sample(start, samples[-1]))
+                if self.on_sample is not None:
+                    self.on_sample(samples[-1])
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join(timeout=max(self.timeout or 0, 1) * 3)
+            zivver_scim_connection.close()
+
+            if started_tracemalloc:
+                tracemalloc.stop()
+            if stand_in_process is not None:
+                stand_in_process.stop()
+
+        failures = self._check_drift(samples, baseline_threads)
+        return SoakReport(samples=samples, errors=dict(self._errors), failures=failures,
+                          fault_options=self.fault_options or {})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Soak test the ZivverSCIMConnection against a local stand-in server that injects faults'
+    )
+    parser.add_argument('--duration', type=float, default=300, help='Seconds to run')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--sample-interval', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=None)
+    parser.add_argument('--timeout', type=float, default=5, help='Request timeout in seconds')
+    parser.add_argument('--response-delay', type=float, default=0.0)
+    parser.add_argument('--latency-spike-rate', type=float, default=0.01)
+    parser.add_argument('--latency-spike-seconds', type=float, default=1.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.005)
+    parser.add_argument('--throttle-burst-length', type=int, default=20)
+    parser.add_argument('--server-error-rate', type=float, default=0.01)
+    parser.add_argument('--reset-rate', type=float, default=0.005)
+    parser.add_argument('--slow-body-rate', type=float, default=0.01)
+    parser.add_argument('--slow-body-seconds', type=float, default=1.0)
+    parser.add_argument('--max-rss-growth-mb', type=float, default=50)
+    parser.add_argument('--max-tracemalloc-growth-mb', type=float, default=20)
+    parser.add_argument('--max-fds-growth', type=int, default=20)
+    parser.add_argument('--max-threads-growth', type=int, default=2)
+    parser.add_argument('--max-throughput-drop', type=float, default=0.5)
+    parser.add_argument('--report', help='Write the report as json to this file')
+    args = parser.parse_args(argv)
+
+    fault_options = {
+        'latency_spike_rate': args.latency_spike_rate,
+        'latency_spike_seconds': args.latency_spike_seconds,
+        'throttle_rate': args.throttle_rate,
+        'throttle_burst_length': args.throttle_burst_length,
+        'server_error_rate': args.server_error_rate,
+        'reset_rate': args.reset_rate,
+        'slow_body_rate': args.slow_body_rate,
+        'slow_body_seconds': args.slow_body_seconds
+    }
+    thresholds = SoakThresholds(rss_growth_mb=args.max_rss_growth_mb,
+                                tracemalloc_growth_mb=args.max_tracemalloc_growth_mb,
+                                open_fds_growth=args.max_fds_growth, threads_growth=args.max_threads_growth,
+                                throughput_drop=args.max_throughput_drop)
+
+    soak_harness = SoakHarness(duration=args.duration, concurrency=args.concurrency,
+                               sample_interval=args.sample_interval, warmup=args.warmup, fault_options=fault_options,
+                               response_delay=args.response_delay, timeout=args.timeout, thresholds=thresholds,
+                               on_sample=lambda sample: print('{:.0f}s {:.1f} ops/s, {} errors'.format(
+                                   sample.elapsed, sample.throughput, sample.errors)))
+    soak_report = soak_harness.run()
+
+    print(soak_report.summary())
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(soak_report.to_dict(), report_file, indent=4)
+    return 0 if soak_report.passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
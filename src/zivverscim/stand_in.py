@@ -0,0 +1,896 @@
+import asyncio
+import base64
+import datetime
+import json
+import random
+import re
+import secrets
+import socket
+import struct
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .compression import available_encodings, compress, decompress
+from .exceptions import SCIM_ERROR_SCHEMA
+from .wrapper import SCIM_ENTERPRISE_USER_SCHEMA, SCIM_ZIVVER_USER_SCHEMA
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:
+    h2 = None
+
+SCIM_LIST_RESPONSE_SCHEMA = 'urn:ietf:params:scim:api:messages:2.0:ListResponse'
+
+
+def _now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+_FILTER_TOKEN_PATTERN = re.compile(r'\s*(\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+)')
+_FILTER_OPERATORS = {
+    'eq': lambda value, other: value == other,
+    'ne': lambda value, other: value != other,
+    'co': lambda value, other: isinstance(value, str) and other in value,
+    'sw': lambda value, other: isinstance(value, str) and value.startswith(other),
+    'ew': lambda value, other: isinstance(value, str) and value.endswith(other),
+    'gt': lambda value, other: value is not None and value > other,
+    'ge': lambda value, other: value is not None and value >= other,
+    'lt': lambda value, other: value is not None and value < other,
+    'le': lambda value, other: value is not None and value <= other,
+}
+
+
+def _get_attribute_value(scim_user, attribute_path):
+    """
+    :return: The value of the SCIM attribute path (userName, meta.lastModified, urn:...:User:aliases) or None
+    """
+    keys = {key.lower(): key for key in scim_user}
+    attribute_path = attribute_path.lower()
+    if attribute_path in keys:
+        return scim_user[keys[attribute_path]]
+
+    if attribute_path.startswith('urn:'):
+        parent, _, sub_attribute = attribute_path.rpartition(':')
+    else:
+        parent, _, sub_attribute = attribute_path.partition('.')
+
+    value = scim_user.get(keys.get(parent, parent))
+    if not isinstance(value, dict) or not sub_attribute:
+        return None
+    sub_keys = {key.lower(): key for key in value}
+    return value.get(sub_keys.get(sub_attribute, sub_attribute))
+
+
+def _normalize_filter_value(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def parse_filter(scim_filter):
+    """
+    Parses a SCIM filter, e.g. userName eq "john@doe.com" or meta.lastModified gt "2021-01-01T00:00:00Z"
+    Strings are compared case insensitive, multi-valued attributes match when one of the values matches.
+    :return: function(scim_user) -> bool
+    :except ValueError: When the filter is invalid
+    """
+    tokens = _FILTER_TOKEN_PATTERN.findall(scim_filter)
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take():
+        token = peek()
+        if token is None:
+            raise ValueError('Unexpected end of filter')
+        position[0] += 1
+        return token
+
+    def parse_value(token):
+        if token.startswith('"'):
+            return json.loads(token)
+        if token in ('true', 'false', 'null'):
+            return json.loads(token)
+        try:
+            return float(token)
+        except ValueError:
+            raise ValueError('Invalid value in filter: {}'.format(token))
+
+    def parse_factor():
+        token = take()
+        if token.lower() == 'not':
+            negated = parse_factor()
+            return lambda scim_user: not negated(scim_user)
+        if token == '(':
+            expression = parse_or()
+            if take() != ')':
+                raise ValueError('Missing ) in filter')
+            return expression
+
+        attribute_path = token
+        operator = take().lower()
+        if operator == 'pr':
+            return lambda scim_user: _get_attribute_value(scim_user, attribute_path) not in (None, '', [], {})
+        if operator not in _FILTER_OPERATORS:
+            raise ValueError('Invalid operator in filter: {}'.format(operator))
+
+        compare = _FILTER_OPERATORS[operator]
+        other = _normalize_filter_value(parse_value(take()))
+
+        def matches(scim_user):
+            value = _get_attribute_value(scim_user, attribute_path)
+            values = value if isinstance(value, list) else [value]
+            return any(compare(_normalize_filter_value(value), other) for value in values)
+        return matches
+
+    def parse_and():
+        expressions = [parse_factor()]
+        while peek() is not None and peek().lower() == 'and':
+            take()
+            expressions.append(parse_factor())
+        return lambda scim_user: all(expression(scim_user) for expression in expressions)
+
+    def parse_or():
+        expressions = [parse_and()]
+        while peek() is not None and peek().lower() == 'or':
+            take()
+            expressions.append(parse_and())
+        return lambda scim_user: any(expression(scim_user) for expression in expressions)
+
+    if not tokens:
+        raise ValueError('Empty filter')
+    expression = parse_or()
+    if peek() is not None:
+        raise ValueError('Unexpected token in filter: {}'.format(peek()))
+    return expression
+
+
+class ScimStandIn:
+    """
+    Local stand-in for the Zivver SCIM API and an OAuth token endpoint, to test without talking to Zivver.
+    Keeps the users in memory and handles the requests like Zivver would.
+    Errors are returned as plain text, like Zivver does, or with scim_errors as SCIM error bodies.
+    """
+
+    def __init__(self, base_path='/api/scim/v2/Users/', token_path='/oauth/token', api_keys=None, client_id=None,
+                 client_secret=None, token_lifetime=3600, compression_threshold=1024, filter_supported=True,
+                 max_page_size=None, scim_errors=False):
+        self.base_path = base_path
+        self.token_path = token_path
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_lifetime = token_lifetime
+
+        # token -> expires_at (None never expires)
+        self.tokens = {}
+        for api_key in api_keys or []:
+            self.tokens[api_key] = None
+        self.check_auth = bool(api_keys) or client_id is not None
+
+        # Set filter_supported to False to reject all SCIM filters, like a server without filter support
+        self.filter_supported = filter_supported
+        # Set scim_errors to return the errors as SCIM error bodies (RFC 7644) instead of the plain text of Zivver
+        self.scim_errors = scim_errors
+        # Return at most max_page_size users per listing, whatever the count, like a server that caps the page size
+        self.max_page_size = max_page_size
+
+        # Responses of at least compression_threshold bytes are compressed when the client accepts it
+        self.compression_threshold = compression_threshold
+
+        self.users = {}
+        self.token_requests = 0
+        self.request_count = 0
+        # Body bytes as they went over the wire
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def issue_token(self, lifetime=None):
+        """
+        Issue a new token, like the token endpoint does
+        :return: (token, expires_in)
+        """
+        if lifetime is None:
+            lifetime = self.token_lifetime
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.tokens[token] = time.monotonic() + lifetime
+        return token, lifetime
+
+    def revoke_tokens(self):
+        """
+        Revoke all tokens that were issued by the token endpoint
+        """
+        with self._lock:
+            for token, expires_at in list(self.tokens.items()):
+                if expires_at is not None:
+                    del self.tokens[token]
+
+    def handle(self, method, path, headers, body):
+        """
+        Handle one request, (de)compresses the bodies on Content-Encoding and Accept-Encoding
+        :return: (status_code, headers, body bytes)
+        """
+        headers = {key.lower(): value for key, value in headers.items()}
+        with self._lock:
+            self.request_count += 1
+            self.bytes_received += len(body)
+
+        content_encoding = headers.get('content-encoding', '')
+        if content_encoding:
+            try:
+                body = decompress(body, content_encoding)
+            except ValueError:
+                return self._text(415, 'Unsupported Content-Encoding: {}'.format(content_encoding))
+
+        status_code, response_headers, response_body = self._route(method, path, headers, body)
+
+        accept_encoding = [value.split(';')[0].strip() for value in headers.get('accept-encoding', '').split(',')]
+        if len(response_body) >= self.compression_threshold:
+            for encoding in accept_encoding:
+                if encoding in available_encodings():
+                    response_body = compress(response_body, encoding)
+                    response_headers = dict(response_headers, **{'Content-Encoding': encoding})
+                    break
+
+        with self._lock:
+            self.bytes_sent += len(response_body)
+        return status_code, response_headers, response_body
+
+    def _route(self, method, path, headers, body):
+        parsed_url = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(parsed_url.query))
+
+        if parsed_url.path == self.token_path and method == 'POST':
+            return self._handle_token(headers, body)
+
+        if not parsed_url.path.startswith(self.base_path.rstrip('/')):
+            return self._text(404, 'Not found')
+
+        if self.check_auth and not self._is_authorized(headers):
+            return self._text(401, 'Unauthorized')
+
+        account_id = parsed_url.path[len(self.base_path.rstrip('/')):].strip('/')
+
+        if method == 'POST' and not account_id:
+            return self._create_user(body)
+        if method == 'GET' and not account_id:
+            return self._list_users(query)
+        if method == 'GET':
+            return self._get_user(account_id, query)
+        if method == 'PUT':
+            return self._replace_user(account_id, body)
+        if method == 'DELETE':
+            return self._delete_user(account_id)
+        return self._text(405, 'Method not allowed')
+
+    def _is_authorized(self, headers):
+        authorization = headers.get('authorization', '')
+        if not authorization.startswith('Bearer '):
+            return False
+        token = authorization[len('Bearer '):]
+        with self._lock:
+            if token not in self.tokens:
+                return False
+            expires_at = self.tokens[token]
+        return expires_at is None or time.monotonic() < expires_at
+
+    def _handle_token(self, headers, body):
+        with self._lock:
+            self.token_requests += 1
+
+        form = dict(urllib.parse.parse_qsl(body.decode('utf-8')))
+        client_id = form.get('client_id')
+        client_secret = form.get('client_secret')
+
+        authorization = headers.get('authorization', '')
+        if authorization.startswith('Basic '):
+            decoded = base64.b64decode(authorization[len('Basic '):]).decode('utf-8')
+            client_id, _, client_secret = decoded.partition(':')
+
+        if form.get('grant_type') != 'client_credentials':
+            return self._json(400, {'error': 'unsupported_grant_type'})
+        if client_id != self.client_id or client_secret != self.client_secret:
+            return self._json(401, {'error': 'invalid_client'})
+
+        token, expires_in = self.issue_token()
+        return self._json(200, {'access_token': token, 'token_type': 'Bearer', 'expires_in': expires_in})
+
+    def _create_user(self, body):
+        scim_user = json.loads(body.decode('utf-8'))
+        user_name = scim_user.get('userName')
+        if not user_name:
+            return self._text(400, 'Missing field: userName')
+
+        with self._lock:
+            for existing_user in self.users.values():
+                if existing_user.get('userName') == user_name:
+                    return self._text(409, 'Account with userName {} already exists'.format(user_name))
+
+            account_id = str(uuid.uuid4())
+            timestamp = _now_iso()
+            scim_user['id'] = account_id
+            scim_user['meta'] = {
+                'created': timestamp,
+                'lastModified': timestamp,
+                'location': '{}{}'.format(self.base_path, account_id),
+                'resourceType': 'User'
+            }
+            self.users[account_id] = scim_user
+        return self._json(201, scim_user)
+
+    def _get_user(self, account_id, query):
+        with self._lock:
+            scim_user = self.users.get(account_id)
+        if scim_user is None:
+            return self._text(404, 'Unknown account with uuid: {}'.format(account_id))
+        return self._json(200, self._project(scim_user, query))
+
+    def _split_attribute(self, scim_user, attribute):
+        """
+        :return: (attribute, sub-attribute or None), e.g. name.formatted or urn:...:User:aliases
+        """
+        if attribute in scim_user or attribute in (SCIM_ENTERPRISE_USER_SCHEMA, SCIM_ZIVVER_USER_SCHEMA):
+            return attribute, None
+        if attribute.startswith('urn:'):
+            parent, _, sub_attribute = attribute.rpartition(':')
+            return parent, sub_attribute
+        if '.' in attribute:
+            parent, sub_attribute = attribute.split('.', 1)
+            return parent, sub_attribute
+        return attribute, None
+
+    def _project(self, scim_user, query):
+        """
+        Apply the attributes/excludedAttributes query parameters to the user
+        """
+        attributes = [attribute for attribute in query.get('attributes', '').split(',') if attribute]
+        excluded_attributes = [attribute for attribute in query.get('excludedAttributes', '').split(',') if attribute]
+
+        if attributes:
+            projected_user = {'id': scim_user['id'], 'schemas': scim_user.get('schemas', [])}
+            for attribute in attributes:
+                parent, sub_attribute = self._split_attribute(scim_user, attribute)
+                if parent not in scim_user:
+                    continue
+                if sub_attribute is None or not isinstance(scim_user[parent], dict):
+                    projected_user[parent] = scim_user[parent]
+                elif sub_attribute in scim_user[parent]:
+                    projected_user.setdefault(parent, {})[sub_attribute] = scim_user[parent][sub_attribute]
+            scim_user = projected_user
+
+        for attribute in excluded_attributes:
+            parent, sub_attribute = self._split_attribute(scim_user, attribute)
+            if parent in ('id', 'schemas') or parent not in scim_user:
+                continue
+            if sub_attribute is None:
+                scim_user = {key: val for key, val in scim_user.items() if key != parent}
+            elif isinstance(scim_user[parent], dict):
+                scim_user = dict(scim_user)
+                scim_user[parent] = {key: val for key, val in scim_user[parent].items() if key != sub_attribute}
+
+        return scim_user
+
+    def _list_users(self, query):
+        with self._lock:
+            scim_users = list(self.users.values())
+
+        if query.get('filter'):
+            if not self.filter_supported:
+                return self._text(400, 'Filtering is not supported')
+            try:
+                matches = parse_filter(query['filter'])
+            except ValueError as ve:
+                return self._text(400, 'Invalid filter: {}'.format(ve))
+            scim_users = [scim_user for scim_user in scim_users if matches(scim_user)]
+
+        total_results = len(scim_users)
+        start_index = max(int(query.get('startIndex', 1)), 1)
+        count = int(query.get('count', total_results))
+        if self.max_page_size is not None:
+            count = min(count, self.max_page_size)
+        resources = scim_users[start_index - 1:start_index - 1 + count]
+        resources = [self._project(scim_user, query) for scim_user in resources]
+
+        return self._json(200, {
+            'schemas': [SCIM_LIST_RESPONSE_SCHEMA],
+            'totalResults': total_results,
+            'startIndex': start_index,
+            'itemsPerPage': len(resources),
+            'Resources': resources
+        })
+
+    def _replace_user(self, account_id, body):
+        scim_user = json.loads(body.decode('utf-8'))
+        with self._lock:
+            existing_user = self.users.get(account_id)
+            if existing_user is None:
+                return self._text(404, 'Unknown account with uuid: {}'.format(account_id))
+            scim_user['id'] = account_id
+            scim_user['meta'] = dict(existing_user['meta'], lastModified=_now_iso())
+            self.users[account_id] = scim_user
+        return self._json(200, scim_user)
+
+    def _delete_user(self, account_id):
+        with self._lock:
+            scim_user = self.users.pop(account_id, None)
+        if scim_user is None:
+            return self._text(404, 'Unknown account with uuid: {}'.format(account_id))
+        return 204, {}, b''
+
+    def _json(self, status_code, content):
+        return status_code, {'Content-Type': 'application/json'}, json.dumps(content).encode('utf-8')
+
+    def _text(self, status_code, text):
+        if self.scim_errors and status_code >= 400:
+            scim_error = {'schemas': [SCIM_ERROR_SCHEMA], 'status': str(status_code), 'detail': text}
+            if status_code == 409:
+                scim_error['scimType'] = 'uniqueness'
+            return status_code, {'Content-Type': 'application/scim+json'}, json.dumps(scim_error).encode('utf-8')
+        return status_code, {'Content-Type': 'text/plain'}, text.encode('utf-8')
+
+
+class FaultInjector:
+    """
+    Injects faults in the responses of the StandInServer, every rate is the chance per request (0.0 - 1.0):
+    latency spikes, bursts of 429 responses, 5xx responses, connection resets and slow response bodies.
+    """
+    LATENCY_SPIKE = 'latency_spike'
+    THROTTLE = 'throttle'
+    SERVER_ERROR = 'server_error'
+    RESET = 'reset'
+    SLOW_BODY = 'slow_body'
+
+    def __init__(self, latency_spike_rate=0.0, latency_spike_seconds=1.0, throttle_rate=0.0, throttle_burst_length=10,
+                 server_error_rate=0.0, reset_rate=0.0, slow_body_rate=0.0, slow_body_seconds=1.0, seed=None):
+        self.latency_spike_rate = latency_spike_rate
+        self.latency_spike_seconds = latency_spike_seconds
+        self.throttle_rate = throttle_rate
+        self.throttle_burst_length = throttle_burst_length
+        self.server_error_rate = server_error_rate
+        self.reset_rate = reset_rate
+        self.slow_body_rate = slow_body_rate
+        self.slow_body_seconds = slow_body_seconds
+
+        # fault -> number of times it was injected
+        self.injected = {}
+        self._throttled_requests_left = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_fault(self):
+        """
+        :return: The fault to inject in the next response, None for a normal response
+        """
+        with self._lock:
+            fault = None
+            if self._throttled_requests_left > 0:
+                self._throttled_requests_left -= 1
+                fault = self.THROTTLE
+            elif self._random.random() < self.throttle_rate:
+                self._throttled_requests_left = self.throttle_burst_length - 1
+                fault = self.THROTTLE
+            else:
+                for fault_name, rate in ((self.RESET, self.reset_rate), (self.SERVER_ERROR, self.server_error_rate),
+                                         (self.LATENCY_SPIKE, self.latency_spike_rate),
+                                         (self.SLOW_BODY, self.slow_body_rate)):
+                    if self._random.random() < rate:
+                        fault = fault_name
+                        break
+
+            if fault is not None:
+                self.injected[fault] = self.injected.get(fault, 0) + 1
+            return fault
+
+
+class _StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+    Passes the HTTP requests to the ScimStandIn object of the server
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length) if content_length else b''
+
+        if not self.server.enter_request():
+            # More requests in flight than the server can handle
+            self.server.leave_request()
+            self._send(429, {'Content-Type': 'application/json'},
+                       json.dumps({'code': 429, 'message': 'Too many requests'}).encode('utf-8'))
+            return
+        try:
+            self._handle_request(body)
+        finally:
+            self.server.leave_request()
+
+    def _send(self, status_code, headers, response_body):
+        self.send_response(status_code)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def _handle_request(self, body):
+        if self.server.response_delay:
+            time.sleep(self.server.response_delay)
+
+        fault = self.server.faults.next_fault() if self.server.faults is not None else None
+        if fault == FaultInjector.RESET:
+            # Close with a TCP RST instead of a response
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault == FaultInjector.THROTTLE:
+            status_code, headers, response_body = 429, {'Content-Type': 'application/json'}, json.dumps(
+                {'code': 429, 'message': 'Too many requests'}
+            ).encode('utf-8')
+        elif fault == FaultInjector.SERVER_ERROR:
+            status_code, headers, response_body = 503, {'Content-Type': 'text/plain'}, b'Service Unavailable'
+        else:
+            if fault == FaultInjector.LATENCY_SPIKE:
+                time.sleep(self.server.faults.latency_spike_seconds)
+            status_code, headers, response_body = self.server.stand_in.handle(self.command, self.path,
+                                                                              dict(self.headers.items()), body)
+
+        self.send_response(status_code)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+
+        if fault == FaultInjector.SLOW_BODY and response_body:
+            chunk_size = max(len(response_body) // 10, 1)
+            for start in range(0, len(response_body), chunk_size):
+                self.wfile.write(response_body[start:start + chunk_size])
+                self.wfile.flush()
+                time.sleep(self.server.faults.slow_body_seconds / 10)
+        else:
+            self.wfile.write(response_body)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_PATCH = _handle
+    do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connection_count = 0
+    max_in_flight = None
+    in_flight = 0
+    throttled_count = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight_lock = threading.Lock()
+
+    def enter_request(self):
+        """
+        :return: False when there are more than max_in_flight requests in flight
+        """
+        with self._in_flight_lock:
+            self.in_flight += 1
+            if self.max_in_flight is not None and self.in_flight > self.max_in_flight:
+                self.throttled_count += 1
+                return False
+            return True
+
+    def leave_request(self):
+        with self._in_flight_lock:
+            self.in_flight -= 1
+
+    def process_request(self, request, client_address):
+        self.connection_count += 1
+        super().process_request(request, client_address)
+
+
+class StandInServer:
+    """
+    Runs the ScimStandIn on a local HTTP/1.1 server in a background thread.
+    response_delay (seconds) is added to every response, to simulate the round trip to Zivver.
+    Pass a FaultInjector() object as faults to inject failures.
+    With max_in_flight the server answers 429 when more requests than that are handled at the same time,
+    like a tenant with a limited capacity.
+    Use as context manager:
+
+        with StandInServer() as server:
+            ZivverSCIMConnection(..., scim_api_get_url=server.users_url)
+    """
+
+    def __init__(self, stand_in=None, host='127.0.0.1', port=0, response_delay=0, faults=None, max_in_flight=None):
+        self.stand_in = stand_in if stand_in is not None else ScimStandIn()
+        self.host = host
+        self.port = port
+        self.response_delay = response_delay
+        # Optional FaultInjector() object
+        self.faults = faults
+        self.max_in_flight = max_in_flight
+        self._http_server = None
+        self._thread = None
+
+    @property
+    def connection_count(self):
+        """
+        :return: Number of TCP connections the clients opened
+        """
+        return self._http_server.connection_count if self._http_server is not None else 0
+
+    @property
+    def throttled_count(self):
+        """
+        :return: Number of requests that got a 429 because of max_in_flight
+        """
+        return self._http_server.throttled_count if self._http_server is not None else 0
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    @property
+    def users_url(self):
+        return '{}{}'.format(self.url, self.stand_in.base_path)
+
+    @property
+    def token_url(self):
+        return '{}{}'.format(self.url, self.stand_in.token_path)
+
+    def start(self):
+        self._http_server = _ThreadingHTTPServer((self.host, self.port), _StandInRequestHandler)
+        self._http_server.stand_in = self.stand_in
+        self._http_server.response_delay = self.response_delay
+        self._http_server.faults = self.faults
+        self._http_server.max_in_flight = self.max_in_flight
+        self.port = self._http_server.server_address[1]
+        self._thread = threading.Thread(target=self._http_server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def serve_stand_in(ready_queue, stop_event, response_delay=0, fault_options=None):
+    """
+    Runs a StandInServer until stop_event is set, the target of the child process of StandInProcess.
+    The users url is put on ready_queue when the server is up.
+    :param fault_options: Optional dict with the FaultInjector() arguments
+    """
+    faults = FaultInjector(**fault_options) if fault_options else None
+    with StandInServer(response_delay=response_delay, faults=faults) as server:
+        ready_queue.put(server.users_url)
+        stop_event.wait()
+
+
+class StandInProcess:
+    """
+    Runs a StandInServer in a child process, so its memory, sockets, threads and CPU time do not count for the
+    client (soak tests, traffic replay, benchmarks). Use as context manager:
+
+        with StandInProcess(response_delay=0.01) as server:
+            ZivverSCIMConnection(..., scim_api_get_url=server.users_url)
+    """
+
+    def __init__(self, response_delay=0, fault_options=None):
+        self.response_delay = response_delay
+        # Optional dict with the FaultInjector() arguments
+        self.fault_options = fault_options
+        self.users_url = None
+        self._process = None
+        self._stop_event = None
+
+    def start(self):
+        import multiprocessing
+
+        context = multiprocessing.get_context('spawn')
+        ready_queue = context.Queue()
+        self._stop_event = context.Event()
+        self._process = context.Process(target=serve_stand_in, daemon=True, args=(
+            ready_queue, self._stop_event, self.response_delay, self.fault_options
+        ))
+        self._process.start()
+        self.users_url = ready_queue.get(timeout=30)
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._stop_event.set()
+            self._process.join(timeout=10)
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _Http2Protocol(asyncio.Protocol):
+    """
+    One HTTP/2 connection (prior knowledge, no TLS), every stream is handled by the ScimStandIn
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.connection = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8')
+        )
+        self.transport = None
+        self.streams = {}
+        self.window_waiters = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connection_count += 1
+        self.server.protocols.add(self)
+        self.connection.initiate_connection()
+        self.connection.update_settings({
+            h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self.server.max_concurrent_streams
+        })
+        self.transport.write(self.connection.data_to_send())
+
+    def connection_lost(self, exc):
+        self.server.protocols.discard(self)
+        self._wake_window_waiters()
+
+    def data_received(self, data):
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.connection.data_to_send())
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.streams.pop(event.stream_id)
+                asyncio.ensure_future(self._respond(event.stream_id, headers, bytes(body)))
+            elif isinstance(event, h2.events.StreamReset):
+                self.streams.pop(event.stream_id, None)
+            elif isinstance(event, h2.events.WindowUpdated):
+                self._wake_window_waiters()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+
+        self.transport.write(self.connection.data_to_send())
+
+    def _wake_window_waiters(self):
+        for waiter in self.window_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.window_waiters = []
+
+    async def _respond(self, stream_id, headers, body):
+        if self.server.response_delay:
+            await asyncio.sleep(self.server.response_delay)
+
+        request_headers = {key: val for key, val in headers.items() if not key.startswith(':')}
+        status_code, response_headers, response_body = self.server.stand_in.handle(
+            headers[':method'], headers[':path'], request_headers, body
+        )
+
+        h2_headers = [(':status', str(status_code))]
+        h2_headers += [(key.lower(), val) for key, val in response_headers.items()]
+        h2_headers.append(('content-length', str(len(response_body))))
+
+        try:
+            self.connection.send_headers(stream_id, h2_headers, end_stream=not response_body)
+            self.transport.write(self.connection.data_to_send())
+
+            while response_body:
+                window = self.connection.local_flow_control_window(stream_id)
+                if window <= 0:
+                    if self.transport.is_closing():
+                        return
+                    waiter = asyncio.get_event_loop().create_future()
+                    self.window_waiters.append(waiter)
+                    await waiter
+                    continue
+                chunk_size = min(window, len(response_body), self.connection.max_outbound_frame_size)
+                self.connection.send_data(stream_id, response_body[:chunk_size],
+                                          end_stream=chunk_size == len(response_body))
+                response_body = response_body[chunk_size:]
+                self.transport.write(self.connection.data_to_send())
+        except h2.exceptions.StreamClosedError:
+            # The client reset the stream
+            pass
+
+
+class Http2StandInServer:
+    """
+    Runs the ScimStandIn on a local HTTP/2 server (h2c, prior knowledge) in a background thread.
+    Needs the optional h2 package.
+    """
+
+    def __init__(self, stand_in=None, host='127.0.0.1', port=0, response_delay=0, max_concurrent_streams=1000):
+        if h2 is None:
+            raise ImportError('The HTTP/2 stand-in needs the h2 package: pip install h2')
+
+        self.stand_in = stand_in if stand_in is not None else ScimStandIn()
+        self.host = host
+        self.port = port
+        self.response_delay = response_delay
+        self.max_concurrent_streams = max_concurrent_streams
+        self.connection_count = 0
+        self.protocols = set()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    @property
+    def users_url(self):
+        return '{}{}'.format(self.url, self.stand_in.base_path)
+
+    @property
+    def token_url(self):
+        return '{}{}'.format(self.url, self.stand_in.token_path)
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            server = self._loop.run_until_complete(
+                self._loop.create_server(lambda: _Http2Protocol(self), self.host, self.port)
+            )
+            self.port = server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+            server.close()
+            for protocol in list(self.protocols):
+                protocol.transport.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
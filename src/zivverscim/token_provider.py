@@ -0,0 +1,182 @@
+import threading
+import time
+
+from .exceptions import ZivverTokenError
+
+
+class TokenProvider:
+    """
+    Hands out the OAuth token that is send in the Authorization header.
+    Subclass this object to plug in your own way of getting a token.
+    """
+
+    # Providers that can fetch a new token will get a retry after a 401 response
+    can_refresh = False
+
+    def get_token(self):
+        """
+        :return: The token value to use for the next request
+        """
+        raise NotImplementedError
+
+    async def async_get_token(self):
+        """
+        Async version of get_token(), never blocks the running event loop
+        :return: The token value to use for the next request
+        """
+        return self.get_token()
+
+    def invalidate(self, token):
+        """
+        Called when Zivver rejected the token with a 401, so the next get_token() fetches a new one
+        """
+        pass
+
+
+class StaticTokenProvider(TokenProvider):
+    """
+    Always returns the same token, this is the generated API key from Zivver
+    """
+
+    def __init__(self, token_value):
+        self.token_value = token_value
+
+    def get_token(self):
+        return self.token_value
+
+
+class ClientCredentialsTokenProvider(TokenProvider):
+    """
+    Fetches short-lived tokens with the OAuth client-credentials grant and caches them.
+
+    The token is refreshed refresh_margin seconds before it expires, at most half way its lifetime for short-lived
+    tokens. Only one refresh runs at a time:
+    while a token is still valid other threads keep using it, when it is expired they wait for the refresh.
+    """
+
+    can_refresh = True
+
+    def __init__(self, token_url, client_id, client_secret, scope=None, refresh_margin=60, timeout=30,
+                 default_expires_in=3600, credentials_in_body=False, clock=time.monotonic):
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.default_expires_in = default_expires_in
+        self.credentials_in_body = credentials_in_body
+        self.clock = clock
+
+        # Number of tokens fetched from the token endpoint
+        self.refresh_count = 0
+
+        # (token, expires_at, refresh_at) is swapped as one tuple, so readers never see a half updated state
+        self._state = (None, 0, 0)
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, token, refresh_at):
+        return token is not None and self.clock() < refresh_at
+
+    def _is_valid(self, token, expires_at):
+        return token is not None and self.clock() < expires_at
+
+    def get_token(self):
+        token, expires_at, refresh_at = self._state
+        if self._is_fresh(token, refresh_at):
+            return token
+
+        if self._is_valid(token, expires_at):
+            # Refresh ahead of expiry, if someone else is already refreshing keep using the current token
+            if not self._lock.acquire(blocking=False):
+                return token
+        else:
+            self._lock.acquire()
+
+        try:
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    async def async_get_token(self):
+        token, expires_at, refresh_at = self._state
+        if self._is_fresh(token, refresh_at):
+            return token
+
+        # The refresh does a blocking HTTP call, run it outside of the event loop
+        import asyncio
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get_token)
+
+    def invalidate(self, token):
+        with self._lock:
+            # Only forget the token if nobody replaced it already
+            if self._state[0] == token:
+                self._state = (None, 0, 0)
+
+    def _refresh(self):
+        """
+        Fetch a new token, the lock must be held by the caller
+        """
+        token, expires_at, refresh_at = self._state
+        if self._is_fresh(token, refresh_at):
+            # Another caller refreshed the token while we were waiting for the lock
+            return token
+
+        try:
+            new_token, expires_in = self._fetch_token()
+        except ZivverTokenError:
+            if self._is_valid(token, expires_at):
+                # Try again on the next call, the current token still works
+                return token
+            raise
+
+        # A token that lives shorter than twice the margin is refreshed half way, not on every call
+        now = self.clock()
+        self._state = (new_token, now + expires_in, now + expires_in - min(self.refresh_margin, expires_in / 2))
+        self.refresh_count += 1
+        return new_token
+
+    def _fetch_token(self):
+        """
+        Do the client-credentials request to the token endpoint
+        :return: (access_token, expires_in)
+        """
+        data = {'grant_type': 'client_credentials'}
+        if self.scope:
+            data['scope'] = self.scope
+
+        # Imported here, so importing the library does not pay for requests when no token is fetched
+        import requests
+
+        auth = (self.client_id, self.client_secret)
+        if self.credentials_in_body:
+            data['client_id'] = self.client_id
+            data['client_secret'] = self.client_secret
+            auth = None
+
+        try:
+            response = requests.post(self.token_url, data=data, auth=auth, headers={'Accept': 'application/json'},
+                                     timeout=self.timeout)
+        except requests.RequestException as re:
+            raise ZivverTokenError('Could not reach the token endpoint: {}'.format(re))
+
+        if response.status_code != 200:
+            raise ZivverTokenError('Token endpoint returned status code {}: {}'.format(response.status_code,
+                                                                                     response.text))
+
+        try:
+            token_response = response.json()
+        except ValueError:
+            raise ZivverTokenError('Token endpoint did not return json')
+
+        access_token = token_response.get('access_token')
+        if not access_token:
+            raise ZivverTokenError('Missing field: access_token')
+
+        try:
+            expires_in = int(token_response.get('expires_in', self.default_expires_in))
+        except (TypeError, ValueError):
+            expires_in = self.default_expires_in
+
+        return access_token, expires_in
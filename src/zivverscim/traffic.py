@@ -0,0 +1,485 @@
+import argparse
+import collections
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+TRAFFIC_FORMAT = 'zivverscim-traffic'
+TRAFFIC_VERSION = 1
+
+# Query parameters that tell the shape of a request and hold no personal data, the others are redacted
+SHAPE_QUERY_PARAMETERS = ('startIndex', 'count', 'attributes', 'excludedAttributes')
+# Body fields with a fixed value, kept as they are
+SHAPE_FIELDS = ('resourceType',)
+
+# Latency percentiles in the reports
+PERCENTILES = (50, 90, 95, 99)
+
+_QUOTED_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def _open_traffic_file(path, mode):
+    """
+    :return: The traffic file opened as text, gzip compressed when the path ends with .gz
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def percentile(values, percent):
+    """
+    :return: The nearest-rank percentile of the values, None when there are no values
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def get_latency_percentiles(latencies):
+    """
+    :return: dict p50, p90, p95, p99 and max of the latencies in milliseconds
+    """
+    latency_percentiles = collections.OrderedDict()
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        latency_percentiles['p{}'.format(percent)] = value * 1000 if value is not None else None
+    latency_percentiles['max'] = max(latencies) * 1000 if latencies else None
+    return latency_percentiles
+
+
+class _Redactor:
+    """
+    Replaces the personal data (names, e-mail addresses, account ids, ...) by pseudonyms. The same value gets the
+    same pseudonym within one recording, so the replay can tell which requests are about the same account.
+    The key is random and not stored, the pseudonyms can not be traced back.
+    """
+
+    def __init__(self):
+        self._key = secrets.token_bytes(32)
+
+    def pseudonym(self, value):
+        digest = hmac.new(self._key, value.encode('utf-8'), hashlib.sha256).hexdigest()
+        if '@' in value:
+            return 'u{}@{}.invalid'.format(digest[:12], digest[12:20])
+        return 'x{}'.format(digest[:16])
+
+    def redact_value(self, value):
+        """
+        :return: The JSON value with every string replaced, except the SCIM schema URNs and the SHAPE_FIELDS
+        """
+        if isinstance(value, dict):
+            return {key: val if key in SHAPE_FIELDS else self.redact_value(val) for key, val in value.items()}
+        if isinstance(value, list):
+            return [self.redact_value(val) for val in value]
+        if isinstance(value, str) and not value.startswith('urn:'):
+            return self.pseudonym(value)
+        return value
+
+    def redact_url(self, url):
+        """
+        :return: Path and query of the url, without scheme and host, with the account ids and filter values replaced
+        """
+        split_url = urllib.parse.urlsplit(url)
+        segments = split_url.path.split('/')
+        for index in range(1, len(segments)):
+            if segments[index - 1].lower() == 'users' and segments[index]:
+                segments[index] = self.pseudonym(urllib.parse.unquote(segments[index]))
+
+        query = []
+        for key, value in urllib.parse.parse_qsl(split_url.query, keep_blank_values=True):
+            if key == 'filter':
+                value = _QUOTED_PATTERN.sub(lambda match: '"{}"'.format(self.pseudonym(match.group(1))), value)
+            elif key not in SHAPE_QUERY_PARAMETERS:
+                value = self.pseudonym(value)
+            query.append((key, value))
+
+        path = '/'.join(segments)
+        return '{}?{}'.format(path, urllib.parse.urlencode(query)) if query else path
+
+
+class TrafficRecorder:
+    """
+    Records the shape and timing of every request an OauthConnection sends, to replay the traffic offline with
+    TrafficReplayer. Pass it as traffic_recorder to ZivverSCIMConnection (or OauthConnection).
+
+    Headers (and so the tokens) are never recorded. Names, e-mail addresses, account ids and filter values are
+    replaced by pseudonyms, only the SCIM schema URNs, numbers, booleans and the structure of the bodies are kept.
+    The records are written as JSON lines to path, gzip compressed when the path ends with .gz.
+    Without a path they are kept in `records`.
+    """
+
+    def __init__(self, path=None, capture_bodies=True):
+        self.path = path
+        # Record the (redacted) request bodies, without them a replay sends the requests without body
+        self.capture_bodies = capture_bodies
+        self.records = []
+        self.record_count = 0
+
+        self._redactor = _Redactor()
+        self._started_at = time.perf_counter()
+        self._in_flight = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            self._file = _open_traffic_file(path, 'w')
+            self._file.write(json.dumps({
+                'format': TRAFFIC_FORMAT,
+                'version': TRAFFIC_VERSION,
+                'started': datetime.datetime.now(datetime.timezone.utc).isoformat()
+            }) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Flush and close the traffic file
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def begin(self):
+        """
+        Call right before the request is sent
+        :return: (start time, requests in flight including this one), pass it to end()
+        """
+        with self._lock:
+            self._in_flight += 1
+            return time.perf_counter(), self._in_flight
+
+    def end(self, begun, method, url, object_serialized=None, data=None, response=None, exception=None):
+        """
+        Record the request that was started with begin(). A failed request is written right away, the record of a
+        response waits for finish() to add the fields of the decoded response.
+        :param data: The body bytes as they were sent (compressed)
+        :param response: The response, or the exception when the request failed
+        """
+        started_at, in_flight = begun
+        latency = time.perf_counter() - started_at
+        with self._lock:
+            self._in_flight -= 1
+
+        record = {
+            't': round(started_at - self._started_at, 6),
+            'l': round(latency, 6),
+            'c': in_flight,
+            'm': method,
+            'p': self._redactor.redact_url(url),
+            'z': len(data) if data is not None else 0
+        }
+        if self.capture_bodies and object_serialized is not None:
+            record['b'] = self._redactor.redact_value(object_serialized)
+        if response is not None:
+            record['s'] = response.status_code
+            content = getattr(response, 'content', None)
+            record['n'] = len(content) if content is not None else None
+        if exception is not None:
+            record['e'] = exception.__class__.__name__
+
+        # A request that is retried (401) is not finished, write it before the next one
+        self._add_pending()
+        if exception is not None:
+            self._add(record)
+        else:
+            self._local.pending = record
+
+    def finish(self, result):
+        """
+        Add the (redacted) id and totalResults of the decoded response to the record of the last request of this
+        thread and write it. The replay uses them to map the account ids and to create as many users as the
+        listings returned.
+        """
+        record = getattr(self._local, 'pending', None)
+        if record is None:
+            return
+        if isinstance(result, dict):
+            if isinstance(result.get('id'), str):
+                record['i'] = self._redactor.pseudonym(result['id'])
+            if isinstance(result.get('totalResults'), int):
+                record['r'] = result['totalResults']
+        self._add_pending()
+
+    def _add_pending(self):
+        record = getattr(self._local, 'pending', None)
+        if record is not None:
+            self._local.pending = None
+            self._add(record)
+
+    def _add(self, record):
+        """
+        Write the record to the traffic file, or keep it when there is no file
+        """
+        self._local.last_record = record
+        with self._lock:
+            self.record_count += 1
+            if self.path is None:
+                self.records.append(record)
+            elif self._file is not None:
+                self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def get_last_record(self):
+        """
+        :return: The last record written by this thread, None when there is none
+        """
+        return getattr(self._local, 'last_record', None)
+
+
+def load_traffic(path):
+    """
+    :return: (header dict, list of record dicts) of a traffic file written by TrafficRecorder
+    """
+    with _open_traffic_file(path, 'r') as traffic_file:
+        header = json.loads(traffic_file.readline())
+        if header.get('format') != TRAFFIC_FORMAT:
+            raise ValueError('Not a zivverscim traffic file: {}'.format(path))
+        records = [json.loads(line) for line in traffic_file if line.strip()]
+    return header, records
+
+
+class ReplayReport:
+    """
+    Result of a TrafficReplayer run, with the latencies of the recording to compare with
+    """
+
+    def __init__(self, speed, concurrency, duration, latencies, status_counts, status_mismatches, errors,
+                 recorded_latencies):
+        self.speed = speed
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests = len(latencies)
+        self.throughput = self.requests / duration if duration else 0.0
+        self.latency = get_latency_percentiles(latencies)
+        self.recorded_latency = get_latency_percentiles(recorded_latencies)
+        # Status code -> count
+        self.status_counts = status_counts
+        # Number of requests that got another status code than in the recording
+        self.status_mismatches = status_mismatches
+        # Exception class name -> count
+        self.errors = errors
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def summary(self):
+        """
+        :return: Text summary of the run
+        """
+        lines = [
+            'Replayed {} requests at {} speed with concurrency {} in {:.2f}s: {:.1f} requests/s'.format(
+                self.requests, 'max' if self.speed is None else '{}x'.format(self.speed), self.concurrency,
+                self.duration, self.throughput),
+            '{:<10} {:>12} {:>12}'.format('latency', 'replay ms', 'recorded ms')
+        ]
+        for name, value in self.latency.items():
+            recorded_value = self.recorded_latency.get(name)
+            lines.append('{:<10} {:>12} {:>12}'.format(
+                name, '{:.2f}'.format(value) if value is not None else '-',
+                '{:.2f}'.format(recorded_value) if recorded_value is not None else '-'))
+        lines.append('Status codes: {}'.format(
+            ', '.join('{}: {}'.format(status, count) for status, count in sorted(self.status_counts.items()))))
+        lines.append('Status code mismatches: {}'.format(self.status_mismatches))
+        lines.append('Errors: {}'.format(self.errors or 'none'))
+        return '\n'.join(lines)
+
+
+class TrafficReplayer:
+    """
+    Sends recorded traffic again, against a local stand-in (started in a child process) or server_url.
+    The requests start at their recorded offsets divided by speed (speed=None sends them as fast as possible),
+    with at most `concurrency` requests in flight, by default the highest concurrency of the recording.
+
+    Before the replay the server gets as many users as the largest recorded listing and the accounts the
+    recording uses but did not create; the recorded account ids are mapped to those.
+    """
+
+    def __init__(self, records, speed=1.0, concurrency=None, server_url=None, response_delay=0.0, timeout=30,
+                 connection_options=None):
+        self.records = sorted(records, key=lambda record: record['t'])
+        self.speed = speed
+        self.concurrency = concurrency or max([record.get('c', 1) for record in self.records] or [1])
+        self.server_url = server_url
+        self.response_delay = response_delay
+        self.timeout = timeout
+        self.connection_options = connection_options or {}
+
+        # Recorded (pseudonym) account id -> account id on the replay server
+        self._account_ids = {}
+        self._lock = threading.Lock()
+
+    def _get_seed_accounts(self):
+        """
+        :return: (accounts used but not created by the recording, number of users of the largest listing)
+        """
+        created = {record['i'] for record in self.records if record['m'] == 'POST' and 'i' in record}
+        used = []
+        for record in self.records:
+            path = urllib.parse.urlsplit(record['p']).path
+            account_id = path.rstrip('/').rsplit('/', 1)[-1]
+            if account_id not in created and account_id not in used and not account_id.lower() == 'users':
+                used.append(account_id)
+        listing_size = max([record.get('r', 0) for record in self.records] or [0])
+        return used, listing_size
+
+    def _seed(self, zivver_scim_connection):
+        used, listing_size = self._get_seed_accounts()
+
+        def create_seed_user(index):
+            return zivver_scim_connection.create_user_in_zivver(
+                first_name='Replay', last_name='User {}'.format(index),
+                user_name='replay-{}-{}@replay.invalid'.format(index, secrets.token_hex(4))
+            ).account_id
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            account_ids = list(executor.map(create_seed_user, range(max(len(used), listing_size))))
+        self._account_ids.update(zip(used, account_ids))
+
+    def _get_url(self, users_url, record):
+        """
+        :return: The url on the replay server of the recorded path, with the recorded account ids mapped
+        """
+        split_path = urllib.parse.urlsplit(record['p'])
+        path = split_path.path.rstrip('/')
+        account_id = path.rsplit('/', 1)[-1]
+        url = users_url
+        if account_id.lower() != 'users':
+            with self._lock:
+                account_id = self._account_ids.get(account_id, account_id)
+            url = '{}/{}'.format(users_url.rstrip('/'), urllib.parse.quote(account_id))
+
+        query = []
+        for key, value in urllib.parse.parse_qsl(split_path.query, keep_blank_values=True):
+            if key == 'filter':
+                with self._lock:
+                    value = _QUOTED_PATTERN.sub(
+                        lambda match: '"{}"'.format(self._account_ids.get(match.group(1), match.group(1))), value)
+            query.append((key, value))
+        return '{}?{}'.format(url, urllib.parse.urlencode(query)) if query else url
+
+    def _replay_record(self, oauth_connection, traffic_recorder, users_url, record):
+        """
+        :return: The record of the replayed request
+        """
+        url = self._get_url(users_url, record)
+        try:
+            result = oauth_connection._send_request(record['m'], url, record.get('b'))
+        except Exception as exception:
+            return {'e': exception.__class__.__name__, 'l': None}
+
+        replay_record = traffic_recorder.get_last_record()
+        if record['m'] == 'POST' and 'i' in record and isinstance(result, dict) and result.get('id'):
+            with self._lock:
+                self._account_ids[record['i']] = result['id']
+        return replay_record
+
+    def run(self):
+        """
+        Replay the records
+        :return: ReplayReport() object
+        """
+        from .scim_connection_crud import ZivverSCIMConnection
+        from .stand_in import StandInProcess
+
+        stand_in_process = None
+        server_url = self.server_url
+        if server_url is None:
+            stand_in_process = StandInProcess(response_delay=self.response_delay).start()
+            server_url = stand_in_process.users_url
+
+        traffic_recorder = TrafficRecorder(capture_bodies=False)
+        zivver_scim_connection = ZivverSCIMConnection(
+            external_oauth_token_value='replay', scim_api_create_url=server_url, scim_api_update_url=server_url,
+            scim_api_get_url=server_url, scim_api_delete_url=server_url, timeout=self.timeout,
+            max_connections=self.concurrency, **self.connection_options
+        )
+        try:
+            self._seed(zivver_scim_connection)
+            zivver_scim_connection.traffic_recorder = traffic_recorder
+            oauth_connection = zivver_scim_connection._get_oauth_connection()
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                first_offset = self.records[0]['t'] if self.records else 0.0
+                start = time.perf_counter()
+                futures = []
+                for record in self.records:
+                    if self.speed is not None:
+                        delay = start + (record['t'] - first_offset) / self.speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    futures.append(executor.submit(self._replay_record, oauth_connection, traffic_recorder,
+                                                   server_url, record))
+                replay_records = [future.result() for future in futures]
+                duration = time.perf_counter() - start
+        finally:
+            zivver_scim_connection.close()
+            if stand_in_process is not None:
+                stand_in_process.stop()
+
+        latencies = []
+        status_counts = collections.Counter()
+        status_mismatches = 0
+        errors = collections.Counter()
+        for record, replay_record in zip(self.records, replay_records):
+            if replay_record.get('e'):
+                errors[replay_record['e']] += 1
+            if replay_record.get('l') is not None:
+                latencies.append(replay_record['l'])
+            if replay_record.get('s') is not None:
+                status_counts[replay_record['s']] += 1
+            if replay_record.get('s') != record.get('s'):
+                status_mismatches += 1
+
+        recorded_latencies = [record['l'] for record in self.records if record.get('l') is not None]
+        return ReplayReport(speed=self.speed, concurrency=self.concurrency, duration=duration, latencies=latencies,
+                            status_counts=dict(status_counts), status_mismatches=status_mismatches,
+                            errors=dict(errors), recorded_latencies=recorded_latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay traffic recorded with TrafficRecorder against a local stand-in server'
+    )
+    parser.add_argument('traffic_file', help='File written by TrafficRecorder (.jsonl or .jsonl.gz)')
+    parser.add_argument('--speed', default='1', help='1 for the recorded pace, N for N times faster, or max')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Requests in flight, defaults to the highest concurrency of the recording')
+    parser.add_argument('--server-url', default=None, help='Replay against this users url instead of a stand-in')
+    parser.add_argument('--response-delay', type=float, default=0.0, help='Seconds the stand-in waits per response')
+    parser.add_argument('--transport', default='requests', choices=['requests', 'urllib3', 'http2'])
+    parser.add_argument('--report', help='Write the report as json to this file')
+    args = parser.parse_args(argv)
+
+    _, records = load_traffic(args.traffic_file)
+    traffic_replayer = TrafficReplayer(records, speed=None if args.speed == 'max' else float(args.speed),
+                                       concurrency=args.concurrency, server_url=args.server_url,
+                                       response_delay=args.response_delay,
+                                       connection_options={'transport': args.transport})
+    replay_report = traffic_replayer.run()
+
+    print(replay_report.summary())
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(replay_report.to_dict(), report_file, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import http
+import json
+import urllib.parse
+
+from .compression import available_encodings, decompress
+
+# requests and urllib3 are imported when a transport that needs them is created,
+# so a short-lived process only pays for the HTTP library it uses
+
+
+class Transport:
+    """
+    The interface OauthConnection uses to send the requests, every transport has:
+
+    - request(method, url, headers=None, data=None, timeout=None) that returns a response with status_code, reason,
+      headers, content, text and json(). Compressed response bodies are already decompressed.
+    - close() to close the pooled connections.
+    - optionally decodable_encodings(), the content encodings it decodes, None (or no method) for those of urllib3.
+
+    requests.Session(), RequestsTransport(), Urllib3Transport(), Http2Client() and InProcessTransport() all follow it.
+    """
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def decodable_encodings(self):
+        """
+        :return: List of the content encodings the responses are decoded from, None for those of urllib3
+        """
+        return None
+
+
+class TransportResponse:
+    """
+    Gives the response of the urllib3 and in-process transports the attributes of the requests response that the
+    library uses
+    """
+
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class RequestsTransport(Transport):
+    """
+    requests.Session() with a connection pool of max_connections connections, the default transport
+    """
+
+    def __init__(self, max_connections=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        """
+        :return: requests.Response() object
+        """
+        return self.session.request(method, url, headers=headers, data=data, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+
+class Urllib3Transport(Transport):
+    """
+    Sends the requests with urllib3 directly, without the hooks, cookies and environment lookups of requests.
+    Less overhead per request for the hot paths (bulk listing, upserts), same connection pooling.
+    """
+
+    def __init__(self, max_connections=10, timeout=None, verify=True):
+        import urllib3
+
+        self.timeout = timeout
+        self._default_timeout = urllib3.Timeout.DEFAULT_TIMEOUT
+        self.pool_manager = urllib3.PoolManager(
+            maxsize=max_connections,
+            cert_reqs='CERT_REQUIRED' if verify else 'CERT_NONE',
+            retries=False
+        )
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        """
+        Same signature as requests.request() for the arguments that OauthConnection uses
+        :return: TransportResponse() object
+        """
+        if timeout is None:
+            timeout = self.timeout
+        response = self.pool_manager.request(
+            method, url, body=data, headers=headers,
+            timeout=timeout if timeout is not None else self._default_timeout,
+            redirect=False, preload_content=True, decode_content=True
+        )
+        return TransportResponse(response.status, response.reason, response.headers, response.data)
+
+    def close(self):
+        self.pool_manager.clear()
+
+
+class InProcessTransport(Transport):
+    """
+    Routes the requests straight to the handle() of a ScimStandIn in the same process, without sockets.
+    For fast, deterministic tests and to benchmark the overhead of the client itself:
+
+        transport = InProcessTransport(ScimStandIn())
+        ZivverSCIMConnection(..., scim_api_get_url=transport.users_url, http_client=transport)
+    """
+
+    def __init__(self, stand_in=None, base_url='http://zivver.stand-in'):
+        if stand_in is None:
+            from .stand_in import ScimStandIn
+            stand_in = ScimStandIn()
+        self.stand_in = stand_in
+        self.base_url = base_url
+
+    @property
+    def users_url(self):
+        return '{}{}'.format(self.base_url, self.stand_in.base_path)
+
+    @property
+    def token_url(self):
+        return '{}{}'.format(self.base_url, self.stand_in.token_path)
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        """
+        :return: TransportResponse() object
+        """
+        split_url = urllib.parse.urlsplit(url)
+        path = '{}?{}'.format(split_url.path, split_url.query) if split_url.query else split_url.path
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        status_code, response_headers, content = self.stand_in.handle(method, path, headers or {}, data or b'')
+        content = decompress(content, response_headers.get('Content-Encoding', ''))
+        try:
+            reason = http.HTTPStatus(status_code).phrase
+        except ValueError:
+            reason = ''
+        return TransportResponse(status_code, reason, response_headers, content)
+
+    def decodable_encodings(self):
+        """
+        :return: The responses are decoded with zivverscim.compression, all installed encodings
+        """
+        return available_encodings()
@@ -0,0 +1,134 @@
+import collections
+import re
+
+# Pragmatic check, Zivver does the full validation: one @, no spaces, a dot in the domain
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s.]+$')
+
+# The arguments of ZivverSCIMConnection.create_user_in_zivver()
+USER_FIELDS = ('first_name', 'last_name', 'nick_name', 'user_name', 'zivver_account_key', 'sso_connection',
+               'is_active', 'aliases', 'delegates')
+
+
+class InvalidUser:
+    """
+    User of the batch that did not pass the validation
+    """
+
+    def __init__(self, index, user_fields, errors):
+        # Position in the batch that was validated
+        self.index = index
+        self.user_fields = user_fields
+        self.errors = errors
+
+    def __repr__(self):
+        return '<InvalidUser {} {}>'.format(self.index, self.errors)
+
+
+class ValidationResult:
+    """
+    Result of validate_users(), the valid users can be passed to upsert_users() as they are
+    """
+
+    def __init__(self, valid, valid_indexes, invalid):
+        # List of the user dicts that passed, in the order of the batch
+        self.valid = valid
+        # Position in the batch of every valid user
+        self.valid_indexes = valid_indexes
+        # List(InvalidUser())
+        self.invalid = invalid
+
+    def is_valid(self):
+        """
+        :return: True when all users passed
+        """
+        return not self.invalid
+
+    def __repr__(self):
+        return '<ValidationResult {} valid, {} invalid>'.format(len(self.valid), len(self.invalid))
+
+
+def _address_list(user_fields, field_name, errors):
+    """
+    :return: The aliases or delegates as list, adds an error when it is not a list
+    """
+    addresses = user_fields.get(field_name) or []
+    if isinstance(addresses, str) or not isinstance(addresses, (list, tuple, set)):
+        errors.append('Field {} must be a list'.format(field_name))
+        return []
+    return list(addresses)
+
+
+def validate_users(users):
+    """
+    Validates a whole batch of users in one pass, before anything is sent to Zivver:
+    required fields, e-mail syntax of userName, aliases and delegates, zivver_account_key with sso_connection,
+    userNames and aliases that occur more than once in the batch, and users that delegate to themselves.
+    All users that share a duplicate userName or alias are invalid, because it is unclear which one is meant.
+    :param users: List of dicts with the create_user_in_zivver() arguments
+    :return: ValidationResult() object
+    """
+    users = list(users)
+    errors_per_user = []
+    # Lowercased userNames and aliases of every user, to find the duplicates within the batch
+    addresses_per_user = []
+    address_counts = collections.Counter()
+
+    for user_fields in users:
+        errors = []
+        addresses = []
+        errors_per_user.append(errors)
+        addresses_per_user.append(addresses)
+
+        if not isinstance(user_fields, dict):
+            errors.append('User must be a dict')
+            continue
+
+        unknown_fields = [field_name for field_name in user_fields if field_name not in USER_FIELDS]
+        if unknown_fields:
+            errors.append('Unknown field: {}'.format(', '.join(sorted(unknown_fields))))
+
+        user_name = user_fields.get('user_name')
+        if not user_fields.get('last_name'):
+            errors.append('Missing field: last_name')
+        if not user_name:
+            errors.append('Missing field: user_name')
+        elif not isinstance(user_name, str) or not EMAIL_PATTERN.match(user_name):
+            errors.append('Invalid e-mail address in user_name: {}'.format(user_name))
+        else:
+            addresses.append(user_name.lower())
+
+        if user_fields.get('sso_connection') and not user_fields.get('zivver_account_key'):
+            errors.append('Missing field: zivver_account_key')
+
+        for alias in _address_list(user_fields, 'aliases', errors):
+            if not isinstance(alias, str) or not EMAIL_PATTERN.match(alias):
+                errors.append('Invalid e-mail address in aliases: {}'.format(alias))
+            elif alias.lower() in addresses:
+                errors.append('Alias is the same as the user_name or another alias: {}'.format(alias))
+            else:
+                addresses.append(alias.lower())
+
+        for delegate in _address_list(user_fields, 'delegates', errors):
+            if not isinstance(delegate, str) or not EMAIL_PATTERN.match(delegate):
+                errors.append('Invalid e-mail address in delegates: {}'.format(delegate))
+            elif delegate.lower() in addresses:
+                errors.append('User delegates to itself: {}'.format(delegate))
+
+        address_counts.update(addresses)
+
+    valid = []
+    valid_indexes = []
+    invalid = []
+    for index, user_fields in enumerate(users):
+        errors = errors_per_user[index]
+        for address in addresses_per_user[index]:
+            if address_counts[address] > 1:
+                errors.append('Duplicate user_name or alias in the batch: {}'.format(address))
+
+        if errors:
+            invalid.append(InvalidUser(index, user_fields, errors))
+        else:
+            valid.append(user_fields)
+            valid_indexes.append(index)
+
+    return ValidationResult(valid, valid_indexes, invalid)
@@ -1,10 +1,116 @@
 import json
 
+SCIM_CORE_USER_SCHEMA = 'urn:ietf:params:scim:schemas:core:2.0:User'
+SCIM_ENTERPRISE_USER_SCHEMA = 'urn:ietf:params:scim:schemas:extension:enterprise:2.0:User'
+SCIM_ZIVVER_USER_SCHEMA = 'urn:ietf:params:scim:schemas:zivver:0.1:User'
 
-def get_zivver_user_object(zivver_scim):
+# The schemas of the create/update payload, the same for every user. A tuple, so every payload can share it
+SCIM_USER_SCHEMAS = (SCIM_CORE_USER_SCHEMA, SCIM_ENTERPRISE_USER_SCHEMA, SCIM_ZIVVER_USER_SCHEMA)
+
+# ZivverUser field -> SCIM attribute path, used for the attributes/excludedAttributes projection
+ZIVVER_USER_SCIM_ATTRIBUTES = {
+    'account_id': 'id',
+    'name_formatted': 'name.formatted',
+    'meta_created_at': 'meta.created',
+    'meta_last_modified': 'meta.lastModified',
+    'meta_location': 'meta.location',
+    'meta_resource_type': 'meta.resourceType',
+    'phone_numbers': 'phoneNumbers',
+    'user_name': 'userName',
+    'nick_name': 'nickName',
+    'is_active': 'active',
+    'schemas': 'schemas',
+    'enterprise_user': SCIM_ENTERPRISE_USER_SCHEMA,
+    'zivver_scim_user_aliases': '{}:aliases'.format(SCIM_ZIVVER_USER_SCHEMA),
+    'zivver_scim_user_delegates': '{}:delegates'.format(SCIM_ZIVVER_USER_SCHEMA),
+}
+
+# Always returned by SCIM, whatever the projection is
+SCIM_ALWAYS_RETURNED_ATTRIBUTES = ('id', 'schemas')
+
+
+class _NotLoaded:
+    """
+    Value of the ZivverUser fields that were left out with attributes/excludedAttributes
+    """
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return '<not loaded>'
+
+    def __reduce__(self):
+        # Unpickled (e.g. in the processes of a ShardedSync) as the same NOT_LOADED object, so `is NOT_LOADED` holds
+        return 'NOT_LOADED'
+
+
+NOT_LOADED = _NotLoaded()
+
+
+def _is_sub_attribute(attribute, parent):
+    """
+    :return: True if attribute is the parent itself or one of its (extension) sub-attributes
+    """
+    return attribute == parent or attribute.startswith(parent + '.') or attribute.startswith(parent + ':')
+
+
+def get_unloaded_fields(attributes=None, excluded_attributes=None):
+    """
+    Returns the ZivverUser fields that are not returned by Zivver with this projection
+    :param attributes: List of SCIM attributes that were asked for
+    :param excluded_attributes: List of SCIM attributes that were left out
+    :return: set() of field names
+    """
+    unloaded_fields = set()
+    attributes = [attribute.lower() for attribute in attributes or []]
+    excluded_attributes = [attribute.lower() for attribute in excluded_attributes or []]
+
+    for field_name, scim_attribute in ZIVVER_USER_SCIM_ATTRIBUTES.items():
+        scim_attribute = scim_attribute.lower()
+        if scim_attribute in SCIM_ALWAYS_RETURNED_ATTRIBUTES:
+            continue
+        if attributes and not any(_is_sub_attribute(scim_attribute, attribute) or
+                                  _is_sub_attribute(attribute, scim_attribute) for attribute in attributes):
+            unloaded_fields.add(field_name)
+        if any(_is_sub_attribute(scim_attribute, attribute) for attribute in excluded_attributes):
+            unloaded_fields.add(field_name)
+
+    return unloaded_fields
+
+
+def get_scim_user_object(first_name, last_name, nick_name, user_name, zivver_account_key, is_active, aliases,
+                         delegates, account_id=None):
+    """
+    Builds the SCIM payload of a create (or with account_id, an update) of a user
+    :return: SCIM dict, the schemas tuple is shared with the other payloads, the meta is its own
+    """
+    scim_object_user = {
+        'schemas': SCIM_USER_SCHEMAS,
+        'meta': {'resourceType': 'User'},
+        'active': is_active,
+        'name': {
+            'formatted': '{} {}'.format(first_name or '', last_name)
+        },
+        'nickName': nick_name,
+        SCIM_ZIVVER_USER_SCHEMA: {
+            'SsoAccountKey': zivver_account_key,
+            'aliases': aliases,
+            'delegates': delegates
+        },
+        'userName': user_name
+    }
+    if account_id is not None:
+        scim_object_user['meta']['location'] = '/scim/v2/Users/{}'.format(account_id)
+        scim_object_user['id'] = account_id
+    return scim_object_user
+
+
+def get_zivver_user_object(zivver_scim, unloaded_fields=None):
     """
     Wrapper to wrap Zivver SCIM to Zivver Python Class
     :param zivver_scim: Returned from the Zivver response, contains the object on create/update
+    :param unloaded_fields: Fields that were not asked for (see get_unloaded_fields()), these are set to NOT_LOADED
     :return: Zivver()
     """    
     account_id = zivver_scim.get('id', '')
@@ -15,10 +121,12 @@ def get_zivver_user_object(zivver_scim):
 
     meta = zivver_scim.get('meta', '')
     meta_created_at = ''
+    meta_last_modified = ''
     meta_location = ''
     meta_resource_type = ''
     if meta:
         meta_created_at = meta.get('created', '')
+        meta_last_modified = meta.get('lastModified', '')
         meta_location = meta.get('location', '')
         meta_resource_type = meta.get('resourceType', '')
         
@@ -43,7 +151,8 @@ def get_zivver_user_object(zivver_scim):
                       phone_numbers=phone_numbers, user_name=user_name, nick_name=nick_name, is_active=is_active,
                       schemas=schemas, enterprise_user=enterprise_user,
                       zivver_scim_user_aliases=zivver_scim_user_aliases,
-                      zivver_scim_user_delegates=zivver_scim_user_delegates)
+                      zivver_scim_user_delegates=zivver_scim_user_delegates, meta_last_modified=meta_last_modified,
+                      unloaded_fields=unloaded_fields)
 
 
 class ZivverUser:
@@ -53,7 +162,8 @@ class ZivverUser:
 
     def __init__(self, account_id=None, name_formatted=None, meta_created_at=None, meta_location=None,
                  meta_resource_type=None, phone_numbers=None, user_name=None, nick_name=None, is_active=False,
-                 schemas=None, enterprise_user=None, zivver_scim_user_aliases=None, zivver_scim_user_delegates=None):
+                 schemas=None, enterprise_user=None, zivver_scim_user_aliases=None, zivver_scim_user_delegates=None,
+                 meta_last_modified=None, unloaded_fields=None):
         self.account_id = account_id
         self.name_formatted = name_formatted
         self.meta_created_at = meta_created_at
@@ -67,12 +177,27 @@ class ZivverUser:
         self.enterprise_user = enterprise_user
         self.zivver_scim_user_aliases = zivver_scim_user_aliases
         self.zivver_scim_user_delegates = zivver_scim_user_delegates
+        self.meta_last_modified = meta_last_modified
+
+        # Fields that were not fetched from Zivver (attributes/excludedAttributes) are set to NOT_LOADED
+        self.unloaded_fields = frozenset(unloaded_fields or ())
+        for field_name in self.unloaded_fields:
+            setattr(self, field_name, NOT_LOADED)
+
+    def is_loaded(self, field_name):
+        """
+        :return: False when the field was left out of the request to Zivver
+        """
+        return field_name not in self.unloaded_fields
 
     def __str__(self):
         """
-        Representation of the SCIM user response in JSON
+        Representation of the SCIM user response in JSON, fields that are not loaded are left out
         :return: SCIM Response json object
         """
+        if self.unloaded_fields:
+            return json.dumps(self._get_loaded_scim_object(), indent=4)
+
         return json.dumps(
             {
                 'id': self.account_id,
@@ -81,6 +206,7 @@ class ZivverUser:
                 },
                 'meta': {
                     'created': self.meta_created_at,
+                    'lastModified': self.meta_last_modified,
                     'location': self.meta_location,
                     'resourceType': self.meta_resource_type
                 },
@@ -96,3 +222,60 @@ class ZivverUser:
                 }
             }, indent=4
         )
+
+    def _get_loaded_scim_object(self):
+        """
+        :return: SCIM dict of the loaded fields only
+        """
+        scim_object = {}
+        for field_name, scim_attribute in ZIVVER_USER_SCIM_ATTRIBUTES.items():
+            if not self.is_loaded(field_name):
+                continue
+
+            value = getattr(self, field_name)
+            if scim_attribute.startswith(SCIM_ZIVVER_USER_SCHEMA + ':'):
+                scim_object.setdefault(SCIM_ZIVVER_USER_SCHEMA, {})[scim_attribute.rsplit(':', 1)[1]] = value
+            elif '.' in scim_attribute and not scim_attribute.startswith('urn:'):
+                parent, sub_attribute = scim_attribute.split('.', 1)
+                scim_object.setdefault(parent, {})[sub_attribute] = value
+            else:
+                scim_object[scim_attribute] = value
+        return scim_object
+
+
+class UpsertResult:
+    """
+    Result of ZivverSCIMConnection.upsert_user(), tells which path was taken
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    UNCHANGED = 'unchanged'
+    FAILED = 'failed'
+
+    def __init__(self, action, user_name=None, zivver_user=None, conflict=False, error=None):
+        self.action = action
+        self.user_name = user_name
+        self.zivver_user = zivver_user
+        # True when the create failed because the user already existed and the user was updated instead
+        self.conflict = conflict
+        self.error = error
+
+    def __repr__(self):
+        return '<UpsertResult {} {}>'.format(self.action, self.user_name)
+
+
+class UserChange:
+    """
+    Change found by the ZivverChangePoller
+    """
+    CHANGED = 'changed'
+    DELETED = 'deleted'
+
+    def __init__(self, kind, account_id, zivver_user=None):
+        self.kind = kind
+        self.account_id = account_id
+        # None for deleted users
+        self.zivver_user = zivver_user
+
+    def __repr__(self):
+        return '<UserChange {} {}>'.format(self.kind, self.account_id)
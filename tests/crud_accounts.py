@@ -72,11 +72,10 @@ class TestCRUDAccounts(unittest.TestCase):
             created_zivver_account_ids[account_to_create_email] = zivver_user_object.account_id
 
         # 3. Check if there are 200 accounts created.
+        zivver_existing_users = self.zivver_scim_connection.get_users_by_ids(created_zivver_account_ids.values())
         for index in range(account_index, account_max_index):
             account_to_create_email = '{}-{}@{}'.format(index, 'john.doe', ZivverConfig.zivver_test_domain)
-            zivver_existing_user = self.zivver_scim_connection.get_user_from_zivver(
-                account_id=created_zivver_account_ids[account_to_create_email]
-            )
+            zivver_existing_user = zivver_existing_users[created_zivver_account_ids[account_to_create_email]]
             self.assertEqual(zivver_existing_user.account_id, created_zivver_account_ids[account_to_create_email])
 
         # 4. Remove all 200 accounts.
@@ -0,0 +1,24 @@
+from zivverscim import scim_connection_crud
+
+
+def get_stand_in_connection_options(users_url, external_oauth_token_value='token', **kwargs):
+    """
+    :param users_url: The users url of a StandInServer or InProcessTransport, used for all four SCIM urls
+    :return: dict with the ZivverSCIMConnection() arguments, e.g. for ShardedSync or the connection registry
+    """
+    return dict(
+        external_oauth_token_value=external_oauth_token_value,
+        scim_api_create_url=users_url,
+        scim_api_update_url=users_url,
+        scim_api_get_url=users_url,
+        scim_api_delete_url=users_url,
+        **kwargs
+    )
+
+
+def create_stand_in_connection(users_url, **kwargs):
+    """
+    :param kwargs: Extra ZivverSCIMConnection() arguments, e.g. http_client or transport
+    :return: ZivverSCIMConnection() object that talks to the stand-in
+    """
+    return scim_connection_crud.ZivverSCIMConnection(**get_stand_in_connection_options(users_url, **kwargs))
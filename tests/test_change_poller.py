@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from zivverscim.change_poller import ZivverChangePoller
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.wrapper import UserChange
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestChangePoller(unittest.TestCase):
+
+    def _start(self, filter_supported=True):
+        self.stand_in = ScimStandIn(filter_supported=filter_supported)
+        self.server = StandInServer(self.stand_in).start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+        self.addCleanup(self.server.stop)
+        self.addCleanup(self.zivver_scim_connection.close)
+
+    def _poll_and_make_changes(self, state_path):
+        john = self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+        jane = self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='jane@doe.com')
+
+        zivver_change_poller = ZivverChangePoller.load(self.zivver_scim_connection, state_path)
+        changes = list(zivver_change_poller.poll())
+        self.assertEqual(len(changes), 2)
+        zivver_change_poller.save(state_path)
+
+        # Nothing changed
+        zivver_change_poller = ZivverChangePoller.load(self.zivver_scim_connection, state_path)
+        self.assertEqual(list(zivver_change_poller.poll()), [])
+
+        self.zivver_scim_connection.update_user_in_zivver(account_id=john.account_id, last_name='Doe',
+                                                          user_name='john@doe.com', is_active=True)
+        self.zivver_scim_connection.delete_user_from_zivver(account_id=jane.account_id)
+
+        changes = list(zivver_change_poller.poll())
+        self.assertEqual([(change.kind, change.account_id) for change in changes],
+                         [(UserChange.CHANGED, john.account_id), (UserChange.DELETED, jane.account_id)])
+        self.assertTrue(changes[0].zivver_user.is_active)
+        return zivver_change_poller
+
+    def test_poll_with_last_modified_filter(self):
+        self._start()
+        with tempfile.TemporaryDirectory() as directory:
+            zivver_change_poller = self._poll_and_make_changes(os.path.join(directory, 'state.json'))
+
+        self.assertEqual(zivver_change_poller.mode, ZivverChangePoller.MODE_FILTER)
+
+    def test_fallback_to_full_scan(self):
+        self._start(filter_supported=False)
+        with tempfile.TemporaryDirectory() as directory:
+            zivver_change_poller = self._poll_and_make_changes(os.path.join(directory, 'state.json'))
+
+        self.assertEqual(zivver_change_poller.mode, ZivverChangePoller.MODE_FULL_SCAN)
+
+    def test_changes_with_the_same_timestamp(self):
+        self._start()
+        john = self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+        zivver_change_poller = ZivverChangePoller(self.zivver_scim_connection)
+        self.assertEqual(len(list(zivver_change_poller.poll())), 1)
+        self.assertEqual(zivver_change_poller.watermark, john.meta_last_modified)
+
+        # Jane changed after the poll, but in the same timestamp as the watermark
+        jane = self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='jane@doe.com')
+        self.stand_in.users[jane.account_id]['meta']['lastModified'] = john.meta_last_modified
+
+        changes = list(zivver_change_poller.poll())
+        self.assertEqual([(change.kind, change.account_id) for change in changes],
+                         [(UserChange.CHANGED, jane.account_id)])
+        self.assertEqual(zivver_change_poller.mode, ZivverChangePoller.MODE_FILTER)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import unittest
+
+from zivverscim import scim_connection_crud
+from zivverscim.stand_in import StandInServer
+
+from tests.helpers import get_stand_in_connection_options
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_import_does_not_load_the_http_libraries(self):
+        loaded_modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, zivverscim.scim_connection_crud; '
+            'print(",".join(module for module in ("requests", "urllib3", "httpx", "asyncio", "cProfile") '
+            'if module in sys.modules))'
+        ]).decode('utf-8').strip()
+
+        self.assertEqual(loaded_modules, '')
+
+    def test_registry_reuses_the_connection(self):
+        self.addCleanup(scim_connection_crud.close_zivver_scim_connections)
+        with StandInServer(response_delay=0.05) as server:
+            kwargs = get_stand_in_connection_options(server.users_url)
+
+            zivver_scim_connection = scim_connection_crud.get_zivver_scim_connection(tenant='acme', warm_up=3,
+                                                                                     **kwargs)
+            self.assertEqual(server.connection_count, 3)
+
+            # Warm invocation: same object, the warm connections are reused
+            self.assertIs(scim_connection_crud.get_zivver_scim_connection(tenant='acme', **kwargs),
+                          zivver_scim_connection)
+            zivver_scim_connection.get_all_users_from_zivver()
+            self.assertEqual(server.connection_count, 3)
+
+            # The API key of the tenant was rotated
+            kwargs['external_oauth_token_value'] = 'new-token'
+            self.assertIsNot(scim_connection_crud.get_zivver_scim_connection(tenant='acme', **kwargs),
+                             zivver_scim_connection)
+            self.assertIsNone(zivver_scim_connection.http_client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from zivverscim.columnar import build_scim_users, iter_user_rows
+from zivverscim.exceptions import ZivverMissingRequiredFields
+from zivverscim.transport import InProcessTransport
+from zivverscim.wrapper import SCIM_ZIVVER_USER_SCHEMA, UpsertResult, get_scim_user_object
+
+from tests.helpers import create_stand_in_connection
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        transport = InProcessTransport()
+        self.zivver_scim_connection = create_stand_in_connection(transport.users_url, http_client=transport)
+        self.columns = {
+            'first_name': ['John', 'Jane', float('nan')],
+            'last_name': ['Doe', 'Roe', 'Poe'],
+            'user_name': ['john@example.com', 'jane@example.com', 'edgar@example.com'],
+            'aliases': [['j.doe@example.com'], None, []],
+            'is_active': [True, True, False]
+        }
+
+    def test_build_scim_users(self):
+        scim_users = build_scim_users(self.columns)
+
+        self.assertEqual(scim_users[0], get_scim_user_object('John', 'Doe', None, 'john@example.com', None, True,
+                                                             ['j.doe@example.com'], []))
+        # Empty cells (None or the NaN of pandas) get the defaults
+        self.assertEqual(scim_users[1][SCIM_ZIVVER_USER_SCHEMA]['aliases'], [])
+        self.assertEqual(scim_users[2]['name']['formatted'], ' Poe')
+        # The schemas are one shared tuple, every payload has its own meta
+        self.assertIs(scim_users[0]['schemas'], scim_users[2]['schemas'])
+        self.assertIsInstance(scim_users[0]['schemas'], tuple)
+        self.assertIsNot(scim_users[0]['meta'], scim_users[2]['meta'])
+
+        scim_users = build_scim_users(self.columns, account_ids=['id-1', 'id-2', 'id-3'])
+        self.assertEqual(scim_users[1]['id'], 'id-2')
+        self.assertEqual(scim_users[1]['meta']['location'], '/scim/v2/Users/id-2')
+
+    def test_invalid_columns(self):
+        with self.assertRaises(ValueError):
+            list(iter_user_rows({'last_name': ['Doe'], 'user_name': []}))
+        with self.assertRaises(ValueError):
+            list(iter_user_rows({'last_name': ['Doe'], 'email': ['john@example.com']}))
+        with self.assertRaises(TypeError):
+            list(iter_user_rows([{'last_name': 'Doe'}]))
+
+    def test_create_users_from_columns(self):
+        self.columns['last_name'][2] = None
+        upsert_results = self.zivver_scim_connection.create_users_from_columns(self.columns, max_workers=2)
+
+        self.assertEqual([upsert_result.action for upsert_result in upsert_results],
+                         [UpsertResult.CREATED, UpsertResult.CREATED, UpsertResult.FAILED])
+        self.assertEqual(upsert_results[0].zivver_user.zivver_scim_user_aliases, ['j.doe@example.com'])
+        self.assertIsInstance(upsert_results[2].error, ZivverMissingRequiredFields)
+
+    def test_get_all_users_as_columns(self):
+        self.zivver_scim_connection.create_users_from_columns(self.columns)
+        zivver_users = self.zivver_scim_connection.get_all_users_from_zivver()
+
+        columns = self.zivver_scim_connection.get_all_users_as_columns(page_size=2)
+        self.assertEqual(len(columns['account_id']), 3)
+        for field_name, values in columns.items():
+            self.assertEqual(values, [getattr(zivver_user, field_name) for zivver_user in zivver_users])
+
+        columns = self.zivver_scim_connection.get_all_users_as_columns(attributes=['userName'])
+        self.assertEqual(sorted(columns), ['account_id', 'schemas', 'user_name'])
+        self.assertEqual(columns['user_name'], ['john@example.com', 'jane@example.com', 'edgar@example.com'])
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_arrow_output(self):
+        self.zivver_scim_connection.create_users_from_columns(pyarrow.Table.from_pydict(self.columns))
+        table = self.zivver_scim_connection.get_all_users_as_columns(attributes=['userName'], output='arrow')
+        self.assertEqual(table.num_rows, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import unittest
+
+from zivverscim.compression import accept_encoding_header, available_encodings, compress, decompress
+from zivverscim.stand_in import ScimStandIn, StandInServer
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.stand_in = ScimStandIn(compression_threshold=256)
+        self.server = StandInServer(self.stand_in).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _create_connection(self, **kwargs):
+        return create_stand_in_connection(self.server.users_url, **kwargs)
+
+    def test_round_trip(self):
+        data = json.dumps({'userName': 'john@doe.com', 'aliases': ['john@doe.com'] * 100}).encode('utf-8')
+        for encoding in available_encodings():
+            self.assertEqual(decompress(compress(data, encoding), encoding), data)
+
+    def test_compressed_request_body(self):
+        aliases = ['{}-john@doe.com'.format(index) for index in range(100)]
+        with self._create_connection(compress_requests='gzip', compression_threshold=1024) as zivver_scim_connection:
+            zivver_user_object = zivver_scim_connection.create_user_in_zivver(last_name='Doe',
+                                                                              user_name='john@doe.com',
+                                                                              aliases=aliases)
+
+        self.assertEqual(zivver_user_object.zivver_scim_user_aliases, aliases)
+        self.assertLess(self.stand_in.bytes_received, len(json.dumps(aliases)))
+
+    def test_compressed_response_body(self):
+        with self._create_connection() as zivver_scim_connection:
+            for index in range(50):
+                zivver_scim_connection.create_user_in_zivver(last_name='Doe',
+                                                             user_name='{}-john@doe.com'.format(index))
+            compressed_bytes_sent = self.stand_in.bytes_sent
+            self.assertEqual(len(zivver_scim_connection.get_all_users_from_zivver()), 50)
+            compressed_bytes_sent = self.stand_in.bytes_sent - compressed_bytes_sent
+
+        with self._create_connection(accept_compressed_responses=False) as zivver_scim_connection:
+            identity_bytes_sent = self.stand_in.bytes_sent
+            self.assertEqual(len(zivver_scim_connection.get_all_users_from_zivver()), 50)
+            identity_bytes_sent = self.stand_in.bytes_sent - identity_bytes_sent
+
+        self.assertLess(compressed_bytes_sent * 5, identity_bytes_sent)
+
+    def test_only_decodable_encodings_are_accepted(self):
+        # zstd only when zstandard is installed, never an encoding the transport does not decode
+        expected_encodings = [encoding for encoding in available_encodings() if encoding in ('gzip', 'deflate', 'zstd')]
+        self.assertEqual(accept_encoding_header(['gzip', 'deflate', 'zstd']), ', '.join(expected_encodings))
+        self.assertEqual(accept_encoding_header(['gzip']), 'gzip')
+        self.assertTrue(set(accept_encoding_header().split(', ')).issubset(available_encodings()))
+        self.assertIn('gzip', accept_encoding_header())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from zivverscim.concurrency import AdaptiveConcurrencyLimiter
+from zivverscim.stand_in import StandInServer
+from zivverscim.wrapper import UpsertResult
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+
+    def test_additive_increase_multiplicative_decrease(self):
+        concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4, latency_tolerance=None)
+
+        # Rounds of healthy responses with all slots in use grow the limit by about one per round
+        rounds = 0
+        while concurrency_limiter.limit < 4:
+            limited_requests = [concurrency_limiter.acquire() for _ in range(concurrency_limiter.limit)]
+            for limited_request in limited_requests:
+                limited_request.status_code = 200
+                concurrency_limiter.release(limited_request)
+            rounds += 1
+        self.assertLessEqual(rounds, 4)
+
+        # Two 429 responses of the same overload halve the limit once
+        limited_requests = [concurrency_limiter.acquire() for _ in range(2)]
+        for limited_request in limited_requests:
+            limited_request.status_code = 429
+            concurrency_limiter.release(limited_request)
+        self.assertEqual(concurrency_limiter.limit, 2)
+        self.assertEqual(concurrency_limiter.get_stats()['throttled'], 2)
+        self.assertEqual(concurrency_limiter.decreases, 1)
+
+    def test_converges_on_server_capacity(self):
+        concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=32, latency_tolerance=None)
+        with StandInServer(response_delay=0.01, max_in_flight=4) as server:
+            with create_stand_in_connection(server.users_url, max_connections=16,
+                                            concurrency_limiter=concurrency_limiter) as zivver_scim_connection:
+                upsert_results = zivver_scim_connection.upsert_users(
+                    [{'last_name': 'Doe', 'user_name': '{}@doe.com'.format(index)} for index in range(300)],
+                    existing_users=[], max_workers=16
+                )
+
+        self.assertGreater(concurrency_limiter.increases, 0)
+        self.assertGreater(concurrency_limiter.decreases, 0)
+        self.assertLessEqual(concurrency_limiter.limit, 8)
+        # Only the requests that probed above the capacity were throttled
+        failed = [upsert_result for upsert_result in upsert_results if upsert_result.action == UpsertResult.FAILED]
+        self.assertLess(len(failed), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from zivverscim.exceptions import (ZivverConflictError, ZivverCRUDError, ZivverServerError, ZivverThrottledError,
+                                   ZivverTooManyRequests, ZivverUnknownAccountError, SCIM_ERROR_SCHEMA, classify_error,
+                                   is_error_body)
+from zivverscim.stand_in import FaultInjector, ScimStandIn, StandInServer
+from zivverscim.transport import InProcessTransport
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestErrors(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+
+    def tearDown(self):
+        self.zivver_scim_connection.close()
+        self.server.stop()
+
+    def test_unknown_account(self):
+        with self.assertRaises(ZivverUnknownAccountError) as context:
+            self.zivver_scim_connection.get_user_from_zivver('does-not-exist')
+
+        self.assertEqual(context.exception.status_code, 404)
+        self.assertFalse(context.exception.retryable)
+        self.assertIsNotNone(context.exception.get_sollution())
+        self.assertFalse(hasattr(context.exception, 'response'))
+
+    def test_conflict(self):
+        self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+        with self.assertRaises(ZivverConflictError):
+            self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+    def test_server_error_is_retryable(self):
+        with StandInServer(faults=FaultInjector(server_error_rate=1.0)) as server:
+            with create_stand_in_connection(server.users_url) as zivver_scim_connection:
+                with self.assertRaises(ZivverServerError) as context:
+                    zivver_scim_connection.get_all_users_from_zivver()
+
+        self.assertTrue(context.exception.retryable)
+        self.assertGreaterEqual(context.exception.status_code, 500)
+
+    def test_classify_throttled_dict(self):
+        zivver_crud_error = classify_error({'code': 429, 'detail': 'x' * 10000})
+
+        self.assertIsInstance(zivver_crud_error, ZivverThrottledError)
+        # Old code that catches ZivverTooManyRequests keeps working
+        self.assertIsInstance(zivver_crud_error, ZivverTooManyRequests)
+        self.assertIsInstance(zivver_crud_error, ZivverCRUDError)
+        self.assertTrue(zivver_crud_error.retryable)
+        self.assertLessEqual(len(zivver_crud_error.text), 2000)
+
+    def test_classify_scim_error_body(self):
+        zivver_crud_error = classify_error({
+            'schemas': ['urn:ietf:params:scim:api:messages:2.0:Error'],
+            'status': '400',
+            'scimType': 'invalidFilter',
+            'detail': 'Filtering is not supported'
+        })
+
+        self.assertEqual(zivver_crud_error.status_code, 400)
+        self.assertFalse(zivver_crud_error.retryable)
+        self.assertIsInstance(classify_error({'status': '503'}), ZivverServerError)
+
+    def test_scim_error_bodies_are_classified(self):
+        transport = InProcessTransport(ScimStandIn(scim_errors=True))
+        with create_stand_in_connection(transport.users_url, http_client=transport) as zivver_scim_connection:
+            zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+            with self.assertRaises(ZivverConflictError) as context:
+                zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+            self.assertEqual(context.exception.status_code, 409)
+            self.assertIn('uniqueness', context.exception.text)
+
+            with self.assertRaises(ZivverUnknownAccountError):
+                zivver_scim_connection.get_user_from_zivver('does-not-exist')
+
+            transport.stand_in.filter_supported = False
+            with self.assertRaises(ZivverCRUDError) as context:
+                zivver_scim_connection.get_all_users_from_zivver(scim_filter='userName eq "john@doe.com"')
+            self.assertEqual(context.exception.status_code, 400)
+
+    def test_is_error_body(self):
+        self.assertTrue(is_error_body({'schemas': [SCIM_ERROR_SCHEMA], 'status': '409'}))
+        self.assertTrue(is_error_body({'status': '404', 'detail': 'Unknown account'}))
+        self.assertFalse(is_error_body({'id': 'account-id', 'userName': 'john@doe.com'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from zivverscim.http2_connection import Http2Client, is_http2_available
+from zivverscim.stand_in import Http2StandInServer
+
+from tests.helpers import create_stand_in_connection
+
+
+@unittest.skipUnless(is_http2_available(), 'httpx[http2] is not installed')
+class TestHttp2(unittest.TestCase):
+
+    def test_crud_over_one_http2_connection(self):
+        with Http2StandInServer() as server:
+            zivver_scim_connection = create_stand_in_connection(
+                server.users_url, http_client=Http2Client(max_connections=1, http2_prior_knowledge=True))
+            with zivver_scim_connection:
+                zivver_user_object = zivver_scim_connection.create_user_in_zivver(last_name='Doe',
+                                                                                  user_name='john@doe.com')
+                zivver_user_object = zivver_scim_connection.update_user_in_zivver(
+                    account_id=zivver_user_object.account_id, last_name='Doe', user_name='jane@doe.com'
+                )
+                self.assertEqual(zivver_user_object.user_name, 'jane@doe.com')
+
+                zivver_scim_connection.delete_user_from_zivver(account_id=zivver_user_object.account_id)
+                self.assertEqual(len(zivver_scim_connection.get_all_users_from_zivver()), 0)
+
+            self.assertEqual(server.connection_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
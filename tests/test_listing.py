@@ -0,0 +1,98 @@
+import json
+import unittest
+
+from zivverscim.stand_in import ScimStandIn, StandInServer
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestListing(unittest.TestCase):
+
+    def setUp(self):
+        self.stand_in = ScimStandIn()
+        for index in range(230):
+            scim_user = {'userName': '{}-john.doe@doe.com'.format(index), 'name': {'formatted': 'John Doe'}}
+            self.stand_in.handle('POST', self.stand_in.base_path, {}, json.dumps(scim_user).encode('utf-8'))
+
+        self.server = StandInServer(self.stand_in, response_delay=0.01).start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+
+    def tearDown(self):
+        self.zivver_scim_connection.close()
+        self.server.stop()
+
+    def test_pages_in_order(self):
+        user_names = [zivver_user.user_name for zivver_user in
+                      self.zivver_scim_connection.get_all_users_from_zivver(page_size=50, parallel=True)]
+
+        self.assertEqual(user_names, ['{}-john.doe@doe.com'.format(index) for index in range(230)])
+
+    def test_sequential_and_as_completed(self):
+        sequential_user_names = {zivver_user.user_name for zivver_user in
+                                 self.zivver_scim_connection.iter_all_users_from_zivver(page_size=40)}
+        parallel_user_names = {zivver_user.user_name for zivver_user in
+                               self.zivver_scim_connection.iter_all_users_from_zivver(page_size=40, parallel=True,
+                                                                                      ordered=False)}
+
+        self.assertEqual(len(sequential_user_names), 230)
+        self.assertEqual(sequential_user_names, parallel_user_names)
+
+    def test_deletes_during_fetch_are_rechecked(self):
+        account_ids = []
+        # One worker, so the last pages are fetched after the delete
+        for zivver_user in self.zivver_scim_connection.iter_all_users_from_zivver(page_size=50, parallel=True,
+                                                                                  max_workers=1):
+            account_ids.append(zivver_user.account_id)
+            if len(account_ids) == 51:
+                # Shift the later pages to the left
+                for account_id in list(self.stand_in.users)[:20]:
+                    del self.stand_in.users[account_id]
+
+        self.assertTrue(set(self.stand_in.users).issubset(account_ids))
+        self.assertEqual(len(account_ids), len(set(account_ids)))
+
+    def test_get_users_by_ids(self):
+        account_ids = list(self.stand_in.users)[:120] + ['does-not-exist']
+        request_count = self.stand_in.request_count
+
+        zivver_users = self.zivver_scim_connection.get_users_by_ids(account_ids, max_url_length=1000)
+
+        self.assertEqual(list(zivver_users), account_ids)
+        self.assertIsNone(zivver_users['does-not-exist'])
+        for account_id in account_ids[:120]:
+            self.assertEqual(zivver_users[account_id].account_id, account_id)
+        # A few filtered listings instead of 121 GETs
+        self.assertLess(self.stand_in.request_count - request_count, 20)
+
+    def test_get_users_by_ids_without_filter_support(self):
+        self.stand_in.filter_supported = False
+        account_ids = list(self.stand_in.users)[:10] + ['does-not-exist']
+
+        zivver_users = self.zivver_scim_connection.get_users_by_ids(account_ids)
+
+        self.assertIsNone(zivver_users['does-not-exist'])
+        self.assertEqual([zivver_users[account_id].account_id for account_id in account_ids[:10]], account_ids[:10])
+
+    def test_server_caps_the_page_size(self):
+        self.stand_in.max_page_size = 50
+        user_names = ['{}-john.doe@doe.com'.format(index) for index in range(230)]
+
+        sequential_user_names = [zivver_user.user_name for zivver_user in
+                                 self.zivver_scim_connection.iter_all_users_from_zivver(page_size=100)]
+        parallel_user_names = [zivver_user.user_name for zivver_user in
+                               self.zivver_scim_connection.iter_all_users_from_zivver(page_size=100, parallel=True)]
+
+        self.assertEqual(sequential_user_names, user_names)
+        self.assertEqual(parallel_user_names, user_names)
+
+    def test_get_users_by_ids_with_capped_page_size(self):
+        self.stand_in.max_page_size = 50
+        account_ids = list(self.stand_in.users)[:120]
+
+        zivver_users = self.zivver_scim_connection.get_users_by_ids(account_ids, max_url_length=100000)
+
+        self.assertEqual([zivver_users[account_id].account_id for account_id in account_ids], account_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
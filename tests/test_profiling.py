@@ -0,0 +1,45 @@
+import unittest
+
+from zivverscim import profiling
+from zivverscim.stand_in import StandInServer
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+
+    def tearDown(self):
+        self.zivver_scim_connection.close()
+        self.server.stop()
+
+    def test_phases_per_operation(self):
+        with profiling.profile(cprofile_samples=1, tracemalloc_samples=1) as profiler:
+            for index in range(3):
+                self.zivver_scim_connection.create_user_in_zivver(last_name='Doe',
+                                                                  user_name='{}@doe.com'.format(index))
+            self.zivver_scim_connection.get_all_users_from_zivver(page_size=2)
+
+        self.assertIsNone(profiling.get_active_profiler())
+        summary = profiler.get_summary()
+
+        self.assertEqual(summary['create']['total']['count'], 3)
+        for phase in profiling.PHASES + [profiling.PHASE_OTHER]:
+            self.assertEqual(summary['create']['phases'][phase]['count'], 3)
+        self.assertEqual(summary['list_page']['total']['count'], 2)
+        self.assertNotIn(profiling.PHASE_BUILD, summary['list_page']['phases'])
+
+        report = profiler.format_report()
+        self.assertIn('cProfile of 1 sampled operations', report)
+        self.assertIn('tracemalloc of 1 sampled operations', report)
+
+    def test_off_by_default(self):
+        self.assertIsNone(profiling.get_active_profiler())
+        self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
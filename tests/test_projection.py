@@ -0,0 +1,53 @@
+import unittest
+
+from zivverscim.stand_in import StandInServer
+from zivverscim.wrapper import NOT_LOADED
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestAttributeProjection(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+        self.zivver_user_object = self.zivver_scim_connection.create_user_in_zivver(
+            last_name='Doe', user_name='john@doe.com', aliases=['j.doe@doe.com'], delegates=['jane@doe.com']
+        )
+
+    def tearDown(self):
+        self.zivver_scim_connection.close()
+        self.server.stop()
+
+    def test_attributes(self):
+        zivver_user_object = self.zivver_scim_connection.get_user_from_zivver(
+            account_id=self.zivver_user_object.account_id, attributes=['userName']
+        )
+
+        self.assertEqual(zivver_user_object.account_id, self.zivver_user_object.account_id)
+        self.assertEqual(zivver_user_object.user_name, 'john@doe.com')
+        self.assertFalse(zivver_user_object.is_loaded('zivver_scim_user_aliases'))
+        self.assertIs(zivver_user_object.zivver_scim_user_aliases, NOT_LOADED)
+        self.assertNotIn('nickName', str(zivver_user_object))
+
+    def test_excluded_attributes(self):
+        zivver_users_object = self.zivver_scim_connection.get_all_users_from_zivver(
+            excluded_attributes=['urn:ietf:params:scim:schemas:zivver:0.1:User:aliases', 'meta']
+        )
+
+        zivver_user_object = zivver_users_object[0]
+        self.assertIs(zivver_user_object.zivver_scim_user_aliases, NOT_LOADED)
+        self.assertIs(zivver_user_object.meta_created_at, NOT_LOADED)
+        self.assertEqual(zivver_user_object.zivver_scim_user_delegates, ['jane@doe.com'])
+
+    def test_full_record_has_no_unloaded_fields(self):
+        zivver_user_object = self.zivver_scim_connection.get_user_from_zivver(
+            account_id=self.zivver_user_object.account_id
+        )
+
+        self.assertEqual(zivver_user_object.unloaded_fields, frozenset())
+        self.assertEqual(zivver_user_object.zivver_scim_user_aliases, ['j.doe@doe.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import time
+import unittest
+
+from zivverscim.sharding import SharedRateBudget, ShardedSync, get_shard, partition_users
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.wrapper import NOT_LOADED, UpsertResult
+
+from tests.helpers import create_stand_in_connection, get_stand_in_connection_options
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_stable_shard(self):
+        self.assertEqual(get_shard('piet@example.com', 4), 3)
+        self.assertEqual(get_shard('Piet@Example.com', 4), 3)
+        self.assertEqual(get_shard(None, 4), 0)
+
+        users = [{'user_name': 'user{}@example.com'.format(index)} for index in range(100)]
+        partitions = partition_users(users, 3)
+        self.assertEqual(sorted(index for partition in partitions for index, _ in partition), list(range(100)))
+        self.assertTrue(all(partitions))
+
+    def test_shared_rate_budget(self):
+        rate_budget = SharedRateBudget(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            with rate_budget.request():
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+        with rate_budget.request() as limited_request:
+            limited_request.status_code = 429
+        self.assertEqual(rate_budget.throttled, 1)
+
+    def test_sharded_upsert(self):
+        stand_in = ScimStandIn()
+        users = [{'first_name': 'John', 'last_name': 'Doe {}'.format(index),
+                  'user_name': 'john{}@example.com'.format(index)} for index in range(30)]
+        users.append({'last_name': 'Doe', 'user_name': 'not-an-address'})
+
+        with StandInServer(stand_in) as server:
+            sharded_sync = ShardedSync(get_stand_in_connection_options(server.users_url), shards=2, max_workers=2,
+                                       rate=500)
+
+            sharded_sync_report = sharded_sync.upsert_users(users, validate=True)
+            self.assertEqual(dict(sharded_sync_report.actions), {UpsertResult.CREATED: 30, UpsertResult.FAILED: 1})
+            self.assertEqual(len(sharded_sync_report.shard_stats), 2)
+            self.assertEqual(len({shard_stats.pid for shard_stats in sharded_sync_report.shard_stats}), 2)
+            # The results are in the order of the users
+            self.assertEqual([upsert_result.user_name for upsert_result in sharded_sync_report.results],
+                             [user_fields['user_name'] for user_fields in users])
+            self.assertEqual(sharded_sync_report.errors, {'ZivverValidationError': 1})
+
+            users[0]['last_name'] = 'Changed'
+            sharded_sync_report = sharded_sync.upsert_users(users[:30])
+            self.assertEqual(dict(sharded_sync_report.actions), {UpsertResult.UPDATED: 1, UpsertResult.UNCHANGED: 29})
+        self.assertEqual(len(stand_in.users), 30)
+
+    def test_sharded_upsert_with_projected_cache(self):
+        stand_in = ScimStandIn()
+        users = [{'first_name': 'John', 'last_name': 'Doe {}'.format(index),
+                  'user_name': 'john{}@example.com'.format(index), 'is_active': True} for index in range(6)]
+
+        with StandInServer(stand_in) as server:
+            with create_stand_in_connection(server.users_url) as zivver_scim_connection:
+                for user_fields in users:
+                    zivver_scim_connection.create_user_in_zivver(**user_fields)
+                # The cache is loaded without the active flag, it is NOT_LOADED in the processes as well
+                existing_users = zivver_scim_connection.get_all_users_from_zivver(excluded_attributes=['active'])
+            self.assertIs(existing_users[0].is_active, NOT_LOADED)
+
+            for user_fields in users:
+                user_fields['is_active'] = False
+            sharded_sync_report = ShardedSync(get_stand_in_connection_options(server.users_url), shards=2,
+                                              max_workers=2).upsert_users(users, existing_users=existing_users)
+
+        self.assertEqual(dict(sharded_sync_report.actions), {UpsertResult.UPDATED: 6})
+        self.assertFalse(any(scim_user['active'] for scim_user in stand_in.users.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import threading
+import unittest
+
+from zivverscim.soak import SoakHarness, SoakSample, SoakThresholds
+
+
+class TestSoakHarness(unittest.TestCase):
+
+    def test_short_run_with_faults(self):
+        soak_harness = SoakHarness(duration=3, concurrency=2, sample_interval=0.5, warmup=0.5, timeout=2,
+                                   fault_options={'throttle_rate': 0.02, 'throttle_burst_length': 3,
+                                                  'server_error_rate': 0.02, 'reset_rate': 0.02,
+                                                  'latency_spike_rate': 0.02, 'latency_spike_seconds': 0.1,
+                                                  'seed': 1})
+        soak_report = soak_harness.run()
+
+        self.assertGreater(soak_report.samples[-1].operations, 0)
+        self.assertGreater(sum(soak_report.errors.values()), 0)
+        self.assertNotIn('threads still running', ' '.join(soak_report.failures))
+
+    def test_drift_fails(self):
+        soak_harness = SoakHarness(duration=30, warmup=0, thresholds=SoakThresholds(rss_growth_mb=10))
+        samples = [
+            SoakSample(elapsed=elapsed, rss_bytes=(50 + elapsed) * 2 ** 20, tracemalloc_bytes=0, open_fds=10,
+                       threads=threading.active_count(), operations=elapsed * 100, errors=0, throughput=100)
+            for elapsed in range(0, 31, 5)
+        ]
+
+        failures = soak_harness._check_drift(samples, baseline_threads=threading.active_count())
+
+        self.assertEqual(failures, ['RSS grew 30.0 MB'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import threading
+import unittest
+
+from zivverscim.exceptions import ZivverTokenError
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.token_provider import ClientCredentialsTokenProvider
+
+from tests.helpers import create_stand_in_connection
+
+
+class FakeClock:
+    """
+    Clock that only moves when the test says so
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestClientCredentialsTokenProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.stand_in = ScimStandIn(client_id='client', client_secret='secret', token_lifetime=600)
+        self.server = StandInServer(self.stand_in).start()
+        self.clock = FakeClock()
+        self.token_provider = ClientCredentialsTokenProvider(token_url=self.server.token_url, client_id='client',
+                                                             client_secret='secret', refresh_margin=60,
+                                                             clock=self.clock)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _create_connection(self):
+        return create_stand_in_connection(self.server.users_url, external_oauth_token_value=None,
+                                          token_provider=self.token_provider)
+
+    def test_token_is_cached_between_operations(self):
+        zivver_scim_connection = self._create_connection()
+        zivver_user_object = zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+        zivver_scim_connection.get_user_from_zivver(account_id=zivver_user_object.account_id)
+        zivver_scim_connection.get_all_users_from_zivver()
+
+        self.assertEqual(self.stand_in.token_requests, 1)
+
+    def test_token_is_refreshed_ahead_of_expiry(self):
+        first_token = self.token_provider.get_token()
+
+        self.clock.now += 500
+        self.assertEqual(self.token_provider.get_token(), first_token)
+
+        self.clock.now += 50
+        self.assertNotEqual(self.token_provider.get_token(), first_token)
+        self.assertEqual(self.token_provider.refresh_count, 2)
+
+    def test_short_lived_token_is_cached(self):
+        self.stand_in.token_lifetime = 30
+        first_token = self.token_provider.get_token()
+        for _ in range(5):
+            self.assertEqual(self.token_provider.get_token(), first_token)
+
+        # Refreshed half way its lifetime, the margin of 60 seconds is longer than the token lives
+        self.clock.now += 15
+        self.assertNotEqual(self.token_provider.get_token(), first_token)
+        self.assertEqual(self.stand_in.token_requests, 2)
+
+    def test_single_flight_refresh(self):
+        barrier = threading.Barrier(16)
+        tokens = []
+
+        def get_token():
+            barrier.wait()
+            tokens.append(self.token_provider.get_token())
+
+        threads = [threading.Thread(target=get_token) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.stand_in.token_requests, 1)
+        self.assertEqual(len(set(tokens)), 1)
+
+    def test_retry_once_on_401(self):
+        zivver_scim_connection = self._create_connection()
+        zivver_scim_connection.get_all_users_from_zivver()
+
+        # Zivver no longer accepts the cached token
+        self.stand_in.revoke_tokens()
+        zivver_scim_connection.get_all_users_from_zivver()
+
+        self.assertEqual(self.stand_in.token_requests, 2)
+
+    def test_invalid_client(self):
+        self.token_provider.client_secret = 'wrong'
+        with self.assertRaises(ZivverTokenError):
+            self.token_provider.get_token()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from zivverscim.stand_in import StandInServer
+from zivverscim.traffic import TrafficRecorder, TrafficReplayer, load_traffic, percentile
+from zivverscim.transport import InProcessTransport
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestTraffic(unittest.TestCase):
+
+    def _record_traffic(self, traffic_recorder):
+        transport = InProcessTransport()
+        zivver_scim_connection = create_stand_in_connection(transport.users_url,
+                                                            external_oauth_token_value='secret-api-key',
+                                                            http_client=transport, traffic_recorder=traffic_recorder)
+        account_ids = [
+            zivver_scim_connection.create_user_in_zivver(
+                first_name='John', last_name='Doe', user_name='john{}@example.com'.format(index)
+            ).account_id
+            for index in range(4)
+        ]
+        zivver_scim_connection.get_user_from_zivver(account_ids[0])
+        zivver_scim_connection.get_users_by_ids(account_ids[:2])
+        zivver_scim_connection.get_all_users_from_zivver(page_size=2)
+        zivver_scim_connection.delete_user_from_zivver(account_ids[3])
+        return account_ids
+
+    def test_records_are_redacted(self):
+        traffic_path = os.path.join(tempfile.mkdtemp(), 'traffic.jsonl.gz')
+        with TrafficRecorder(traffic_path) as traffic_recorder:
+            account_ids = self._record_traffic(traffic_recorder)
+
+        with gzip.open(traffic_path, 'rt') as traffic_file:
+            traffic = traffic_file.read()
+        for personal_data in ['secret-api-key', 'john', 'example.com', 'Doe', 'Bearer'] + account_ids:
+            self.assertNotIn(personal_data, traffic)
+
+        _, records = load_traffic(traffic_path)
+        self.assertEqual([record['m'] for record in records], ['POST'] * 4 + ['GET'] * 4 + ['DELETE'])
+        self.assertEqual(records[0]['s'], 201)
+        self.assertIn('urn:ietf:params:scim:schemas:core:2.0:User', records[0]['b']['schemas'])
+        # The same account has the same pseudonym in every record
+        self.assertEqual(records[4]['p'].rsplit('/', 1)[-1], records[0]['i'])
+        self.assertEqual(records[-1]['p'].rsplit('/', 1)[-1], records[3]['i'])
+
+    def test_replay(self):
+        traffic_recorder = TrafficRecorder()
+        self._record_traffic(traffic_recorder)
+
+        with StandInServer() as server:
+            replay_report = TrafficReplayer(traffic_recorder.records, speed=None, concurrency=2,
+                                            server_url=server.users_url).run()
+
+        self.assertEqual(replay_report.requests, 9)
+        self.assertEqual(replay_report.status_mismatches, 0)
+        self.assertEqual(replay_report.status_counts, {200: 4, 201: 4, 204: 1})
+        self.assertIsNotNone(replay_report.latency['p99'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 90), 3)
+        self.assertIsNone(percentile([], 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
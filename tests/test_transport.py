@@ -0,0 +1,55 @@
+import unittest
+
+from zivverscim.exceptions import ZivverUnknownAccountError
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.transport import InProcessTransport, Urllib3Transport
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestTransport(unittest.TestCase):
+
+    def _crud(self, zivver_scim_connection):
+        with zivver_scim_connection:
+            zivver_user_object = zivver_scim_connection.create_user_in_zivver(
+                last_name='Doe', user_name='john@doe.com', aliases=['{}-john@doe.com'.format(index)
+                                                                    for index in range(100)]
+            )
+            zivver_user_object = zivver_scim_connection.update_user_in_zivver(
+                account_id=zivver_user_object.account_id, last_name='Doe', user_name='jane@doe.com'
+            )
+            self.assertEqual(zivver_user_object.user_name, 'jane@doe.com')
+            self.assertEqual(len(zivver_scim_connection.get_all_users_from_zivver(page_size=10)), 1)
+
+            zivver_scim_connection.delete_user_from_zivver(account_id=zivver_user_object.account_id)
+            with self.assertRaises(ZivverUnknownAccountError):
+                zivver_scim_connection.get_user_from_zivver(zivver_user_object.account_id)
+
+    def test_in_process(self):
+        stand_in = ScimStandIn(compression_threshold=256)
+        transport = InProcessTransport(stand_in)
+
+        self._crud(create_stand_in_connection(transport.users_url, compress_requests='gzip', compression_threshold=256,
+                                              http_client=transport))
+
+        self.assertEqual(stand_in.request_count, 5)
+
+    def test_urllib3(self):
+        with StandInServer(ScimStandIn(compression_threshold=256)) as server:
+            zivver_scim_connection = create_stand_in_connection(server.users_url, transport='urllib3')
+            self.assertIsInstance(zivver_scim_connection._get_http_client(), Urllib3Transport)
+
+            self._crud(zivver_scim_connection)
+
+            self.assertEqual(server.connection_count, 1)
+
+    def test_timeout_is_passed_to_the_transport(self):
+        for timeout in (None, 5):
+            with create_stand_in_connection('http://localhost/', timeout=timeout,
+                                            transport='urllib3') as zivver_scim_connection:
+                # None waits forever, like with the requests transport
+                self.assertEqual(zivver_scim_connection._get_http_client().timeout, timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import unittest
+
+from zivverscim.exceptions import SCIM_ERROR_SCHEMA, ZivverAliasConflictError
+from zivverscim.stand_in import ScimStandIn, StandInServer
+from zivverscim.transport import InProcessTransport
+from zivverscim.wrapper import SCIM_ZIVVER_USER_SCHEMA, UpsertResult
+
+from tests.helpers import create_stand_in_connection
+
+
+class AliasTakenStandIn(ScimStandIn):
+    """
+    Rejects a create with the alias conflict of Zivver (as a SCIM error body) when the userName or an alias is
+    already the userName of an account
+    """
+
+    def _create_user(self, body):
+        scim_user = json.loads(body.decode('utf-8'))
+        addresses = [scim_user['userName']] + scim_user[SCIM_ZIVVER_USER_SCHEMA]['aliases']
+        user_names = {existing_user['userName'] for existing_user in self.users.values()}
+        for address in addresses:
+            if address in user_names:
+                return self._json(409, {'schemas': [SCIM_ERROR_SCHEMA], 'status': '409',
+                                        'detail': 'Error creating alias: Alias is already taken for {}'.format(
+                                            address)})
+        return super()._create_user(body)
+
+
+class TestUpsert(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.zivver_scim_connection = create_stand_in_connection(self.server.users_url)
+
+    def tearDown(self):
+        self.zivver_scim_connection.close()
+        self.server.stop()
+
+    def test_create_then_unchanged_then_update(self):
+        upsert_result = self.zivver_scim_connection.upsert_user(first_name='John', last_name='Doe',
+                                                                user_name='john@doe.com', is_active=True)
+        self.assertEqual(upsert_result.action, UpsertResult.CREATED)
+
+        upsert_result = self.zivver_scim_connection.upsert_user(first_name='John', last_name='Doe',
+                                                                user_name='john@doe.com', is_active=True)
+        self.assertEqual(upsert_result.action, UpsertResult.UNCHANGED)
+
+        upsert_result = self.zivver_scim_connection.upsert_user(first_name='John', last_name='Doe',
+                                                                user_name='john@doe.com', is_active=True,
+                                                                aliases=['j.doe@doe.com'])
+        self.assertEqual(upsert_result.action, UpsertResult.UPDATED)
+        self.assertEqual(upsert_result.zivver_user.zivver_scim_user_aliases, ['j.doe@doe.com'])
+        self.assertEqual(len(self.server.stand_in.users), 1)
+
+    def test_conflict_on_create_switches_to_update(self):
+        self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+        # The cache does not know the user, so the create fails on the conflict
+        upsert_results = self.zivver_scim_connection.upsert_users(
+            [{'last_name': 'Doe', 'user_name': 'john@doe.com', 'is_active': True}], existing_users=[]
+        )
+
+        self.assertEqual(upsert_results[0].action, UpsertResult.UPDATED)
+        self.assertTrue(upsert_results[0].conflict)
+        self.assertTrue(upsert_results[0].zivver_user.is_active)
+
+    def test_upsert_users_with_cache(self):
+        self.zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+        existing_users = self.zivver_scim_connection.get_all_users_from_zivver()
+        request_count = self.server.stand_in.request_count
+
+        upsert_results = self.zivver_scim_connection.upsert_users([
+            {'last_name': 'Doe', 'user_name': 'john@doe.com'},
+            {'last_name': 'Doe', 'user_name': 'jane@doe.com'},
+            {'user_name': 'missing-last-name@doe.com'}
+        ], existing_users=existing_users)
+
+        self.assertEqual([upsert_result.action for upsert_result in upsert_results],
+                         [UpsertResult.UNCHANGED, UpsertResult.CREATED, UpsertResult.FAILED])
+        # Only the create went to Zivver
+        self.assertEqual(self.server.stand_in.request_count - request_count, 1)
+
+    def test_scim_conflict_body_switches_to_update(self):
+        transport = InProcessTransport(ScimStandIn(scim_errors=True))
+        with create_stand_in_connection(transport.users_url, http_client=transport) as zivver_scim_connection:
+            zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+            upsert_results = zivver_scim_connection.upsert_users(
+                [{'last_name': 'Doe', 'user_name': 'john@doe.com', 'is_active': True}], existing_users=[]
+            )
+
+        self.assertEqual(upsert_results[0].action, UpsertResult.UPDATED)
+        self.assertTrue(upsert_results[0].conflict)
+        self.assertEqual(len(transport.stand_in.users), 1)
+
+    def test_alias_taken_on_create(self):
+        transport = InProcessTransport(AliasTakenStandIn())
+        with create_stand_in_connection(transport.users_url, http_client=transport) as zivver_scim_connection:
+            zivver_scim_connection.create_user_in_zivver(last_name='Doe', user_name='john@doe.com')
+
+            upsert_results = zivver_scim_connection.upsert_users([
+                {'last_name': 'Doe', 'user_name': 'john@doe.com', 'is_active': True},
+                {'last_name': 'Doe', 'user_name': 'jane@doe.com', 'aliases': ['john@doe.com']}
+            ], existing_users=[])
+
+        # John exists and is updated, the alias of Jane is taken by another account
+        self.assertEqual([upsert_result.action for upsert_result in upsert_results],
+                         [UpsertResult.UPDATED, UpsertResult.FAILED])
+        self.assertTrue(upsert_results[0].zivver_user.is_active)
+        self.assertIsInstance(upsert_results[1].error, ZivverAliasConflictError)
+
+if __name__ == '__main__':
+    unittest.main()
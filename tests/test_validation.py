@@ -0,0 +1,59 @@
+import unittest
+
+from zivverscim.exceptions import ZivverValidationError
+from zivverscim.transport import InProcessTransport
+from zivverscim.validation import validate_users
+from zivverscim.wrapper import UpsertResult
+
+from tests.helpers import create_stand_in_connection
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_partition(self):
+        users = [
+            {'last_name': 'Doe', 'user_name': 'john@doe.com', 'aliases': ['j.doe@doe.com']},
+            {'user_name': 'no-last-name@doe.com'},
+            {'last_name': 'Doe', 'user_name': 'not-an-email'},
+            {'last_name': 'Doe', 'user_name': 'sso@doe.com', 'sso_connection': True},
+            {'last_name': 'Doe', 'user_name': 'self@doe.com', 'delegates': ['SELF@doe.com']},
+            {'last_name': 'Doe', 'user_name': 'jane@doe.com', 'aliases': ['J.Doe@doe.com']},
+            {'last_name': 'Doe', 'user_name': 'typo@doe.com', 'alias': ['typo2@doe.com']},
+            {'last_name': 'Doe', 'user_name': 'string@doe.com', 'aliases': 'string2@doe.com'},
+            {'last_name': 'Doe', 'user_name': 'valid@doe.com', 'delegates': ['john@doe.com']},
+        ]
+
+        validation_result = validate_users(users)
+
+        self.assertFalse(validation_result.is_valid())
+        self.assertEqual(validation_result.valid, [users[8]])
+        self.assertEqual(validation_result.valid_indexes, [8])
+        errors = {invalid_user.index: invalid_user.errors for invalid_user in validation_result.invalid}
+        self.assertEqual(errors[1], ['Missing field: last_name'])
+        self.assertIn('Invalid e-mail address in user_name: not-an-email', errors[2])
+        self.assertEqual(errors[3], ['Missing field: zivver_account_key'])
+        self.assertEqual(errors[4], ['User delegates to itself: SELF@doe.com'])
+        # The shared alias makes both users invalid
+        self.assertEqual(errors[0], ['Duplicate user_name or alias in the batch: j.doe@doe.com'])
+        self.assertEqual(errors[5], ['Duplicate user_name or alias in the batch: j.doe@doe.com'])
+        self.assertEqual(errors[6], ['Unknown field: alias'])
+        self.assertEqual(errors[7], ['Field aliases must be a list'])
+
+    def test_upsert_users_validates_before_sending(self):
+        transport = InProcessTransport()
+        zivver_scim_connection = create_stand_in_connection(transport.users_url, http_client=transport)
+
+        upsert_results = zivver_scim_connection.upsert_users([
+            {'last_name': 'Doe', 'user_name': 'john@doe.com'},
+            {'last_name': 'Doe', 'user_name': 'john@doe.com'},
+            {'last_name': 'Doe', 'user_name': 'jane@doe.com'},
+        ], existing_users=[], validate=True)
+
+        self.assertEqual([upsert_result.action for upsert_result in upsert_results],
+                         [UpsertResult.FAILED, UpsertResult.FAILED, UpsertResult.CREATED])
+        self.assertIsInstance(upsert_results[0].error, ZivverValidationError)
+        self.assertEqual(transport.stand_in.request_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()